@@ -5,6 +5,7 @@ from pydantic import (
     Field,
     HttpUrl,
     NegativeInt,
+    NonNegativeFloat,
     NonNegativeInt,
     PositiveFloat,
     PositiveInt,
@@ -93,6 +94,29 @@ class CodeExecutionSandboxConfig(BaseSettings):
         default=10.0,
     )
 
+    CODE_EXECUTION_JINJA2_RENDERER: Literal["sandbox", "local"] = Field(
+        description="Where jinja2 templates are rendered: 'sandbox' sends them to the code execution service,"
+        " 'local' renders them in process in a sandboxed jinja2 environment, falling back to the code execution"
+        " service for templates the local sandbox rejects",
+        default="sandbox",
+    )
+
+    CODE_EXECUTION_JINJA2_TIMEOUT: PositiveFloat = Field(
+        description="Time limit in seconds for rendering a jinja2 template in process",
+        default=5.0,
+    )
+
+    CODE_EXECUTION_JINJA2_MAX_OUTPUT_LENGTH: PositiveInt = Field(
+        description="Maximum length in characters of a jinja2 template rendered in process",
+        default=1000000,
+    )
+
+    CODE_EXECUTION_BATCH_SIZE: NonNegativeInt = Field(
+        description="Maximum number of iteration items a Code node inside an iteration runs for in one sandbox call,"
+        " 0 or 1 to run it once per item",
+        default=0,
+    )
+
     CODE_MAX_NUMBER: PositiveInt = Field(
         description="Maximum allowed numeric value in code execution",
         default=9223372036854775807,
@@ -149,6 +173,11 @@ class PluginConfig(BaseSettings):
         default="plugin-api-key",
     )
 
+    PLUGIN_DAEMON_POOL_MAX_SIZE: PositiveInt = Field(
+        description="Maximum number of keep-alive connections to the plugin daemon per process",
+        default=32,
+    )
+
     INNER_API_KEY_FOR_PLUGIN: str = Field(description="Inner api key for plugin", default="inner-api-key")
 
     PLUGIN_REMOTE_INSTALL_HOST: str = Field(
@@ -372,6 +401,26 @@ class HttpConfig(BaseSettings):
         default=5,
     )
 
+    SSRF_POOL_MAX_CONNECTIONS: PositiveInt = Field(
+        description="Maximum number of concurrent connections of the pooled client used for network requests (SSRF)",
+        default=100,
+    )
+
+    SSRF_POOL_MAX_KEEPALIVE_CONNECTIONS: PositiveInt = Field(
+        description="Maximum number of idle keep-alive connections kept by the pooled client (SSRF)",
+        default=20,
+    )
+
+    SSRF_POOL_KEEPALIVE_EXPIRY: PositiveFloat = Field(
+        description="Time in seconds an idle keep-alive connection is kept open by the pooled client (SSRF)",
+        default=5.0,
+    )
+
+    SSRF_POOL_HTTP2_ENABLED: bool = Field(
+        description="Negotiate HTTP/2 for network requests (SSRF), used only when the h2 package is installed",
+        default=False,
+    )
+
     RESPECT_XFORWARD_HEADERS_ENABLED: bool = Field(
         description="Enable handling of X-Forwarded-For, X-Forwarded-Proto, and X-Forwarded-Port headers"
         " when the app is behind a single trusted reverse proxy.",
@@ -484,6 +533,11 @@ class WorkflowConfig(BaseSettings):
         default=5,
     )
 
+    WORKFLOW_GRAPH_CACHE_SIZE: NonNegativeInt = Field(
+        description="Maximum number of compiled workflow graphs kept per process (0 to compile the graph on every run)",
+        default=128,
+    )
+
     WORKFLOW_PARALLEL_DEPTH_LIMIT: PositiveInt = Field(
         description="Maximum allowed depth for nested parallel executions",
         default=3,
@@ -505,6 +559,58 @@ class WorkflowNodeExecutionConfig(BaseSettings):
         default=100,
     )
 
+    WORKFLOW_EXECUTOR_MAX_WORKERS: PositiveInt = Field(
+        description="Maximum number of worker threads shared by all workflow runs of a process"
+        " for parallel branch and parallel iteration execution",
+        default=200,
+    )
+
+    WORKFLOW_EXECUTOR_MAX_SUBMIT_COUNT: NonNegativeInt = Field(
+        description="Maximum number of tasks of all workflow runs of a process queued or running at once"
+        " before new runs wait to be admitted, 0 to admit every run",
+        default=5000,
+    )
+
+    WORKFLOW_EXECUTOR_ADMISSION_TIMEOUT: NonNegativeFloat = Field(
+        description="Maximum time in seconds a new workflow run waits to be admitted before it is rejected",
+        default=30.0,
+    )
+
+    WORKFLOW_EXECUTOR_SCOPE_WEIGHTS: str = Field(
+        description="Comma-separated tenant or app ids with their scheduling weights, e.g. 'tenant_id:4,app_id:2',"
+        " a scope with weight n runs n tasks per turn, scopes default to 1",
+        default="",
+    )
+
+    WORKFLOW_EXECUTOR_STATS_LOG_INTERVAL: NonNegativeFloat = Field(
+        description="Interval in seconds between logs of the workflow executor queue stats, 0 to disable",
+        default=60.0,
+    )
+
+    @property
+    def WORKFLOW_EXECUTOR_SCOPE_WEIGHTS_MAP(self) -> dict[str, int]:
+        weights = {}
+        for item in self.WORKFLOW_EXECUTOR_SCOPE_WEIGHTS.split(","):
+            scope, _, weight = item.strip().rpartition(":")
+            if scope and weight.isdigit() and int(weight) > 0:
+                weights[scope] = int(weight)
+        return weights
+
+    WORKFLOW_NODE_EXECUTION_FLUSH_SIZE: PositiveInt = Field(
+        description="Number of buffered node execution records that triggers a background write",
+        default=100,
+    )
+
+    WORKFLOW_NODE_EXECUTION_FLUSH_INTERVAL: PositiveFloat = Field(
+        description="Maximum time in seconds node execution records stay buffered before a background write",
+        default=1.0,
+    )
+
+    WORKFLOW_NODE_EXECUTION_WRITER_WORKERS: PositiveInt = Field(
+        description="Number of background threads per process writing buffered node execution records",
+        default=4,
+    )
+
 
 class AuthConfig(BaseSettings):
     """
@@ -556,6 +662,28 @@ class AuthConfig(BaseSettings):
         default=86400,
     )
 
+    ACCOUNT_SESSION_CACHE_TTL: NonNegativeInt = Field(
+        description="Time (in seconds) the account, current tenant and role loaded by console requests are cached"
+        " in process, 0 to disable the cache",
+        default=300,
+    )
+
+    ACCOUNT_SESSION_CACHE_MAX_SIZE: PositiveInt = Field(
+        description="Maximum number of entries of the in-process account session cache",
+        default=10000,
+    )
+
+    SERVICE_API_AUTH_CACHE_TTL: NonNegativeInt = Field(
+        description="Time (in seconds) the api tokens, apps and end users resolved by the Service API are cached"
+        " in process, 0 to disable the cache",
+        default=30,
+    )
+
+    SERVICE_API_AUTH_CACHE_MAX_SIZE: PositiveInt = Field(
+        description="Maximum number of entries of the in-process Service API authentication cache",
+        default=10000,
+    )
+
 
 class ModerationConfig(BaseSettings):
     """
@@ -578,6 +706,11 @@ class ToolConfig(BaseSettings):
         default=3600,
     )
 
+    AGENT_MAX_PARALLEL_TOOL_CALLS: PositiveInt = Field(
+        description="Maximum number of tool calls of one agent turn that are invoked concurrently, 1 to disable",
+        default=4,
+    )
+
 
 class MailConfig(BaseSettings):
     """
@@ -657,6 +790,11 @@ class RagEtlConfig(BaseSettings):
         default="database",
     )
 
+    KEYWORD_TABLE_SHARD_COUNT: PositiveInt = Field(
+        description="Number of shards the keyword index of a newly indexed dataset is split into",
+        default=64,
+    )
+
     UNSTRUCTURED_API_URL: Optional[str] = Field(
         description="API URL for Unstructured.io service",
         default=None,
@@ -708,6 +846,29 @@ class DataSetConfig(BaseSettings):
         default=30,
     )
 
+    PLAN_SANDBOX_CLEAN_MESSAGE_BATCH_SIZE: PositiveInt = Field(
+        description="Number of expired messages checked and deleted per batch by the message cleanup - plan: sandbox",
+        default=1000,
+    )
+
+    DATASET_RETRIEVAL_LOG_FLUSH_INTERVAL: NonNegativeInt = Field(
+        description="Interval in seconds at which the hit counts of retrieved segments and the dataset queries"
+        " are written in batches, 0 to write them on every retrieval",
+        default=10,
+    )
+
+    RETRIEVAL_PARENT_SEGMENT_CACHE_SIZE: NonNegativeInt = Field(
+        description="Maximum number of parent segments of parent-child datasets cached in process for retrieval,"
+        " 0 to disable the cache",
+        default=2000,
+    )
+
+    RETRIEVAL_PARENT_SEGMENT_CACHE_TTL: PositiveInt = Field(
+        description="Time in seconds a cached parent segment is served for, bounds how stale its hit count, keywords"
+        " and other fields not covered by the content hash can be",
+        default=60,
+    )
+
 
 class WorkspaceConfig(BaseSettings):
     """
@@ -735,6 +896,53 @@ class IndexingConfig(BaseSettings):
         default=50,
     )
 
+    EMBEDDING_CACHE_LOCAL_SIZE: NonNegativeInt = Field(
+        description="Maximum number of document embeddings kept in the process-local cache (0 to disable)",
+        default=10000,
+    )
+
+    EMBEDDING_CACHE_REDIS_TTL: NonNegativeInt = Field(
+        description="Time-to-live in seconds for document embeddings cached in Redis (0 to disable)",
+        default=600,
+    )
+
+    EMBEDDING_CACHE_DB_BATCH_SIZE: PositiveInt = Field(
+        description="Number of text hashes looked up or inserted per database statement in the embedding cache",
+        default=500,
+    )
+
+    EMBEDDING_TOKEN_COUNT_CACHE_SIZE: NonNegativeInt = Field(
+        description="Maximum number of token counts of texts, per embedding model, kept in the process-local cache"
+        " shared by the text splitter, docstore and indexing runner (0 to disable)",
+        default=100000,
+    )
+
+    INDEXING_SEGMENT_BATCH_SIZE: PositiveInt = Field(
+        description="Number of document segments, with their child chunks, saved per database transaction"
+        " when indexing documents",
+        default=500,
+    )
+
+    INDEXING_PIPELINE_PAGE_BATCH_SIZE: PositiveInt = Field(
+        description="Number of extracted pages split and saved together per batch of the indexing pipeline",
+        default=20,
+    )
+
+    INDEXING_SPLIT_WORKERS: PositiveInt = Field(
+        description="Number of page batches of a document split concurrently by the indexing pipeline",
+        default=2,
+    )
+
+    INDEXING_EMBEDDING_WORKERS: PositiveInt = Field(
+        description="Number of threads embedding and indexing the segments of a document",
+        default=10,
+    )
+
+    INDEXING_PIPELINE_QUEUE_SIZE: PositiveInt = Field(
+        description="Number of segment batches queued per embedding or keyword thread before splitting waits",
+        default=4,
+    )
+
 
 class MultiModalTransferConfig(BaseSettings):
     MULTIMODAL_SEND_FORMAT: Literal["base64", "url"] = Field(
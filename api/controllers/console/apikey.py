@@ -7,6 +7,7 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 from werkzeug.exceptions import Forbidden
 
+from core.helper.service_api_auth_cache import ServiceApiAuthCache
 from extensions.ext_database import db
 from libs.helper import TimestampField
 from libs.login import login_required
@@ -127,9 +128,12 @@ class BaseApiKeyResource(Resource):
 
         if key is None:
             flask_restful.abort(404, message="API key not found")
+            return
 
+        cache_key = ServiceApiAuthCache.api_token_key(key.type, key.token)
         db.session.query(ApiToken).filter(ApiToken.id == api_key_id).delete()
         db.session.commit()
+        ServiceApiAuthCache.invalidate([cache_key])
 
         return {"result": "success"}, 204
 
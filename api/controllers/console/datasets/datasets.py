@@ -17,6 +17,7 @@ from controllers.console.wraps import (
     setup_required,
 )
 from core.errors.error import LLMBadRequestError, ProviderTokenNotInitError
+from core.helper.service_api_auth_cache import ServiceApiAuthCache
 from core.indexing_runner import IndexingRunner
 from core.model_runtime.entities.model_entities import ModelType
 from core.plugin.entities.plugin import ModelProviderID
@@ -611,9 +612,12 @@ class DatasetApiDeleteApi(Resource):
 
         if key is None:
             flask_restful.abort(404, message="API key not found")
+            return
 
+        cache_key = ServiceApiAuthCache.api_token_key(key.type, key.token)
         db.session.query(ApiToken).filter(ApiToken.id == api_key_id).delete()
         db.session.commit()
+        ServiceApiAuthCache.invalidate([cache_key])
 
         return {"result": "success"}, 204
 
@@ -1,18 +1,18 @@
 import time
 from collections.abc import Callable
-from datetime import UTC, datetime, timedelta
 from enum import Enum
 from functools import wraps
-from typing import Optional
+from typing import Optional, cast
 
 from flask import current_app, request
 from flask_login import user_logged_in  # type: ignore
 from flask_restful import Resource  # type: ignore
 from pydantic import BaseModel
-from sqlalchemy import select, update
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from werkzeug.exceptions import Forbidden, Unauthorized
 
+from core.helper.service_api_auth_cache import ServiceApiAuthCache
 from extensions.ext_database import db
 from extensions.ext_redis import redis_client
 from libs.login import _get_user
@@ -43,7 +43,7 @@ def validate_app_token(view: Optional[Callable] = None, *, fetch_user_arg: Optio
         def decorated_view(*args, **kwargs):
             api_token = validate_and_get_api_token("app")
 
-            app_model = db.session.query(App).filter(App.id == api_token.app_id).first()
+            app_model = _get_app(api_token.app_id)
             if not app_model:
                 raise Forbidden("The app no longer exists.")
 
@@ -53,10 +53,10 @@ def validate_app_token(view: Optional[Callable] = None, *, fetch_user_arg: Optio
             if not app_model.enable_api:
                 raise Forbidden("The app's API service has been disabled.")
 
-            tenant = db.session.query(Tenant).filter(Tenant.id == app_model.tenant_id).first()
-            if tenant is None:
+            tenant_status = _get_tenant_status(app_model.tenant_id)
+            if tenant_status is None:
                 raise ValueError("Tenant does not exist.")
-            if tenant.status == TenantStatus.ARCHIVE:
+            if tenant_status == TenantStatus.ARCHIVE:
                 raise Forbidden("The workspace's status is archived.")
 
             kwargs["app_model"] = app_model
@@ -230,33 +230,47 @@ def validate_and_get_api_token(scope: str | None = None):
     if auth_scheme != "bearer":
         raise Unauthorized("Authorization scheme must be 'Bearer'")
 
-    current_time = datetime.now(UTC).replace(tzinfo=None)
-    cutoff_time = current_time - timedelta(minutes=1)
-    with Session(db.engine, expire_on_commit=False) as session:
-        update_stmt = (
-            update(ApiToken)
-            .where(
-                ApiToken.token == auth_token,
-                (ApiToken.last_used_at.is_(None) | (ApiToken.last_used_at < cutoff_time)),
-                ApiToken.type == scope,
-            )
-            .values(last_used_at=current_time)
-            .returning(ApiToken)
-        )
-        result = session.execute(update_stmt)
-        api_token = result.scalar_one_or_none()
-
-        if not api_token:
+    cache_key = ServiceApiAuthCache.api_token_key(scope, auth_token)
+    api_token = ServiceApiAuthCache.get(cache_key)
+    if api_token is None:
+        with Session(db.engine, expire_on_commit=False) as session:
             stmt = select(ApiToken).where(ApiToken.token == auth_token, ApiToken.type == scope)
             api_token = session.scalar(stmt)
-            if not api_token:
-                raise Unauthorized("Access token is invalid")
-        else:
-            session.commit()
+        if not api_token:
+            raise Unauthorized("Access token is invalid")
+        ServiceApiAuthCache.set(cache_key, api_token)
+
+    ServiceApiAuthCache.record_last_used(api_token.id)
 
     return api_token
 
 
+def _get_app(app_id: str) -> Optional[App]:
+    cache_key = ServiceApiAuthCache.app_key(app_id)
+    app_model: Optional[App] = ServiceApiAuthCache.get(cache_key)
+    if app_model is None:
+        with Session(db.engine, expire_on_commit=False) as session:
+            app_model = session.get(App, app_id)
+        if not app_model:
+            return None
+        ServiceApiAuthCache.set(cache_key, app_model)
+
+    # attach a copy of the cached app to the request session without querying it again
+    return db.session.merge(app_model, load=False)
+
+
+def _get_tenant_status(tenant_id: str) -> Optional[str]:
+    cache_key = ServiceApiAuthCache.tenant_key(tenant_id)
+    tenant_status: Optional[str] = ServiceApiAuthCache.get(cache_key)
+    if tenant_status is None:
+        tenant_status = cast(Optional[str], db.session.scalar(select(Tenant.status).where(Tenant.id == tenant_id)))
+        if tenant_status is None:
+            return None
+        ServiceApiAuthCache.set(cache_key, tenant_status)
+
+    return tenant_status
+
+
 def create_or_update_end_user_for_user_id(app_model: App, user_id: Optional[str] = None) -> EndUser:
     """
     Create or update session terminal based on user ID.
@@ -264,18 +278,27 @@ def create_or_update_end_user_for_user_id(app_model: App, user_id: Optional[str]
     if not user_id:
         user_id = "DEFAULT-USER"
 
-    end_user = (
-        db.session.query(EndUser)
-        .filter(
-            EndUser.tenant_id == app_model.tenant_id,
-            EndUser.app_id == app_model.id,
-            EndUser.session_id == user_id,
-            EndUser.type == "service_api",
+    cache_key = ServiceApiAuthCache.end_user_key(app_model.id, user_id)
+    end_user: Optional[EndUser] = ServiceApiAuthCache.get(cache_key)
+    if end_user is not None:
+        return db.session.merge(end_user, load=False)
+
+    with Session(db.engine, expire_on_commit=False) as session:
+        end_user = session.scalar(
+            select(EndUser)
+            .where(
+                EndUser.tenant_id == app_model.tenant_id,
+                EndUser.app_id == app_model.id,
+                EndUser.session_id == user_id,
+                EndUser.type == "service_api",
+            )
+            .limit(1)
         )
-        .first()
-    )
 
-    if end_user is None:
+    if end_user is not None:
+        ServiceApiAuthCache.set(cache_key, end_user)
+        end_user = db.session.merge(end_user, load=False)
+    else:
         end_user = EndUser(
             tenant_id=app_model.tenant_id,
             app_id=app_model.id,
@@ -1,9 +1,15 @@
+import contextvars
 import json
 import logging
+import time
 from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from typing import Any, Optional, Union
 
+from flask import Flask, current_app
+
+from configs import dify_config
 from core.agent.base_agent_runner import BaseAgentRunner
 from core.app.apps.base_app_queue_manager import PublishFrom
 from core.app.entities.queue_entities import QueueAgentThoughtEvent, QueueMessageEndEvent, QueueMessageFileEvent
@@ -23,14 +29,26 @@ from core.model_runtime.entities import (
     UserPromptMessage,
 )
 from core.model_runtime.entities.message_entities import ImagePromptMessageContent
+from core.ops.ops_trace_manager import TraceQueueManager
 from core.prompt.agent_history_prompt_transform import AgentHistoryPromptTransform
-from core.tools.entities.tool_entities import ToolInvokeMeta
+from core.tools.__base.tool import Tool
+from core.tools.entities.tool_entities import ToolInvokeMeta, ToolProviderType
 from core.tools.tool_engine import ToolEngine
 from models.model import Message
 
 logger = logging.getLogger(__name__)
 
 
+# tools of these providers are stateless requests, other tools run concurrently only when they declare it
+CONCURRENT_TOOL_PROVIDER_TYPES = {ToolProviderType.BUILT_IN, ToolProviderType.API}
+
+
+def _must_run_serially(tool_instance: Tool) -> bool:
+    if tool_instance.entity.run_serially is not None:
+        return tool_instance.entity.run_serially
+    return tool_instance.tool_provider_type() not in CONCURRENT_TOOL_PROVIDER_TYPES
+
+
 class FunctionCallAgentRunner(BaseAgentRunner):
     def run(self, message: Message, query: str, **kwargs: Any) -> Generator[LLMResultChunk, None, None]:
         """
@@ -221,47 +239,19 @@ class FunctionCallAgentRunner(BaseAgentRunner):
 
             final_answer += response + "\n"
 
-            # call tools
+            # call tools, the responses are in the order of the tool calls
             tool_responses = []
-            for tool_call_id, tool_call_name, tool_call_args in tool_calls:
-                tool_instance = tool_instances.get(tool_call_name)
-                if not tool_instance:
-                    tool_response = {
-                        "tool_call_id": tool_call_id,
-                        "tool_call_name": tool_call_name,
-                        "tool_response": f"there is not a tool named {tool_call_name}",
-                        "meta": ToolInvokeMeta.error_instance(f"there is not a tool named {tool_call_name}").to_dict(),
-                    }
-                else:
-                    # invoke tool
-                    tool_invoke_response, message_files, tool_invoke_meta = ToolEngine.agent_invoke(
-                        tool=tool_instance,
-                        tool_parameters=tool_call_args,
-                        user_id=self.user_id,
-                        tenant_id=self.tenant_id,
-                        message=self.message,
-                        invoke_from=self.application_generate_entity.invoke_from,
-                        agent_tool_callback=self.agent_callback,
-                        trace_manager=trace_manager,
-                        app_id=self.application_generate_entity.app_config.app_id,
-                        message_id=self.message.id,
-                        conversation_id=self.conversation.id,
+            for (tool_call_id, tool_call_name, _), (tool_response, message_files) in zip(
+                tool_calls, self._invoke_tool_calls(tool_calls, tool_instances, trace_manager)
+            ):
+                # publish files
+                for message_file_id in message_files:
+                    # publish message file
+                    self.queue_manager.publish(
+                        QueueMessageFileEvent(message_file_id=message_file_id), PublishFrom.APPLICATION_MANAGER
                     )
-                    # publish files
-                    for message_file_id in message_files:
-                        # publish message file
-                        self.queue_manager.publish(
-                            QueueMessageFileEvent(message_file_id=message_file_id), PublishFrom.APPLICATION_MANAGER
-                        )
-                        # add message file ids
-                        message_file_ids.append(message_file_id)
-
-                    tool_response = {
-                        "tool_call_id": tool_call_id,
-                        "tool_call_name": tool_call_name,
-                        "tool_response": tool_invoke_response,
-                        "meta": tool_invoke_meta.to_dict(),
-                    }
+                    # add message file ids
+                    message_file_ids.append(message_file_id)
 
                 tool_responses.append(tool_response)
                 if tool_response["tool_response"] is not None:
@@ -314,6 +304,116 @@ class FunctionCallAgentRunner(BaseAgentRunner):
             PublishFrom.APPLICATION_MANAGER,
         )
 
+    def _invoke_tool_calls(
+        self,
+        tool_calls: list[tuple[str, str, dict[str, Any]]],
+        tool_instances: dict[str, Tool],
+        trace_manager: Optional[TraceQueueManager],
+    ) -> list[tuple[dict[str, Any], list[str]]]:
+        """
+        Invoke the tool calls of one agent turn.
+
+        Consecutive tool calls are invoked concurrently, at most AGENT_MAX_PARALLEL_TOOL_CALLS at a time. A tool
+        that must run serially waits for the calls before it, and the calls after it wait for it.
+        :return: the tool response and message file ids of each tool call, in the order of the tool calls
+        """
+        max_workers = dify_config.AGENT_MAX_PARALLEL_TOOL_CALLS
+        results: list[tuple[dict[str, Any], list[str]]] = []
+        batch: list[tuple[str, str, dict[str, Any]]] = []
+
+        def invoke_batch() -> None:
+            if len(batch) <= 1 or max_workers <= 1:
+                for tool_call in batch:
+                    results.append(self._invoke_tool_call(tool_call, tool_instances, trace_manager))
+            else:
+                # load the attributes used by the tools before the worker threads read them
+                _ = self.message.id, self.message.conversation_id
+                flask_app = current_app._get_current_object()  # type: ignore
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(batch))) as executor:
+                    futures = [
+                        executor.submit(
+                            self._invoke_tool_call_in_context,
+                            flask_app,
+                            contextvars.copy_context(),
+                            tool_call,
+                            tool_instances,
+                            trace_manager,
+                        )
+                        for tool_call in batch
+                    ]
+                    results.extend(future.result() for future in futures)
+            batch.clear()
+
+        for tool_call in tool_calls:
+            tool_instance = tool_instances.get(tool_call[1])
+            if tool_instance and _must_run_serially(tool_instance):
+                invoke_batch()
+                batch.append(tool_call)
+                invoke_batch()
+            else:
+                batch.append(tool_call)
+        invoke_batch()
+
+        return results
+
+    def _invoke_tool_call_in_context(
+        self,
+        flask_app: Flask,
+        context: contextvars.Context,
+        tool_call: tuple[str, str, dict[str, Any]],
+        tool_instances: dict[str, Tool],
+        trace_manager: Optional[TraceQueueManager],
+    ) -> tuple[dict[str, Any], list[str]]:
+        for var, val in context.items():
+            var.set(val)
+
+        with flask_app.app_context():
+            return self._invoke_tool_call(tool_call, tool_instances, trace_manager)
+
+    def _invoke_tool_call(
+        self,
+        tool_call: tuple[str, str, dict[str, Any]],
+        tool_instances: dict[str, Tool],
+        trace_manager: Optional[TraceQueueManager],
+    ) -> tuple[dict[str, Any], list[str]]:
+        tool_call_id, tool_call_name, tool_call_args = tool_call
+        tool_instance = tool_instances.get(tool_call_name)
+        if not tool_instance:
+            tool_response = {
+                "tool_call_id": tool_call_id,
+                "tool_call_name": tool_call_name,
+                "tool_response": f"there is not a tool named {tool_call_name}",
+                "meta": ToolInvokeMeta.error_instance(f"there is not a tool named {tool_call_name}").to_dict(),
+            }
+            return tool_response, []
+
+        started_at = time.perf_counter()
+        # invoke tool
+        tool_invoke_response, message_files, tool_invoke_meta = ToolEngine.agent_invoke(
+            tool=tool_instance,
+            tool_parameters=tool_call_args,
+            user_id=self.user_id,
+            tenant_id=self.tenant_id,
+            message=self.message,
+            invoke_from=self.application_generate_entity.invoke_from,
+            agent_tool_callback=self.agent_callback,
+            trace_manager=trace_manager,
+            app_id=self.application_generate_entity.app_config.app_id,
+            message_id=self.message.id,
+            conversation_id=self.conversation.id,
+        )
+        if not tool_invoke_meta.time_cost:
+            # the tool failed before it was timed
+            tool_invoke_meta.time_cost = time.perf_counter() - started_at
+
+        tool_response = {
+            "tool_call_id": tool_call_id,
+            "tool_call_name": tool_call_name,
+            "tool_response": tool_invoke_response,
+            "meta": tool_invoke_meta.to_dict(),
+        }
+        return tool_response, message_files
+
     def check_tool_calls(self, llm_result_chunk: LLMResultChunk) -> bool:
         """
         Check if there is any tool call in llm result chunk
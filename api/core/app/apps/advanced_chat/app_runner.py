@@ -74,6 +74,7 @@ class AdvancedChatAppRunner(WorkflowBasedAppRunner):
 
         if self.application_generate_entity.single_iteration_run:
             # if only single iteration run is requested
+            graph_config = workflow.graph_dict
             graph, variable_pool = self._get_graph_and_variable_pool_of_single_iteration(
                 workflow=workflow,
                 node_id=self.application_generate_entity.single_iteration_run.node_id,
@@ -81,6 +82,7 @@ class AdvancedChatAppRunner(WorkflowBasedAppRunner):
             )
         elif self.application_generate_entity.single_loop_run:
             # if only single loop run is requested
+            graph_config = workflow.graph_dict
             graph, variable_pool = self._get_graph_and_variable_pool_of_single_loop(
                 workflow=workflow,
                 node_id=self.application_generate_entity.single_loop_run.node_id,
@@ -152,7 +154,7 @@ class AdvancedChatAppRunner(WorkflowBasedAppRunner):
             )
 
             # init graph
-            graph = self._init_graph(graph_config=workflow.graph_dict)
+            graph_config, graph = self._get_workflow_graph(workflow)
 
         db.session.close()
 
@@ -163,7 +165,7 @@ class AdvancedChatAppRunner(WorkflowBasedAppRunner):
             workflow_id=workflow.id,
             workflow_type=WorkflowType.value_of(workflow.type),
             graph=graph,
-            graph_config=workflow.graph_dict,
+            graph_config=graph_config,
             user_id=self.application_generate_entity.user_id,
             user_from=(
                 UserFrom.ACCOUNT
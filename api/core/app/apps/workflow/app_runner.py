@@ -76,6 +76,7 @@ class WorkflowAppRunner(WorkflowBasedAppRunner):
         # if only single iteration run is requested
         if self.application_generate_entity.single_iteration_run:
             # if only single iteration run is requested
+            graph_config = workflow.graph_dict
             graph, variable_pool = self._get_graph_and_variable_pool_of_single_iteration(
                 workflow=workflow,
                 node_id=self.application_generate_entity.single_iteration_run.node_id,
@@ -83,6 +84,7 @@ class WorkflowAppRunner(WorkflowBasedAppRunner):
             )
         elif self.application_generate_entity.single_loop_run:
             # if only single loop run is requested
+            graph_config = workflow.graph_dict
             graph, variable_pool = self._get_graph_and_variable_pool_of_single_loop(
                 workflow=workflow,
                 node_id=self.application_generate_entity.single_loop_run.node_id,
@@ -109,7 +111,7 @@ class WorkflowAppRunner(WorkflowBasedAppRunner):
             )
 
             # init graph
-            graph = self._init_graph(graph_config=workflow.graph_dict)
+            graph_config, graph = self._get_workflow_graph(workflow)
 
         # RUN WORKFLOW
         workflow_entry = WorkflowEntry(
@@ -118,7 +120,7 @@ class WorkflowAppRunner(WorkflowBasedAppRunner):
             workflow_id=workflow.id,
             workflow_type=WorkflowType.value_of(workflow.type),
             graph=graph,
-            graph_config=workflow.graph_dict,
+            graph_config=graph_config,
             user_id=self.application_generate_entity.user_id,
             user_from=(
                 UserFrom.ACCOUNT
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from sqlalchemy import Engine
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from configs import dify_config
+from models.workflow import WorkflowNodeExecution
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = [column.name for column in WorkflowNodeExecution.__table__.columns]
+
+_writer: Optional[ThreadPoolExecutor] = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer() -> ThreadPoolExecutor:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ThreadPoolExecutor(
+                    max_workers=dify_config.WORKFLOW_NODE_EXECUTION_WRITER_WORKERS,
+                    thread_name_prefix="workflow_node_execution_writer",
+                )
+    return _writer
+
+
+class WorkflowNodeExecutionJournal:
+    """
+    Write-behind buffer of the node execution records of one workflow run.
+
+    Records are snapshotted when they are recorded and coalesced by id, so a node that starts and
+    finishes between two flushes is written with a single insert. Buffered records are upserted in
+    bulk by a background writer once `flush_size` records are pending or at most `flush_interval`
+    seconds after the last flush, and synchronously by `flush()` when the run ends.
+
+    If the bulk upsert fails the records are written one by one. Records that still fail in a
+    background flush are buffered again before the next flush can start and a retry is scheduled,
+    records that still fail in `flush()` are handed back to the caller. At most `flush_interval` seconds of records are lost
+    when the process dies in between.
+    """
+
+    def __init__(self, engine: Engine, flush_size: int, flush_interval: float):
+        self._engine = engine
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # serializes writes, so an older snapshot can never overwrite a newer one
+        self._flush_lock = threading.Lock()
+        self._last_flush_at = time.monotonic()
+        self._flush_submitted = False
+        self._flush_timer: Optional[threading.Timer] = None
+
+    def record(self, workflow_node_execution: WorkflowNodeExecution) -> None:
+        row = {column: getattr(workflow_node_execution, column) for column in _COLUMNS}
+        if row["elapsed_time"] is None:
+            row["elapsed_time"] = 0
+
+        with self._lock:
+            self._pending[row["id"]] = row
+            if self._flush_submitted:
+                return
+
+            delay = self._flush_interval - (time.monotonic() - self._last_flush_at)
+            if len(self._pending) >= self._flush_size or delay <= 0:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                self._submit_flush()
+            elif self._flush_timer is None:
+                # make sure records do not stay buffered while the run waits on a slow node
+                self._start_flush_timer(delay)
+
+    def flush(self) -> list[dict[str, Any]]:
+        """
+        Write every buffered record before returning.
+
+        :return: column values of the records that could not be written, they are no longer buffered and the
+            caller has to write them itself
+        """
+        return self._flush(requeue_failed=False)
+
+    def _start_flush_timer(self, delay: float) -> None:
+        self._flush_timer = threading.Timer(delay, self._on_flush_timer)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _on_flush_timer(self) -> None:
+        with self._lock:
+            self._flush_timer = None
+            if not self._flush_submitted:
+                self._submit_flush()
+
+    def _submit_flush(self) -> None:
+        self._flush_submitted = True
+        _get_writer().submit(self._flush_in_background)
+
+    def _flush_in_background(self) -> None:
+        try:
+            self._flush(requeue_failed=True)
+        except Exception:
+            logger.exception("Failed to write workflow node executions")
+
+    def _flush(self, requeue_failed: bool) -> list[dict[str, Any]]:
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._pending.values())
+                self._pending.clear()
+                self._last_flush_at = time.monotonic()
+                self._flush_submitted = False
+            if not rows:
+                return []
+
+            try:
+                self._upsert(rows)
+                return []
+            except Exception:
+                logger.exception("Bulk write of workflow node executions failed, falling back to row by row")
+
+            failed_rows = []
+            for row in rows:
+                try:
+                    self._upsert([row])
+                except Exception:
+                    logger.exception(f"Failed to write workflow node execution {row['id']}")
+                    failed_rows.append(row)
+
+            if requeue_failed and failed_rows:
+                # buffered again before the flush lock is released, so a final flush waiting on it sees them
+                with self._lock:
+                    for row in failed_rows:
+                        # a newer snapshot recorded meanwhile wins
+                        self._pending.setdefault(row["id"], row)
+                    if not self._flush_submitted and self._flush_timer is None:
+                        self._start_flush_timer(self._flush_interval)
+                return []
+            return failed_rows
+
+    def _upsert(self, rows: list[dict[str, Any]]) -> None:
+        stmt = insert(WorkflowNodeExecution.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={column: stmt.excluded[column] for column in _COLUMNS if column != "id"},
+        )
+        with Session(self._engine) as session:
+            session.execute(stmt, rows)
+            session.commit()
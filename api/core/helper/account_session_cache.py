@@ -0,0 +1,227 @@
+"""
+Process-local cache of the accounts loaded by console requests
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional
+
+from flask import Flask, current_app
+from sqlalchemy import bindparam, event, or_, update
+from sqlalchemy.orm import Session
+
+from configs import dify_config
+from extensions.ext_database import db
+from extensions.ext_redis import redis_client
+from models.account import Account, Tenant, TenantAccountJoin
+
+logger = logging.getLogger(__name__)
+
+# accounts only record when they were last active to the minute
+LAST_ACTIVE_AT_FLUSH_INTERVAL = 60
+# versions outlive the cached sessions they validate
+VERSION_TTL = 86400
+
+_SESSION_INFO_KEY = "account_session_cache_version_keys"
+
+
+@dataclass(frozen=True)
+class AccountSession:
+    """
+    An account with its current tenant and its role in it, the rows are detached.
+    """
+
+    account: Account
+    tenant: Tenant
+    role: str
+    account_version: Optional[bytes]
+    tenant_version: Optional[bytes]
+
+
+class AccountSessionCache:
+    """
+    Cache of the account, current tenant and role resolved for every console request.
+
+    Every account and tenant has a version in Redis, bumped when a change to the account, the tenant or one of
+    the account's memberships is committed. A cached session is only used while the versions it was loaded
+    with are current, which costs one Redis round trip instead of the database queries.
+    """
+
+    _entries: OrderedDict[str, tuple[float, AccountSession]] = OrderedDict()
+    _lock = threading.Lock()
+
+    _last_active_at: dict[str, datetime] = {}
+    _last_active_at_flushed_at = time.monotonic()
+
+    @staticmethod
+    def account_version_key(account_id: str) -> str:
+        return f"account_session_version:account:{account_id}"
+
+    @staticmethod
+    def tenant_version_key(tenant_id: str) -> str:
+        return f"account_session_version:tenant:{tenant_id}"
+
+    @classmethod
+    def get_versions(cls, account_id: str, tenant_id: str) -> tuple[Optional[bytes], Optional[bytes]]:
+        account_version, tenant_version = redis_client.mget(
+            [cls.account_version_key(account_id), cls.tenant_version_key(tenant_id)]
+        )
+        return account_version, tenant_version
+
+    @classmethod
+    def get_version(cls, version_key: str) -> Optional[bytes]:
+        """
+        Get a version to cache a session with, None if the cache is disabled or the version cannot be read.
+        """
+        if not dify_config.ACCOUNT_SESSION_CACHE_TTL:
+            return None
+
+        try:
+            version: Optional[bytes] = redis_client.get(version_key)
+            return version
+        except Exception:
+            logger.exception("Failed to get account session version")
+            return None
+
+    @classmethod
+    def get(cls, account_id: str) -> Optional[AccountSession]:
+        if not dify_config.ACCOUNT_SESSION_CACHE_TTL:
+            return None
+
+        with cls._lock:
+            entry = cls._entries.get(account_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del cls._entries[account_id]
+                return None
+            cls._entries.move_to_end(account_id)
+            account_session = entry[1]
+
+        try:
+            versions = cls.get_versions(account_id, account_session.tenant.id)
+        except Exception:
+            logger.exception("Failed to get account session versions")
+            return None
+
+        if versions != (account_session.account_version, account_session.tenant_version):
+            with cls._lock:
+                cls._entries.pop(account_id, None)
+            return None
+        return account_session
+
+    @classmethod
+    def set(cls, account_session: AccountSession) -> None:
+        if not dify_config.ACCOUNT_SESSION_CACHE_TTL:
+            return
+
+        account_id = account_session.account.id
+        with cls._lock:
+            cls._entries[account_id] = (time.monotonic() + dify_config.ACCOUNT_SESSION_CACHE_TTL, account_session)
+            cls._entries.move_to_end(account_id)
+            while len(cls._entries) > dify_config.ACCOUNT_SESSION_CACHE_MAX_SIZE:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def bump_versions(cls, version_keys: list[str]) -> None:
+        """
+        Invalidate the sessions cached with the given versions in every process.
+        """
+        if not version_keys:
+            return
+
+        try:
+            pipeline = redis_client.pipeline(transaction=False)
+            for version_key in version_keys:
+                pipeline.incr(version_key)
+                pipeline.expire(version_key, VERSION_TTL)
+            pipeline.execute()
+        except Exception:
+            logger.exception("Failed to bump account session versions")
+
+    @classmethod
+    def record_last_active(cls, account_id: str, active_at: datetime) -> None:
+        """
+        Record that an account was active, last_active_at is written in batches by a background thread.
+        """
+        with cls._lock:
+            cls._last_active_at[account_id] = active_at
+            if time.monotonic() - cls._last_active_at_flushed_at < LAST_ACTIVE_AT_FLUSH_INTERVAL:
+                return
+            last_active_at = cls._last_active_at
+            cls._last_active_at = {}
+            cls._last_active_at_flushed_at = time.monotonic()
+
+        thread = threading.Thread(
+            target=cls._flush_last_active_at,
+            kwargs={
+                "flask_app": current_app._get_current_object(),  # type: ignore
+                "last_active_at": last_active_at,
+            },
+            daemon=True,
+        )
+        thread.start()
+
+    @classmethod
+    def _flush_last_active_at(cls, flask_app: Flask, last_active_at: dict[str, datetime]) -> None:
+        # a core update does not flush the accounts, so the cached sessions stay valid
+        table = Account.__table__
+        stmt = (
+            update(table)
+            .where(
+                table.c.id == bindparam("account_id"),
+                or_(table.c.last_active_at.is_(None), table.c.last_active_at < bindparam("active_at")),
+            )
+            .values(last_active_at=bindparam("active_at"))
+        )
+        with flask_app.app_context():
+            try:
+                with Session(db.engine) as session:
+                    session.execute(
+                        stmt,
+                        [
+                            {"account_id": account_id, "active_at": active_at}
+                            for account_id, active_at in last_active_at.items()
+                        ],
+                    )
+                    session.commit()
+            except Exception:
+                logger.exception("Failed to update last_active_at of accounts")
+
+
+def _get_version_key(instance: Any) -> Optional[str]:
+    if isinstance(instance, Account):
+        return AccountSessionCache.account_version_key(instance.id)
+    if isinstance(instance, Tenant):
+        return AccountSessionCache.tenant_version_key(instance.id)
+    if isinstance(instance, TenantAccountJoin):
+        return AccountSessionCache.account_version_key(instance.account_id)
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_version_keys(session: Session, flush_context: Any) -> None:
+    # new memberships matter too, they may become the current tenant of an account without one
+    for instance in [*session.new, *session.dirty, *session.deleted]:
+        if isinstance(instance, Account | Tenant) and instance in session.new:
+            continue
+        key = _get_version_key(instance)
+        if key:
+            session.info.setdefault(_SESSION_INFO_KEY, set()).add(key)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_version_keys(session: Session) -> None:
+    # bump once the change is visible, so other requests cannot cache the old rows with the new versions
+    keys = session.info.pop(_SESSION_INFO_KEY, None)
+    if keys:
+        AccountSessionCache.bump_versions(sorted(keys))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_version_keys(session: Session, previous_transaction: Any) -> None:
+    session.info.pop(_SESSION_INFO_KEY, None)
@@ -1,15 +1,22 @@
 import logging
-from collections.abc import Mapping
+import os
+from collections.abc import Mapping, Sequence
 from enum import StrEnum
 from threading import Lock
 from typing import Any, Optional
 
-from httpx import Timeout, post
+import httpx
+from httpx import Timeout
 from pydantic import BaseModel
 from yarl import URL
 
 from configs import dify_config
 from core.helper.code_executor.javascript.javascript_transformer import NodeJsTemplateTransformer
+from core.helper.code_executor.jinja2.jinja2_renderer import (
+    Jinja2Renderer,
+    Jinja2RenderError,
+    Jinja2RenderSecurityError,
+)
 from core.helper.code_executor.jinja2.jinja2_transformer import Jinja2TemplateTransformer
 from core.helper.code_executor.python3.python3_transformer import Python3TemplateTransformer
 from core.helper.code_executor.template_transformer import TemplateTransformer
@@ -55,6 +62,21 @@ class CodeExecutor:
 
     supported_dependencies_languages: set[CodeLanguage] = {CodeLanguage.PYTHON3}
 
+    # long-lived client, so connections to the code execution service are kept alive between calls
+    _client: Optional[httpx.Client] = None
+    _client_pid: Optional[int] = None
+    _client_lock = Lock()
+
+    @classmethod
+    def _get_client(cls) -> httpx.Client:
+        # connections do not survive a fork, every worker process opens its own
+        if cls._client is None or cls._client_pid != os.getpid():
+            with cls._client_lock:
+                if cls._client is None or cls._client_pid != os.getpid():
+                    cls._client = httpx.Client()
+                    cls._client_pid = os.getpid()
+        return cls._client
+
     @classmethod
     def execute_code(cls, language: CodeLanguage, preload: str, code: str) -> str:
         """
@@ -75,7 +97,7 @@ class CodeExecutor:
         }
 
         try:
-            response = post(
+            response = cls._get_client().post(
                 str(url),
                 json=data,
                 headers=headers,
@@ -118,7 +140,9 @@ class CodeExecutor:
         return response_code.data.stdout or ""
 
     @classmethod
-    def execute_workflow_code_template(cls, language: CodeLanguage, code: str, inputs: Mapping[str, Any]):
+    def execute_workflow_code_template(
+        cls, language: CodeLanguage, code: str, inputs: Mapping[str, Any]
+    ) -> Mapping[str, Any]:
         """
         Execute code
         :param language: code language
@@ -126,6 +150,15 @@ class CodeExecutor:
         :param inputs: inputs
         :return:
         """
+        if language == CodeLanguage.JINJA2 and dify_config.CODE_EXECUTION_JINJA2_RENDERER == "local":
+            try:
+                return {"result": Jinja2Renderer.render(code, inputs)}
+            except Jinja2RenderSecurityError as e:
+                # the code execution service runs jinja2 without the in-process restrictions
+                logger.info(f"Template rejected by the local jinja2 sandbox, rendering it remotely: {e}")
+            except Jinja2RenderError as e:
+                raise CodeExecutionError(str(e))
+
         template_transformer = cls.code_template_transformers.get(language)
         if not template_transformer:
             raise CodeExecutionError(f"Unsupported language {language}")
@@ -138,3 +171,49 @@ class CodeExecutor:
             raise e
 
         return template_transformer.transform_response(response)
+
+    @classmethod
+    def execute_workflow_code_template_batch(
+        cls, language: CodeLanguage, code: str, inputs_list: Sequence[Mapping[str, Any]]
+    ) -> list[Mapping[str, Any] | CodeExecutionError]:
+        """
+        Execute code once per inputs, running up to CODE_EXECUTION_BATCH_SIZE calls in one sandbox run.
+        A batch the sandbox fails to run as a whole, e.g. because the code exits, is retried call by call.
+        :param language: code language
+        :param code: code
+        :param inputs_list: inputs of each call
+        :return: result of each call, or the error it failed with
+        """
+        template_transformer = cls.code_template_transformers.get(language)
+        batch_size = dify_config.CODE_EXECUTION_BATCH_SIZE
+        if not template_transformer or template_transformer.get_batch_runner_script() is None or batch_size <= 1:
+            return [cls._execute_workflow_code_template_or_error(language, code, inputs) for inputs in inputs_list]
+
+        results: list[Mapping[str, Any] | CodeExecutionError] = []
+        for start in range(0, len(inputs_list), batch_size):
+            batch = inputs_list[start : start + batch_size]
+            try:
+                runner, preload = template_transformer.transform_batch_caller(code, batch)
+                response = cls.execute_code(language, preload, runner)
+                batch_results = template_transformer.transform_batch_response(response, len(batch))
+            except (CodeExecutionError, ValueError) as e:
+                logger.info(f"Failed to execute code in batch, executing it call by call: {e}")
+                results.extend(cls._execute_workflow_code_template_or_error(language, code, inputs) for inputs in batch)
+                continue
+
+            results.extend(
+                CodeExecutionError(str(result)) if isinstance(result, ValueError) else result
+                for result in batch_results
+            )
+        return results
+
+    @classmethod
+    def _execute_workflow_code_template_or_error(
+        cls, language: CodeLanguage, code: str, inputs: Mapping[str, Any]
+    ) -> Mapping[str, Any] | CodeExecutionError:
+        try:
+            return cls.execute_workflow_code_template(language, code, inputs)
+        except CodeExecutionError as e:
+            return e
+        except ValueError as e:
+            return CodeExecutionError(str(e))
@@ -24,3 +24,30 @@ class NodeJsTemplateTransformer(TemplateTransformer):
             """
         )
         return runner_script
+
+    @classmethod
+    def get_batch_runner_script(cls) -> str:
+        runner_script = dedent(
+            f"""
+            // declare main function
+            {cls._code_placeholder}
+            
+            // decode and prepare the input object of each call
+            var inputs_list = JSON.parse(Buffer.from('{cls._inputs_placeholder}', 'base64').toString('utf-8'))
+            
+            // execute main function once per input object, keeping the error of each failed call
+            var output_jsons = inputs_list.map(function (inputs_obj) {{
+                try {{
+                    return JSON.stringify({{ output: main(inputs_obj) }})
+                }} catch (e) {{
+                    return JSON.stringify({{ error: String(e) }})
+                }}
+            }})
+            
+            // print the outputs as a json list
+            var output_json = '[' + output_jsons.join(',') + ']'
+            var result = `<<RESULT>>${{output_json}}<<RESULT>>`
+            console.log(result)
+            """
+        )
+        return runner_script
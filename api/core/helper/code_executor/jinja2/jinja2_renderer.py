@@ -0,0 +1,286 @@
+import functools
+import inspect
+import json
+import math
+import re
+import string
+import time
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Optional
+
+from jinja2 import Template, TemplateError, nodes
+from jinja2.sandbox import SandboxedEnvironment, SecurityError
+
+from configs import dify_config
+
+# number of compiled templates kept per process
+TEMPLATE_CACHE_SIZE = 1024
+
+# width and precision of printf-style conversion specifiers, e.g. `%-20.3f`
+_PRINTF_SPEC_PATTERN = re.compile(r"%(?:\([^)]*\))?[#0 +-]*(\*|\d+)?(?:\.(\*|\d+))?")
+
+_deadline: ContextVar[Optional[float]] = ContextVar("jinja2_render_deadline", default=None)
+
+
+class Jinja2RenderError(Exception):
+    pass
+
+
+class Jinja2RenderSecurityError(Jinja2RenderError):
+    """
+    Raised when a template does something the in-process sandbox does not allow.
+    """
+
+    pass
+
+
+# filter every for loop of a template iterates through, it is not meant to be used in templates
+_DEADLINE_CHECKED_FILTER = "_deadline_checked"
+
+
+class _RenderLimitsEnvironment(SandboxedEnvironment):
+    """
+    Sandboxed environment that checks the render deadline on every call and on every loop iteration in
+    the template, and keeps operators, string and list methods and filters from building values larger
+    than the output limit before they allocate them.
+    """
+
+    intercepted_binops = frozenset(["*", "**", "%"])
+
+    def _parse(self, source: str, name: Optional[str], filename: Optional[str]) -> nodes.Template:
+        template = super()._parse(source, name, filename)
+        # loops that neither call anything nor output anything would otherwise never check the deadline
+        for loop in template.find_all(nodes.For):
+            loop.iter = nodes.Filter(loop.iter, _DEADLINE_CHECKED_FILTER, [], [], None, None, lineno=loop.lineno)
+        return template
+
+    def call(self, context: Any, obj: Any, /, *args: Any, **kwargs: Any) -> Any:
+        _check_deadline()
+        args = _check_method_call(obj, args, kwargs)
+        return super().call(context, obj, *args, **kwargs)
+
+    def call_binop(self, context: Any, operator: str, left: Any, right: Any) -> Any:
+        _check_deadline()
+        if operator == "*":
+            for sequence, times in ((left, right), (right, left)):
+                if isinstance(sequence, str | bytes | list | tuple) and isinstance(times, int):
+                    _check_length(len(sequence) * times)
+            if isinstance(left, int) and isinstance(right, int):
+                _check_int_bits(left.bit_length() + right.bit_length())
+        elif operator == "**":
+            if isinstance(left, int) and isinstance(right, int) and right > 0 and abs(left) > 1:
+                _check_int_bits(left.bit_length() * right)
+        elif isinstance(left, str):
+            _check_printf_format(left)
+        return super().call_binop(context, operator, left, right)
+
+    def wrap_str_format(self, value: Any) -> Optional[Callable[..., str]]:
+        # str.format and str.format_map are wrapped when the template accesses them
+        wrapper = super().wrap_str_format(value)
+        if wrapper is not None:
+            _check_format_string(value.__self__)
+        return wrapper
+
+
+def _check_deadline() -> None:
+    deadline = _deadline.get()
+    if deadline is not None and time.monotonic() > deadline:
+        raise Jinja2RenderError("Template rendering timed out")
+
+
+def _deadline_checked(iterable: Iterable[Any]) -> Iterator[Any]:
+    for item in iterable:
+        _check_deadline()
+        yield item
+
+
+def _check_length(length: Any) -> None:
+    max_output_length = dify_config.CODE_EXECUTION_JINJA2_MAX_OUTPUT_LENGTH
+    if isinstance(length, int) and length > max_output_length:
+        raise Jinja2RenderError(f"Template output exceeds {max_output_length} characters")
+
+
+def _check_int_bits(bits: int) -> None:
+    # an integer is as large as its decimal representation
+    _check_length(math.ceil(bits * math.log10(2)))
+
+
+def _check_printf_format(format_string: str) -> None:
+    for width, precision in _PRINTF_SPEC_PATTERN.findall(format_string):
+        for length in (width, precision):
+            if length == "*":
+                raise Jinja2RenderSecurityError("Variable widths in format strings are not supported in process")
+            if length:
+                _check_length(int(length))
+
+
+def _check_format_string(format_string: str) -> None:
+    for _, _, format_spec, _ in string.Formatter().parse(format_string):
+        if not format_spec:
+            continue
+        if "{" in format_spec:
+            raise Jinja2RenderSecurityError("Nested format specs are not supported in process")
+        for length in re.findall(r"\d+", format_spec):
+            _check_length(int(length))
+
+
+def _check_replace(value: Any, old: Any, new: Any, count: Any = -1) -> None:
+    if not isinstance(old, str | bytes) or not isinstance(new, str | bytes):
+        return
+    occurrences = value.count(old) if old else len(value) + 1
+    if isinstance(count, int) and count >= 0:
+        occurrences = min(occurrences, count)
+    _check_length(len(value) + occurrences * len(new))
+
+
+def _check_method_call(method: Any, args: tuple, kwargs: Mapping[str, Any]) -> tuple:
+    """
+    Check the size of the result of a str, bytes or list method before it is called, str.format is checked
+    in `wrap_str_format`.
+
+    :return: the arguments to call the method with, iterables joined are materialized to count them
+    """
+    owner = getattr(method, "__self__", None)
+    name = getattr(method, "__name__", "")
+
+    def get_arg(index: int, keyword: str, default: Any) -> Any:
+        return args[index] if len(args) > index else kwargs.get(keyword, default)
+
+    if isinstance(owner, str | bytes):
+        if name in {"center", "ljust", "rjust", "zfill"}:
+            _check_length(get_arg(0, "width", 0))
+        elif name == "expandtabs":
+            tab_size = get_arg(0, "tabsize", 8)
+            if isinstance(tab_size, int):
+                tab_count = owner.count("\t") if isinstance(owner, str) else owner.count(b"\t")
+                _check_length(len(owner) + tab_count * tab_size)
+        elif name == "replace" and len(args) >= 2:
+            _check_replace(owner, args[0], args[1], get_arg(2, "count", -1))
+        elif name == "join" and args:
+            items = list(args[0])
+            _check_length(len(owner) * max(len(items) - 1, 0))
+            args = (items, *args[1:])
+        elif name == "translate" and args and isinstance(args[0], Mapping):
+            longest = max((len(value) for value in args[0].values() if isinstance(value, str | bytes)), default=1)
+            _check_length(len(owner) * longest)
+    elif isinstance(owner, list):
+        if name in {"append", "insert"}:
+            _check_length(len(owner) + 1)
+        elif name == "extend" and args:
+            items = list(args[0])
+            _check_length(len(owner) + len(items))
+            args = (items, *args[1:])
+    return args
+
+
+def _check_indent(arguments: dict[str, Any]) -> None:
+    width = arguments["width"]
+    width_length = len(width) if isinstance(width, str) else width
+    if isinstance(width_length, int):
+        _check_length(len(str(arguments["s"])) + width_length * (str(arguments["s"]).count("\n") + 1))
+
+
+def _check_wordwrap(arguments: dict[str, Any]) -> None:
+    value = str(arguments["s"])
+    width = arguments["width"]
+    wrapstring = arguments["wrapstring"] or arguments["environment"].newline_sequence
+    if isinstance(width, int):
+        lines = min(len(value) + 1, len(value) // max(width, 1) + len(value.split()) + 1)
+        _check_length(len(value) + lines * len(wrapstring))
+
+
+def _check_join(arguments: dict[str, Any]) -> None:
+    items = arguments["value"] = list(arguments["value"])
+    _check_length(len(str(arguments["d"])) * max(len(items) - 1, 0))
+
+
+def _check_format(arguments: dict[str, Any]) -> None:
+    if isinstance(arguments["value"], str):
+        _check_printf_format(arguments["value"])
+
+
+# checks run on the arguments of filters that can build values much larger than their input
+_FILTER_SIZE_CHECKS: dict[str, Callable[[dict[str, Any]], None]] = {
+    "center": lambda arguments: _check_length(arguments["width"]),
+    "indent": _check_indent,
+    "replace": lambda arguments: _check_replace(
+        str(arguments["s"]), arguments["old"], arguments["new"], arguments["count"]
+    ),
+    "format": _check_format,
+    "wordwrap": _check_wordwrap,
+    "join": _check_join,
+    "batch": lambda arguments: _check_length(arguments["linecount"]),
+    "slice": lambda arguments: _check_length(arguments["slices"]),
+}
+
+
+def _size_checked_filter(filter_func: Callable[..., Any], check: Callable[[dict[str, Any]], None]) -> Callable:
+    signature = inspect.signature(filter_func)
+
+    # functools.wraps keeps the pass_context / pass_environment markers of the filter
+    @functools.wraps(filter_func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        bound_arguments = signature.bind(*args, **kwargs)
+        bound_arguments.apply_defaults()
+        check(bound_arguments.arguments)
+        return filter_func(*bound_arguments.args, **bound_arguments.kwargs)
+
+    return wrapper
+
+
+_environment = _RenderLimitsEnvironment()
+_environment.filters[_DEADLINE_CHECKED_FILTER] = _deadline_checked
+for _filter_name, _check in _FILTER_SIZE_CHECKS.items():
+    _environment.filters[_filter_name] = _size_checked_filter(_environment.filters[_filter_name], _check)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _get_template(template: str) -> Template:
+    return _environment.from_string(template)
+
+
+class Jinja2Renderer:
+    """
+    Renders jinja2 templates in process, in a sandboxed environment limited in time and output length.
+    """
+
+    @classmethod
+    def render(cls, template: str, inputs: Mapping[str, Any]) -> str:
+        """
+        Render template
+        :param template: template
+        :param inputs: inputs, passed through JSON like the inputs of the remote sandbox
+        :return: rendered template
+        """
+        try:
+            compiled_template = _get_template(template)
+        except TemplateError as e:
+            raise Jinja2RenderError(str(e))
+
+        max_output_length = dify_config.CODE_EXECUTION_JINJA2_MAX_OUTPUT_LENGTH
+        deadline = time.monotonic() + dify_config.CODE_EXECUTION_JINJA2_TIMEOUT
+        context = json.loads(json.dumps(inputs, ensure_ascii=False))
+
+        output: list[str] = []
+        output_length = 0
+        token = _deadline.set(deadline)
+        try:
+            for chunk in compiled_template.generate(context):
+                output_length += len(chunk)
+                if output_length > max_output_length:
+                    raise Jinja2RenderError(f"Template output exceeds {max_output_length} characters")
+                if time.monotonic() > deadline:
+                    raise Jinja2RenderError("Template rendering timed out")
+                output.append(chunk)
+        except SecurityError as e:
+            raise Jinja2RenderSecurityError(str(e))
+        except Jinja2RenderError:
+            raise
+        except Exception as e:
+            raise Jinja2RenderError(f"{type(e).__name__}: {e}")
+        finally:
+            _deadline.reset(token)
+
+        return "".join(output)
@@ -25,3 +25,30 @@ class Python3TemplateTransformer(TemplateTransformer):
             print(result)
             """)
         return runner_script
+
+    @classmethod
+    def get_batch_runner_script(cls) -> str:
+        runner_script = dedent(f"""
+            # declare main function
+            {cls._code_placeholder}
+            
+            import json
+            from base64 import b64decode
+            
+            # decode and prepare the input dict of each call
+            inputs_list = json.loads(b64decode('{cls._inputs_placeholder}').decode('utf-8'))
+            
+            # execute main function once per input dict, keeping the error of each failed call
+            output_jsons = []
+            for inputs_obj in inputs_list:
+                try:
+                    output_jsons.append(json.dumps({{"output": main(**inputs_obj)}}))
+                except Exception as e:
+                    output_jsons.append(json.dumps({{"error": f"{{type(e).__name__}}: {{e}}"}}))
+            
+            # print the outputs as a json list
+            output_json = "[" + ",".join(output_jsons) + "]"
+            result = f'''<<RESULT>>{{output_json}}<<RESULT>>'''
+            print(result)
+            """)
+        return runner_script
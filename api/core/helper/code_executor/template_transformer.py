@@ -2,8 +2,8 @@ import json
 import re
 from abc import ABC, abstractmethod
 from base64 import b64encode
-from collections.abc import Mapping
-from typing import Any
+from collections.abc import Mapping, Sequence
+from typing import Any, Optional
 
 
 class TemplateTransformer(ABC):
@@ -24,6 +24,22 @@ class TemplateTransformer(ABC):
 
         return runner_script, preload_script
 
+    @classmethod
+    def transform_batch_caller(cls, code: str, inputs_list: Sequence[Mapping[str, Any]]) -> tuple[str, str]:
+        """
+        Transform code to a runner calling it once per inputs
+        :param code: code
+        :param inputs_list: inputs of each call
+        :return: runner, preload
+        """
+        batch_runner_script = cls.get_batch_runner_script()
+        if batch_runner_script is None:
+            raise ValueError(f"{cls.__name__} does not support batch execution")
+
+        script = batch_runner_script.replace(cls._code_placeholder, code)
+        script = script.replace(cls._inputs_placeholder, cls.serialize_inputs(inputs_list))
+        return script, cls.get_preload_script()
+
     @classmethod
     def extract_result_str_from_response(cls, response: str):
         result = re.search(rf"{cls._result_tag}(.*){cls._result_tag}", response, re.DOTALL)
@@ -42,6 +58,38 @@ class TemplateTransformer(ABC):
             result = json.loads(cls.extract_result_str_from_response(response))
         except json.JSONDecodeError:
             raise ValueError("failed to parse response")
+        return cls.check_result(result)
+
+    @classmethod
+    def transform_batch_response(cls, response: str, count: int) -> list[Mapping[str, Any] | ValueError]:
+        """
+        Transform the response of a batch runner to the result of each call
+        :param response: response
+        :param count: number of calls in the batch
+        :return: result of each call, or the error it failed with
+        """
+        try:
+            results = json.loads(cls.extract_result_str_from_response(response))
+        except json.JSONDecodeError:
+            raise ValueError("failed to parse response")
+        if not isinstance(results, list) or len(results) != count:
+            raise ValueError(f"batch result must be a list of {count} results")
+
+        transformed: list[Mapping[str, Any] | ValueError] = []
+        for result in results:
+            if not isinstance(result, dict) or ("output" not in result and "error" not in result):
+                raise ValueError("failed to parse batch result")
+            if "error" in result:
+                transformed.append(ValueError(result["error"]))
+                continue
+            try:
+                transformed.append(cls.check_result(result["output"]))
+            except ValueError as e:
+                transformed.append(e)
+        return transformed
+
+    @classmethod
+    def check_result(cls, result: Any) -> Mapping[str, Any]:
         if not isinstance(result, dict):
             raise ValueError("result must be a dict")
         if not all(isinstance(k, str) for k in result):
@@ -57,7 +105,14 @@ class TemplateTransformer(ABC):
         pass
 
     @classmethod
-    def serialize_inputs(cls, inputs: Mapping[str, Any]) -> str:
+    def get_batch_runner_script(cls) -> Optional[str]:
+        """
+        Get the runner script calling the code once per inputs, None if batch execution is not supported
+        """
+        return None
+
+    @classmethod
+    def serialize_inputs(cls, inputs: Mapping[str, Any] | Sequence[Mapping[str, Any]]) -> str:
         inputs_json_str = json.dumps(inputs, ensure_ascii=False).encode()
         input_base64_encoded = b64encode(inputs_json_str).decode("utf-8")
         return input_base64_encoded
@@ -0,0 +1,229 @@
+"""
+Process-local cache of the Service API authentication lookups
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import UTC, datetime
+from typing import Any, Optional
+
+from flask import Flask, current_app
+from sqlalchemy import bindparam, event, or_, update
+from sqlalchemy.orm import Session
+
+from configs import dify_config
+from extensions.ext_database import db
+from extensions.ext_redis import redis_client
+from models.account import Tenant
+from models.model import ApiToken, App, EndUser
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "service_api_auth_cache_invalidation"
+# api tokens only record when they were last used to the minute
+LAST_USED_AT_FLUSH_INTERVAL = 60
+
+_SESSION_INFO_KEY = "service_api_auth_cache_keys"
+
+
+class ServiceApiAuthCache:
+    """
+    Cache of the rows resolved by the Service API authentication: api tokens, apps, tenant statuses and end users.
+
+    Entries live at most SERVICE_API_AUTH_CACHE_TTL seconds. Committing a change to one of the cached rows
+    drops its entry in every process through a Redis pub/sub channel, so a disabled app or a deleted api key
+    is rejected immediately. Cached rows are detached, callers merge them into their session.
+    """
+
+    _entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+    _lock = threading.Lock()
+    _subscriber_pid: Optional[int] = None
+
+    _last_used_at: dict[str, datetime] = {}
+    _last_used_at_flushed_at = time.monotonic()
+
+    @staticmethod
+    def api_token_key(scope: Optional[str], token: str) -> str:
+        return f"api_token:{scope}:{token}"
+
+    @staticmethod
+    def app_key(app_id: str) -> str:
+        return f"app:{app_id}"
+
+    @staticmethod
+    def tenant_key(tenant_id: str) -> str:
+        return f"tenant:{tenant_id}"
+
+    @staticmethod
+    def end_user_key(app_id: str, session_id: str) -> str:
+        return f"end_user:{app_id}:{session_id}"
+
+    @classmethod
+    def get(cls, key: str) -> Any:
+        if not dify_config.SERVICE_API_AUTH_CACHE_TTL:
+            return None
+
+        cls._ensure_subscriber()
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del cls._entries[key]
+                return None
+            cls._entries.move_to_end(key)
+            return entry[1]
+
+    @classmethod
+    def set(cls, key: str, value: Any) -> None:
+        if not dify_config.SERVICE_API_AUTH_CACHE_TTL:
+            return
+
+        with cls._lock:
+            cls._entries[key] = (time.monotonic() + dify_config.SERVICE_API_AUTH_CACHE_TTL, value)
+            cls._entries.move_to_end(key)
+            while len(cls._entries) > dify_config.SERVICE_API_AUTH_CACHE_MAX_SIZE:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def invalidate(cls, keys: list[str]) -> None:
+        """
+        Drop the given entries in this process and, through the invalidation channel, in every other process.
+        """
+        if not keys:
+            return
+
+        cls._delete_local(keys)
+        try:
+            redis_client.publish(INVALIDATION_CHANNEL, json.dumps(keys))
+        except Exception:
+            logger.exception("Failed to publish service api auth cache invalidation")
+
+    @classmethod
+    def record_last_used(cls, api_token_id: str) -> None:
+        """
+        Record that an api token was used, last_used_at is written in batches by a background thread.
+        """
+        now = datetime.now(UTC).replace(tzinfo=None)
+        with cls._lock:
+            cls._last_used_at[api_token_id] = now
+            if time.monotonic() - cls._last_used_at_flushed_at < LAST_USED_AT_FLUSH_INTERVAL:
+                return
+            last_used_at = cls._last_used_at
+            cls._last_used_at = {}
+            cls._last_used_at_flushed_at = time.monotonic()
+
+        thread = threading.Thread(
+            target=cls._flush_last_used_at,
+            kwargs={
+                "flask_app": current_app._get_current_object(),  # type: ignore
+                "last_used_at": last_used_at,
+            },
+            daemon=True,
+        )
+        thread.start()
+
+    @classmethod
+    def _flush_last_used_at(cls, flask_app: Flask, last_used_at: dict[str, datetime]) -> None:
+        table = ApiToken.__table__
+        stmt = (
+            update(table)
+            .where(
+                table.c.id == bindparam("api_token_id"),
+                or_(table.c.last_used_at.is_(None), table.c.last_used_at < bindparam("used_at")),
+            )
+            .values(last_used_at=bindparam("used_at"))
+        )
+        with flask_app.app_context():
+            try:
+                with Session(db.engine) as session:
+                    session.execute(
+                        stmt,
+                        [
+                            {"api_token_id": api_token_id, "used_at": used_at}
+                            for api_token_id, used_at in last_used_at.items()
+                        ],
+                    )
+                    session.commit()
+            except Exception:
+                logger.exception("Failed to update last_used_at of api tokens")
+
+    @classmethod
+    def _delete_local(cls, keys: list[str]) -> None:
+        with cls._lock:
+            for key in keys:
+                cls._entries.pop(key, None)
+
+    @classmethod
+    def _clear_local(cls) -> None:
+        with cls._lock:
+            cls._entries.clear()
+
+    @classmethod
+    def _ensure_subscriber(cls) -> None:
+        # the subscriber thread does not survive a fork, every worker process starts its own
+        if cls._subscriber_pid == os.getpid():
+            return
+
+        with cls._lock:
+            if cls._subscriber_pid == os.getpid():
+                return
+            cls._subscriber_pid = os.getpid()
+            cls._entries.clear()
+            cls._last_used_at = {}
+
+        thread = threading.Thread(target=cls._listen, name="service_api_auth_cache_subscriber", daemon=True)
+        thread.start()
+
+    @classmethod
+    def _listen(cls) -> None:
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                for message in pubsub.listen():
+                    if message["type"] == "message":
+                        cls._delete_local(json.loads(message["data"]))
+            except Exception:
+                logger.exception("Service api auth cache subscriber disconnected")
+
+            # invalidations may have been missed while disconnected
+            cls._clear_local()
+            time.sleep(1)
+
+
+def _get_invalidation_key(instance: Any) -> Optional[str]:
+    if isinstance(instance, ApiToken):
+        return ServiceApiAuthCache.api_token_key(instance.type, instance.token)
+    if isinstance(instance, App):
+        return ServiceApiAuthCache.app_key(instance.id)
+    if isinstance(instance, Tenant):
+        return ServiceApiAuthCache.tenant_key(instance.id)
+    if isinstance(instance, EndUser):
+        return ServiceApiAuthCache.end_user_key(instance.app_id, instance.session_id)
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_invalidation_keys(session: Session, flush_context: Any) -> None:
+    for instance in [*session.dirty, *session.deleted]:
+        key = _get_invalidation_key(instance)
+        if key:
+            session.info.setdefault(_SESSION_INFO_KEY, set()).add(key)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_invalidation_keys(session: Session) -> None:
+    # invalidate once the change is visible, so other requests cannot cache the old row again
+    keys = session.info.pop(_SESSION_INFO_KEY, None)
+    if keys:
+        ServiceApiAuthCache.invalidate(sorted(keys))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_invalidation_keys(session: Session, previous_transaction: Any) -> None:
+    session.info.pop(_SESSION_INFO_KEY, None)
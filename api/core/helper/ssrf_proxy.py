@@ -2,8 +2,13 @@
 Proxy requests to avoid SSRF
 """
 
+import importlib.util
 import logging
+import os
+import threading
 import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Any, Optional
 
 import httpx
 
@@ -14,6 +19,10 @@ SSRF_DEFAULT_MAX_RETRIES = dify_config.SSRF_DEFAULT_MAX_RETRIES
 BACKOFF_FACTOR = 0.5
 STATUS_FORCELIST = [429, 500, 502, 503, 504]
 
+# long-lived clients keyed by process and proxy configuration, so connections are kept alive between requests
+_clients: dict[tuple, httpx.Client] = {}
+_clients_lock = threading.Lock()
+
 
 class MaxRetriesExceededError(ValueError):
     """Raised when the maximum number of retries is exceeded."""
@@ -21,37 +30,27 @@ class MaxRetriesExceededError(ValueError):
     pass
 
 
-def make_request(method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
-    if "allow_redirects" in kwargs:
-        allow_redirects = kwargs.pop("allow_redirects")
-        if "follow_redirects" not in kwargs:
-            kwargs["follow_redirects"] = allow_redirects
+class RequestCancelledError(ValueError):
+    """Raised when the request is cancelled while waiting for a retry."""
 
-    if "timeout" not in kwargs:
-        kwargs["timeout"] = httpx.Timeout(
-            timeout=dify_config.SSRF_DEFAULT_TIME_OUT,
-            connect=dify_config.SSRF_DEFAULT_CONNECT_TIME_OUT,
-            read=dify_config.SSRF_DEFAULT_READ_TIME_OUT,
-            write=dify_config.SSRF_DEFAULT_WRITE_TIME_OUT,
-        )
+    pass
+
+
+def make_request(
+    method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, cancel_event: Optional[threading.Event] = None, **kwargs
+):
+    """
+    Send a request through the pooled client, retrying with exponential backoff.
+
+    :param cancel_event: when set, the backoff between retries is interrupted and RequestCancelledError is raised
+    """
+    _prepare_request_kwargs(kwargs)
+    client = _get_client()
 
     retries = 0
     while retries <= max_retries:
         try:
-            if dify_config.SSRF_PROXY_ALL_URL:
-                with httpx.Client(proxy=dify_config.SSRF_PROXY_ALL_URL) as client:
-                    response = client.request(method=method, url=url, **kwargs)
-            elif dify_config.SSRF_PROXY_HTTP_URL and dify_config.SSRF_PROXY_HTTPS_URL:
-                proxy_mounts = {
-                    "http://": httpx.HTTPTransport(proxy=dify_config.SSRF_PROXY_HTTP_URL),
-                    "https://": httpx.HTTPTransport(proxy=dify_config.SSRF_PROXY_HTTPS_URL),
-                }
-                with httpx.Client(mounts=proxy_mounts) as client:
-                    response = client.request(method=method, url=url, **kwargs)
-            else:
-                with httpx.Client() as client:
-                    response = client.request(method=method, url=url, **kwargs)
-
+            response = client.request(method=method, url=url, **kwargs)
             if response.status_code not in STATUS_FORCELIST:
                 return response
             else:
@@ -64,10 +63,76 @@ def make_request(method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
 
         retries += 1
         if retries <= max_retries:
-            time.sleep(BACKOFF_FACTOR * (2 ** (retries - 1)))
+            if cancel_event is None:
+                time.sleep(_get_backoff(retries))
+            elif cancel_event.wait(_get_backoff(retries)):
+                raise RequestCancelledError(f"Request to URL {url} was cancelled")
     raise MaxRetriesExceededError(f"Reached maximum retries ({max_retries}) for URL {url}")
 
 
+def _prepare_request_kwargs(kwargs: dict[str, Any]) -> None:
+    if "allow_redirects" in kwargs:
+        allow_redirects = kwargs.pop("allow_redirects")
+        if "follow_redirects" not in kwargs:
+            kwargs["follow_redirects"] = allow_redirects
+
+    if "timeout" not in kwargs:
+        kwargs["timeout"] = httpx.Timeout(
+            timeout=dify_config.SSRF_DEFAULT_TIME_OUT,
+            connect=dify_config.SSRF_DEFAULT_CONNECT_TIME_OUT,
+            read=dify_config.SSRF_DEFAULT_READ_TIME_OUT,
+            write=dify_config.SSRF_DEFAULT_WRITE_TIME_OUT,
+        )
+
+
+def _get_backoff(retries: int) -> float:
+    return float(BACKOFF_FACTOR * (2 ** (retries - 1)))
+
+
+def _get_client_key() -> tuple:
+    # clients must not be shared with forked worker processes
+    return (
+        os.getpid(),
+        dify_config.SSRF_PROXY_ALL_URL,
+        dify_config.SSRF_PROXY_HTTP_URL,
+        dify_config.SSRF_PROXY_HTTPS_URL,
+    )
+
+
+def _get_client_kwargs() -> dict[str, Any]:
+    http2 = dify_config.SSRF_POOL_HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+    limits = httpx.Limits(
+        max_connections=dify_config.SSRF_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=dify_config.SSRF_POOL_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=dify_config.SSRF_POOL_KEEPALIVE_EXPIRY,
+    )
+    client_kwargs: dict[str, Any] = {
+        # the client is shared by all requests, so it must never store cookies set by a response
+        "cookies": CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        "http2": http2,
+        "limits": limits,
+    }
+    if dify_config.SSRF_PROXY_ALL_URL:
+        client_kwargs["proxy"] = dify_config.SSRF_PROXY_ALL_URL
+    elif dify_config.SSRF_PROXY_HTTP_URL and dify_config.SSRF_PROXY_HTTPS_URL:
+        client_kwargs["mounts"] = {
+            "http://": httpx.HTTPTransport(proxy=dify_config.SSRF_PROXY_HTTP_URL, http2=http2, limits=limits),
+            "https://": httpx.HTTPTransport(proxy=dify_config.SSRF_PROXY_HTTPS_URL, http2=http2, limits=limits),
+        }
+    return client_kwargs
+
+
+def _get_client() -> httpx.Client:
+    key = _get_client_key()
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = httpx.Client(**_get_client_kwargs())
+    return client
+
+
 def get(url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
     return make_request("GET", url, max_retries=max_retries, **kwargs)
 
@@ -2,14 +2,18 @@ import concurrent.futures
 import datetime
 import json
 import logging
+import queue
 import re
 import threading
 import time
 import uuid
+from collections import deque
+from collections.abc import Callable, Sequence
 from typing import Any, Optional, cast
 
-from flask import current_app
+from flask import Flask, current_app
 from flask_login import current_user  # type: ignore
+from sqlalchemy import func
 from sqlalchemy.orm.exc import ObjectDeletedError
 
 from configs import dify_config
@@ -20,6 +24,7 @@ from core.model_runtime.entities.model_entities import ModelType
 from core.rag.cleaner.clean_processor import CleanProcessor
 from core.rag.datasource.keyword.keyword_factory import Keyword
 from core.rag.docstore.dataset_docstore import DatasetDocumentStore
+from core.rag.embedding.cached_token_counter import CachedTokenCounter
 from core.rag.extractor.entity.extract_setting import ExtractSetting
 from core.rag.index_processor.constant.index_type import IndexType
 from core.rag.index_processor.index_processor_base import BaseIndexProcessor
@@ -38,8 +43,12 @@ from libs import helper
 from models.dataset import ChildChunk, Dataset, DatasetProcessRule, DocumentSegment
 from models.dataset import Document as DatasetDocument
 from models.model import UploadFile
+from services.entities.knowledge_entities.knowledge_entities import ParentMode
 from services.feature_service import FeatureService
 
+# checkpoints outlive paused documents, a document resumed without one is split again
+INDEXING_CHECKPOINT_TTL = 30 * 86400
+
 
 class IndexingRunner:
     def __init__(self):
@@ -66,22 +75,18 @@ class IndexingRunner:
                     raise ValueError("no process rule found")
                 index_type = dataset_document.doc_form
                 index_processor = IndexProcessorFactory(index_type).init_index_processor()
+                # a document indexed from scratch does not resume an earlier run
+                self._delete_checkpoint(dataset_document.id)
                 # extract
                 text_docs = self._extract(index_processor, dataset_document, processing_rule.to_dict())
 
-                # transform
-                documents = self._transform(
-                    index_processor, dataset, text_docs, dataset_document.doc_language, processing_rule.to_dict()
-                )
-                # save segment
-                self._load_segments(dataset, dataset_document, documents)
-
-                # load
-                self._load(
+                # transform, save segment and load
+                self._run_pipeline(
                     index_processor=index_processor,
                     dataset=dataset,
                     dataset_document=dataset_document,
-                    documents=documents,
+                    process_rule=processing_rule.to_dict(),
+                    text_docs=text_docs,
                 )
             except DocumentIsPausedError:
                 raise DocumentIsPausedError("Document paused, document id: {}".format(dataset_document.id))
@@ -108,11 +113,30 @@ class IndexingRunner:
             if not dataset:
                 raise ValueError("no dataset found")
 
-            # get exist document_segment list and delete
+            index_type = dataset_document.doc_form
+            index_processor = IndexProcessorFactory(index_type).init_index_processor()
+
+            # get exist document_segment list and delete those saved after the checkpoint, if any
             document_segments = DocumentSegment.query.filter_by(
                 dataset_id=dataset.id, document_id=dataset_document.id
             ).all()
-
+            checkpoint = self._get_checkpoint(dataset_document.id)
+            start_page = 0
+            documents: list[Document] = []
+            if checkpoint:
+                start_page = checkpoint["pages"]
+                documents = self._get_unindexed_documents(
+                    dataset_document,
+                    [segment for segment in document_segments if segment.position <= checkpoint["position"]],
+                )
+                document_segments = [
+                    segment for segment in document_segments if segment.position > checkpoint["position"]
+                ]
+
+            # segments queued for indexing may already be in the index
+            queued_node_ids = [segment.index_node_id for segment in document_segments if segment.status != "waiting"]
+            if queued_node_ids:
+                index_processor.clean(dataset, queued_node_ids, with_keywords=True)
             for document_segment in document_segments:
                 db.session.delete(document_segment)
                 if dataset_document.doc_form == IndexType.PARENT_CHILD_INDEX:
@@ -128,21 +152,18 @@ class IndexingRunner:
             if not processing_rule:
                 raise ValueError("no process rule found")
 
-            index_type = dataset_document.doc_form
-            index_processor = IndexProcessorFactory(index_type).init_index_processor()
             # extract
             text_docs = self._extract(index_processor, dataset_document, processing_rule.to_dict())
 
-            # transform
-            documents = self._transform(
-                index_processor, dataset, text_docs, dataset_document.doc_language, processing_rule.to_dict()
-            )
-            # save segment
-            self._load_segments(dataset, dataset_document, documents)
-
-            # load
-            self._load(
-                index_processor=index_processor, dataset=dataset, dataset_document=dataset_document, documents=documents
+            # transform the pages after the checkpoint, save segment and load
+            self._run_pipeline(
+                index_processor=index_processor,
+                dataset=dataset,
+                dataset_document=dataset_document,
+                process_rule=processing_rule.to_dict(),
+                text_docs=text_docs,
+                start_page=start_page,
+                documents=documents,
             )
         except DocumentIsPausedError:
             raise DocumentIsPausedError("Document paused, document id: {}".format(dataset_document.id))
@@ -172,37 +193,7 @@ class IndexingRunner:
                 dataset_id=dataset.id, document_id=dataset_document.id
             ).all()
 
-            documents = []
-            if document_segments:
-                for document_segment in document_segments:
-                    # transform segment to node
-                    if document_segment.status != "completed":
-                        document = Document(
-                            page_content=document_segment.content,
-                            metadata={
-                                "doc_id": document_segment.index_node_id,
-                                "doc_hash": document_segment.index_node_hash,
-                                "document_id": document_segment.document_id,
-                                "dataset_id": document_segment.dataset_id,
-                            },
-                        )
-                        if dataset_document.doc_form == IndexType.PARENT_CHILD_INDEX:
-                            child_chunks = document_segment.child_chunks
-                            if child_chunks:
-                                child_documents = []
-                                for child_chunk in child_chunks:
-                                    child_document = ChildDocument(
-                                        page_content=child_chunk.content,
-                                        metadata={
-                                            "doc_id": child_chunk.index_node_id,
-                                            "doc_hash": child_chunk.index_node_hash,
-                                            "document_id": document_segment.document_id,
-                                            "dataset_id": document_segment.dataset_id,
-                                        },
-                                    )
-                                    child_documents.append(child_document)
-                                document.children = child_documents
-                        documents.append(document)
+            documents = self._get_unindexed_documents(dataset_document, document_segments)
 
             # build index
             # get the process rule
@@ -231,6 +222,45 @@ class IndexingRunner:
             dataset_document.stopped_at = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
             db.session.commit()
 
+    @staticmethod
+    def _get_unindexed_documents(
+        dataset_document: DatasetDocument, document_segments: list[DocumentSegment]
+    ) -> list[Document]:
+        """
+        Get the documents of the segments that are saved but not indexed yet.
+        """
+        documents = []
+        for document_segment in document_segments:
+            # transform segment to node
+            if document_segment.status != "completed":
+                document = Document(
+                    page_content=document_segment.content,
+                    metadata={
+                        "doc_id": document_segment.index_node_id,
+                        "doc_hash": document_segment.index_node_hash,
+                        "document_id": document_segment.document_id,
+                        "dataset_id": document_segment.dataset_id,
+                    },
+                )
+                if dataset_document.doc_form == IndexType.PARENT_CHILD_INDEX:
+                    child_chunks = document_segment.child_chunks
+                    if child_chunks:
+                        child_documents = []
+                        for child_chunk in child_chunks:
+                            child_document = ChildDocument(
+                                page_content=child_chunk.content,
+                                metadata={
+                                    "doc_id": child_chunk.index_node_id,
+                                    "doc_hash": child_chunk.index_node_hash,
+                                    "document_id": document_segment.document_id,
+                                    "dataset_id": document_segment.dataset_id,
+                                },
+                            )
+                            child_documents.append(child_document)
+                        document.children = child_documents
+                documents.append(document)
+        return documents
+
     def indexing_estimate(
         self,
         tenant_id: str,
@@ -517,59 +547,130 @@ class IndexingRunner:
         """
         insert index and update document/segment status to completed
         """
+        self._run_pipeline(
+            index_processor=index_processor,
+            dataset=dataset,
+            dataset_document=dataset_document,
+            process_rule=None,
+            text_docs=None,
+            documents=documents,
+        )
 
-        embedding_model_instance = None
-        if dataset.indexing_technique == "high_quality":
-            embedding_model_instance = self.model_manager.get_model_instance(
-                tenant_id=dataset.tenant_id,
-                provider=dataset.embedding_model_provider,
-                model_type=ModelType.TEXT_EMBEDDING,
-                model=dataset.embedding_model,
-            )
+    def _run_pipeline(
+        self,
+        index_processor: BaseIndexProcessor,
+        dataset: Dataset,
+        dataset_document: DatasetDocument,
+        process_rule: Optional[dict],
+        text_docs: Optional[list[Document]],
+        start_page: int = 0,
+        documents: Sequence[Document] = (),
+    ) -> None:
+        """
+        Split, save, embed and index a document in stages running concurrently.
+
+        Batches of extracted pages are split ahead by the split threads and saved in order, their segments are
+        then queued to the embedding threads and the keyword thread. Full queues hold splitting back. A checkpoint
+        is saved with every batch, so a paused document resumes after the pages it has saved.
+
+        :param process_rule: process rule, None if the document is already split
+        :param text_docs: extracted pages, None if the document is already split
+        :param start_page: number of pages saved before the checkpoint the document resumes from
+        :param documents: saved segments to index
+        """
+        flask_app = current_app._get_current_object()  # type: ignore
+        # the main thread commits every saved batch, which expires the dataset and the document, so the
+        # other stages only get plain values and load what they need in their own sessions
+        dataset_id = dataset.id
+        document_id = dataset_document.id
+        embedding_model_instance = self._get_embedding_model_instance(dataset)
 
-        # chunk nodes by chunk size
         indexing_start_at = time.perf_counter()
-        tokens = 0
+        stop = threading.Event()
+        errors: list[Exception] = []
+
+        # each embedding thread owns the segments whose content hash maps to it, so no two threads
+        # insert the same embedding and deadlock
+        embedding_queues: list[queue.Queue[Optional[list[Document]]]] = []
+        if embedding_model_instance:
+            embedding_queues = [
+                queue.Queue(maxsize=dify_config.INDEXING_PIPELINE_QUEUE_SIZE)
+                for _ in range(dify_config.INDEXING_EMBEDDING_WORKERS)
+            ]
+        keyword_queue: Optional[queue.Queue[Optional[list[Document]]]] = None
         if dataset_document.doc_form != IndexType.PARENT_CHILD_INDEX:
-            # create keyword index
-            create_keyword_thread = threading.Thread(
-                target=self._process_keyword_index,
-                args=(current_app._get_current_object(), dataset.id, dataset_document.id, documents),  # type: ignore
-            )
-            create_keyword_thread.start()
-
-        max_workers = 10
-        if dataset.indexing_technique == "high_quality":
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = []
-
-                # Distribute documents into multiple groups based on the hash values of page_content
-                # This is done to prevent multiple threads from processing the same document,
-                # Thereby avoiding potential database insertion deadlocks
-                document_groups: list[list[Document]] = [[] for _ in range(max_workers)]
-                for document in documents:
+            keyword_queue = queue.Queue(maxsize=dify_config.INDEXING_PIPELINE_QUEUE_SIZE)
+
+        def enqueue(chunk_documents: list[Document]) -> None:
+            if keyword_queue:
+                keyword_queue.put(chunk_documents)
+            if embedding_queues:
+                document_groups: list[list[Document]] = [[] for _ in embedding_queues]
+                for document in chunk_documents:
                     hash = helper.generate_text_hash(document.page_content)
-                    group_index = int(hash, 16) % max_workers
-                    document_groups[group_index].append(document)
-                for chunk_documents in document_groups:
-                    if len(chunk_documents) == 0:
-                        continue
-                    futures.append(
-                        executor.submit(
-                            self._process_chunk,
-                            current_app._get_current_object(),  # type: ignore
-                            index_processor,
-                            chunk_documents,
-                            dataset,
-                            dataset_document,
-                            embedding_model_instance,
-                        )
-                    )
+                    document_groups[int(hash, 16) % len(embedding_queues)].append(document)
+                for embedding_queue, document_group in zip(embedding_queues, document_groups):
+                    if document_group:
+                        embedding_queue.put(document_group)
+
+        def process_chunk(chunk_documents: list[Document]) -> int:
+            return cast(
+                int,
+                self._process_chunk(
+                    flask_app, index_processor, chunk_documents, dataset_id, document_id, embedding_model_instance
+                ),
+            )
+
+        def process_keyword_index(chunk_documents: list[Document]) -> int:
+            self._process_keyword_index(flask_app, dataset_id, document_id, chunk_documents)
+            return 0
 
+        consumers: list[tuple[queue.Queue[Optional[list[Document]]], Callable[[list[Document]], int]]] = [
+            (embedding_queue, process_chunk) for embedding_queue in embedding_queues
+        ]
+        if keyword_queue:
+            consumers.append((keyword_queue, process_keyword_index))
+        tokens = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(consumers), 1)) as executor:
+            futures = [executor.submit(self._consume, batches, process, stop, errors) for batches, process in consumers]
+            try:
+                if documents:
+                    enqueue(list(documents))
+                if text_docs is not None and process_rule is not None:
+                    self._split_and_save(
+                        flask_app,
+                        index_processor,
+                        dataset,
+                        dataset_document,
+                        process_rule,
+                        text_docs,
+                        start_page,
+                        embedding_model_instance,
+                        enqueue,
+                        stop,
+                    )
+                    if not stop.is_set():
+                        # every page is saved, a resumed document only has to index its segments
+                        cur_time = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+                        self._update_document_index_status(
+                            document_id=dataset_document.id,
+                            after_indexing_status="indexing",
+                            extra_update_params={
+                                DatasetDocument.cleaning_completed_at: cur_time,
+                                DatasetDocument.splitting_completed_at: cur_time,
+                            },
+                        )
+                        self._delete_checkpoint(dataset_document.id)
+            except Exception:
+                stop.set()
+                raise
+            finally:
+                for batches, _ in consumers:
+                    batches.put(None)
                 for future in futures:
                     tokens += future.result()
-        if dataset_document.doc_form != IndexType.PARENT_CHILD_INDEX:
-            create_keyword_thread.join()
+        if errors:
+            raise errors[0]
         indexing_end_at = time.perf_counter()
 
         # update document status to completed
@@ -584,6 +685,106 @@ class IndexingRunner:
             },
         )
 
+    def _split_and_save(
+        self,
+        flask_app: Flask,
+        index_processor: BaseIndexProcessor,
+        dataset: Dataset,
+        dataset_document: DatasetDocument,
+        process_rule: dict,
+        text_docs: list[Document],
+        start_page: int,
+        embedding_model_instance: Optional[ModelInstance],
+        enqueue: Callable[[list[Document]], None],
+        stop: threading.Event,
+    ) -> None:
+        tenant_id = dataset.tenant_id
+        doc_language = dataset_document.doc_language
+        page_batch_size = dify_config.INDEXING_PIPELINE_PAGE_BATCH_SIZE
+        if (
+            dataset_document.doc_form == IndexType.PARENT_CHILD_INDEX
+            and (process_rule.get("rules") or {}).get("parent_mode") == ParentMode.FULL_DOC
+        ):
+            # the whole document is a single parent segment
+            page_batch_size = max(len(text_docs), 1)
+
+        def split(pages: list[Document]) -> list[Document]:
+            with flask_app.app_context():
+                return self._transform(
+                    index_processor, pages, doc_language, process_rule, tenant_id, embedding_model_instance
+                )
+
+        def save(page_end: int, split_future: concurrent.futures.Future[list[Document]]) -> None:
+            # check document is paused
+            self._check_document_paused_status(dataset_document.id)
+            documents = split_future.result()
+            self._load_segments(dataset, dataset_document, documents)
+            position = (
+                db.session.query(func.max(DocumentSegment.position))
+                .filter(DocumentSegment.document_id == dataset_document.id)
+                .scalar()
+            )
+            self._set_checkpoint(dataset_document.id, pages=page_end, position=position or 0)
+            enqueue(documents)
+            logging.info(
+                "Saved {} segments of pages {}/{} of document {}".format(
+                    len(documents), page_end, len(text_docs), dataset_document.id
+                )
+            )
+
+        split_workers = dify_config.INDEXING_SPLIT_WORKERS
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=split_workers)
+        try:
+            # batches are split ahead of the one being saved, at most one per split thread
+            pending: deque[tuple[int, concurrent.futures.Future[list[Document]]]] = deque()
+            for page_start in range(start_page, len(text_docs), page_batch_size):
+                page_end = min(page_start + page_batch_size, len(text_docs))
+                pending.append((page_end, executor.submit(split, text_docs[page_start:page_end])))
+                if len(pending) >= split_workers:
+                    save(*pending.popleft())
+                if stop.is_set():
+                    return
+            while pending and not stop.is_set():
+                save(*pending.popleft())
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _consume(
+        batches: "queue.Queue[Optional[list[Document]]]",
+        process: Callable[[list[Document]], int],
+        stop: threading.Event,
+        errors: list[Exception],
+    ) -> int:
+        tokens = 0
+        while (chunk_documents := batches.get()) is not None:
+            # once a stage fails the queues are only drained, so the stages feeding them never block
+            if stop.is_set():
+                continue
+            try:
+                tokens += process(chunk_documents)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+        return tokens
+
+    @staticmethod
+    def _get_checkpoint(document_id: str) -> Optional[dict[str, int]]:
+        checkpoint = redis_client.get("document_{}_indexing_checkpoint".format(document_id))
+        return cast(dict[str, int], json.loads(checkpoint)) if checkpoint else None
+
+    @staticmethod
+    def _set_checkpoint(document_id: str, pages: int, position: int) -> None:
+        redis_client.setex(
+            "document_{}_indexing_checkpoint".format(document_id),
+            INDEXING_CHECKPOINT_TTL,
+            json.dumps({"pages": pages, "position": position}),
+        )
+
+    @staticmethod
+    def _delete_checkpoint(document_id: str) -> None:
+        redis_client.delete("document_{}_indexing_checkpoint".format(document_id))
+
     @staticmethod
     def _process_keyword_index(flask_app, dataset_id, document_id, documents):
         with flask_app.app_context():
@@ -610,24 +811,28 @@ class IndexingRunner:
                 db.session.commit()
 
     def _process_chunk(
-        self, flask_app, index_processor, chunk_documents, dataset, dataset_document, embedding_model_instance
+        self, flask_app, index_processor, chunk_documents, dataset_id, document_id, embedding_model_instance
     ):
         with flask_app.app_context():
             # check document is paused
-            self._check_document_paused_status(dataset_document.id)
+            self._check_document_paused_status(document_id)
+
+            dataset = Dataset.query.filter_by(id=dataset_id).first()
+            if not dataset:
+                raise ValueError("no dataset found")
 
             tokens = 0
             if embedding_model_instance:
                 page_content_list = [document.page_content for document in chunk_documents]
-                tokens += sum(embedding_model_instance.get_text_embedding_num_tokens(page_content_list))
+                tokens += sum(CachedTokenCounter(embedding_model_instance).get_num_tokens(page_content_list))
 
             # load index
             index_processor.load(dataset, chunk_documents, with_keywords=False)
 
             document_ids = [document.metadata["doc_id"] for document in chunk_documents]
             db.session.query(DocumentSegment).filter(
-                DocumentSegment.document_id == dataset_document.id,
-                DocumentSegment.dataset_id == dataset.id,
+                DocumentSegment.document_id == document_id,
+                DocumentSegment.dataset_id == dataset_id,
                 DocumentSegment.index_node_id.in_(document_ids),
                 DocumentSegment.status == "indexing",
             ).update(
@@ -679,35 +884,35 @@ class IndexingRunner:
         DocumentSegment.query.filter_by(document_id=dataset_document_id).update(update_params)
         db.session.commit()
 
+    def _get_embedding_model_instance(self, dataset: Dataset) -> Optional[ModelInstance]:
+        if dataset.indexing_technique != "high_quality":
+            return None
+        if dataset.embedding_model_provider:
+            return self.model_manager.get_model_instance(
+                tenant_id=dataset.tenant_id,
+                provider=dataset.embedding_model_provider,
+                model_type=ModelType.TEXT_EMBEDDING,
+                model=dataset.embedding_model,
+            )
+        return self.model_manager.get_default_model_instance(
+            tenant_id=dataset.tenant_id,
+            model_type=ModelType.TEXT_EMBEDDING,
+        )
+
+    @staticmethod
     def _transform(
-        self,
         index_processor: BaseIndexProcessor,
-        dataset: Dataset,
         text_docs: list[Document],
         doc_language: str,
         process_rule: dict,
+        tenant_id: str,
+        embedding_model_instance: Optional[ModelInstance],
     ) -> list[Document]:
-        # get embedding model instance
-        embedding_model_instance = None
-        if dataset.indexing_technique == "high_quality":
-            if dataset.embedding_model_provider:
-                embedding_model_instance = self.model_manager.get_model_instance(
-                    tenant_id=dataset.tenant_id,
-                    provider=dataset.embedding_model_provider,
-                    model_type=ModelType.TEXT_EMBEDDING,
-                    model=dataset.embedding_model,
-                )
-            else:
-                embedding_model_instance = self.model_manager.get_default_model_instance(
-                    tenant_id=dataset.tenant_id,
-                    model_type=ModelType.TEXT_EMBEDDING,
-                )
-
         documents = index_processor.transform(
             text_docs,
             embedding_model_instance=embedding_model_instance,
             process_rule=process_rule,
-            tenant_id=dataset.tenant_id,
+            tenant_id=tenant_id,
             doc_language=doc_language,
         )
 
@@ -722,26 +927,19 @@ class IndexingRunner:
         # add document segments
         doc_store.add_documents(docs=documents, save_child=dataset_document.doc_form == IndexType.PARENT_CHILD_INDEX)
 
-        # update document status to indexing
-        cur_time = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
-        self._update_document_index_status(
-            document_id=dataset_document.id,
-            after_indexing_status="indexing",
-            extra_update_params={
-                DatasetDocument.cleaning_completed_at: cur_time,
-                DatasetDocument.splitting_completed_at: cur_time,
-            },
-        )
-
         # update segment status to indexing
-        self._update_segments_by_document(
-            dataset_document_id=dataset_document.id,
-            update_params={
+        document_ids = [document.metadata["doc_id"] for document in documents]
+        DocumentSegment.query.filter(
+            DocumentSegment.document_id == dataset_document.id,
+            DocumentSegment.index_node_id.in_(document_ids),
+        ).update(
+            {
                 DocumentSegment.status: "indexing",
                 DocumentSegment.indexing_at: datetime.datetime.now(datetime.UTC).replace(tzinfo=None),
             },
+            synchronize_session=False,
         )
-        pass
+        db.session.commit()
 
 
 class DocumentIsPausedError(Exception):
@@ -1,8 +1,9 @@
+import logging
 from collections.abc import Sequence
 from typing import Optional
 
 from core.app.app_config.features.file_upload.manager import FileUploadConfigManager
-from core.file import file_manager
+from core.file import FileUploadConfig, file_manager
 from core.model_manager import ModelInstance
 from core.model_runtime.entities import (
     AssistantPromptMessage,
@@ -15,9 +16,14 @@ from core.model_runtime.entities import (
 )
 from core.prompt.utils.extract_thread_messages import extract_thread_messages
 from extensions.ext_database import db
+from extensions.ext_redis import redis_client
 from factories import file_factory
 from models.model import AppMode, Conversation, Message, MessageFile
-from models.workflow import WorkflowRun
+from models.workflow import Workflow, WorkflowRun
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_NUM_TOKENS_CACHE_TTL = 24 * 60 * 60
 
 
 class TokenBufferMemory:
@@ -68,24 +74,16 @@ class TokenBufferMemory:
 
         messages = list(reversed(thread_messages))
 
+        message_files = self._get_message_files([message.id for message in messages])
+        file_extra_configs = self._get_file_extra_configs(
+            [message for message in messages if message.id in message_files]
+        )
+
         prompt_messages: list[PromptMessage] = []
         for message in messages:
-            files = db.session.query(MessageFile).filter(MessageFile.message_id == message.id).all()
+            files = message_files.get(message.id)
             if files:
-                file_extra_config = None
-                if self.conversation.mode not in {AppMode.ADVANCED_CHAT, AppMode.WORKFLOW}:
-                    file_extra_config = FileUploadConfigManager.convert(self.conversation.model_config)
-                else:
-                    if message.workflow_run_id:
-                        workflow_run = (
-                            db.session.query(WorkflowRun).filter(WorkflowRun.id == message.workflow_run_id).first()
-                        )
-
-                        if workflow_run and workflow_run.workflow:
-                            file_extra_config = FileUploadConfigManager.convert(
-                                workflow_run.workflow.features_dict, is_vision=False
-                            )
-
+                file_extra_config = file_extra_configs.get(message.id)
                 detail = ImagePromptMessageContent.DETAIL.LOW
                 if file_extra_config and app_record:
                     file_objs = file_factory.build_from_message_files(
@@ -118,16 +116,129 @@ class TokenBufferMemory:
         if not prompt_messages:
             return []
 
-        # prune the chat message if it exceeds the max token limit
-        curr_message_tokens = self.model_instance.get_llm_num_tokens(prompt_messages)
+        # prune the oldest chat messages if they exceed the max token limit
+        return prompt_messages[self._get_prune_index(messages, prompt_messages, max_token_limit) :]
+
+    def _get_message_files(self, message_ids: list[str]) -> dict[str, list[MessageFile]]:
+        message_files: dict[str, list[MessageFile]] = {}
+        if not message_ids:
+            return message_files
+
+        files = db.session.query(MessageFile).filter(MessageFile.message_id.in_(message_ids)).all()
+        for file in files:
+            message_files.setdefault(file.message_id, []).append(file)
+        return message_files
+
+    def _get_file_extra_configs(self, messages: list) -> dict[str, Optional[FileUploadConfig]]:
+        """
+        Get the file upload config of each message, loading the workflows of all messages at once.
+        """
+        if not messages:
+            return {}
+
+        if self.conversation.mode not in {AppMode.ADVANCED_CHAT, AppMode.WORKFLOW}:
+            file_extra_config = FileUploadConfigManager.convert(self.conversation.model_config)
+            return {message.id: file_extra_config for message in messages}
+
+        workflow_run_ids = {message.workflow_run_id for message in messages if message.workflow_run_id}
+        if not workflow_run_ids:
+            return {}
+
+        workflow_runs = (
+            db.session.query(WorkflowRun.id, Workflow)
+            .join(Workflow, Workflow.id == WorkflowRun.workflow_id)
+            .filter(WorkflowRun.id.in_(workflow_run_ids))
+            .all()
+        )
+        workflow_configs: dict[str, Optional[FileUploadConfig]] = {}
+        workflow_run_configs: dict[str, Optional[FileUploadConfig]] = {}
+        for workflow_run_id, workflow in workflow_runs:
+            if workflow.id not in workflow_configs:
+                workflow_configs[workflow.id] = FileUploadConfigManager.convert(workflow.features_dict, is_vision=False)
+            workflow_run_configs[workflow_run_id] = workflow_configs[workflow.id]
+
+        return {
+            message.id: workflow_run_configs.get(message.workflow_run_id)
+            for message in messages
+            if message.workflow_run_id
+        }
+
+    def _get_prune_index(self, messages: list, prompt_messages: list[PromptMessage], max_token_limit: int) -> int:
+        """
+        Get the index of the oldest prompt message to keep, so the kept messages fit in max_token_limit.
+
+        Messages without a cached count are first counted together in one request, when the history fits in the
+        limit nothing is pruned. Otherwise prompt messages are counted from the newest one on, and only until the
+        limit is reached. The counts of every message are cached by message id and model, so each message is
+        tokenized only once. When redis is unavailable the messages are counted directly.
+
+        Messages are counted one by one rather than as one request, so tokens a model counts once per request,
+        e.g. the reply priming of OpenAI chat models, are counted with every message. The total errs on the high
+        side by those few tokens per message, which leaves headroom rather than overflowing the limit.
+        """
+        cache_keys = [
+            f"message_num_tokens_{self.model_instance.provider}_{self.model_instance.model}_{message.id}"
+            for message in messages
+        ]
+        try:
+            cached_num_tokens = redis_client.mget(cache_keys)
+        except Exception:
+            logger.exception("Failed to load message token counts from redis")
+            cached_num_tokens = [None] * len(cache_keys)
+        message_num_tokens: list[Optional[tuple[int, int]]] = []
+        for value in cached_num_tokens:
+            if value:
+                user_tokens, assistant_tokens = map(int, value.decode().split(","))
+                message_num_tokens.append((user_tokens, assistant_tokens))
+            else:
+                message_num_tokens.append(None)
+
+        # a history that fits costs at most one request, however many messages are not cached
+        uncached_prompt_messages = [
+            prompt_message
+            for index, num_tokens in enumerate(message_num_tokens)
+            if num_tokens is None
+            for prompt_message in prompt_messages[index * 2 : index * 2 + 2]
+        ]
+        uncached_tokens = (
+            self.model_instance.get_llm_num_tokens(uncached_prompt_messages) if uncached_prompt_messages else 0
+        )
+        cached_tokens = sum(sum(num_tokens) for num_tokens in message_num_tokens if num_tokens is not None)
+        if cached_tokens + uncached_tokens <= max_token_limit:
+            return 0
+
+        new_num_tokens: dict[str, str] = {}
+        total_tokens = 0
+        prune_index = len(prompt_messages)
+        for index in range(len(messages) - 1, -1, -1):
+            cached_message_num_tokens = message_num_tokens[index]
+            if cached_message_num_tokens is not None:
+                user_tokens, assistant_tokens = cached_message_num_tokens
+            else:
+                user_tokens = self.model_instance.get_llm_num_tokens([prompt_messages[index * 2]])
+                assistant_tokens = self.model_instance.get_llm_num_tokens([prompt_messages[index * 2 + 1]])
+                new_num_tokens[cache_keys[index]] = f"{user_tokens},{assistant_tokens}"
+
+            for prompt_message_index, num_tokens in ((index * 2 + 1, assistant_tokens), (index * 2, user_tokens)):
+                # always keep the newest prompt message
+                if total_tokens + num_tokens > max_token_limit and prune_index < len(prompt_messages):
+                    break
+                total_tokens += num_tokens
+                prune_index = prompt_message_index
+            else:
+                continue
+            break
 
-        if curr_message_tokens > max_token_limit:
-            pruned_memory = []
-            while curr_message_tokens > max_token_limit and len(prompt_messages) > 1:
-                pruned_memory.append(prompt_messages.pop(0))
-                curr_message_tokens = self.model_instance.get_llm_num_tokens(prompt_messages)
+        if new_num_tokens:
+            try:
+                with redis_client.pipeline() as pipe:
+                    for cache_key, value in new_num_tokens.items():
+                        pipe.setex(cache_key, MESSAGE_NUM_TOKENS_CACHE_TTL, value)
+                    pipe.execute()
+            except Exception:
+                logger.exception("Failed to save message token counts to redis")
 
-        return prompt_messages
+        return prune_index
 
     def get_history_prompt_text(
         self,
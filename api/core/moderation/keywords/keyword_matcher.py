@@ -0,0 +1,90 @@
+from collections import deque
+from collections.abc import Iterable
+from functools import lru_cache
+
+# number of compiled keyword configs kept per process
+KEYWORD_MATCHER_CACHE_SIZE = 256
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton finding any of a set of keywords in a text, case-insensitively,
+    in a single pass over the text whatever the number of keywords.
+
+    The automaton is immutable once built and can be shared between threads, the matching state of a
+    streamed text is carried by the caller, see `feed`.
+    """
+
+    # matching state at the start of a text
+    INITIAL_STATE = 0
+
+    def __init__(self, keywords: Iterable[str]):
+        # trie of the lowercased keywords: transitions, failure links and whether a keyword ends at a state
+        self._transitions: list[dict[str, int]] = [{}]
+        self._failures: list[int] = [0]
+        self._matches: list[bool] = [False]
+
+        for keyword in keywords:
+            if keyword:
+                self._add(keyword.lower())
+        self._build_failures()
+
+    def search(self, text: str) -> bool:
+        """
+        Whether the text contains any of the keywords.
+        """
+        return self.feed(self.INITIAL_STATE, text)[1]
+
+    def feed(self, state: int, text: str) -> tuple[int, bool]:
+        """
+        Continue matching a streamed text.
+        :param state: state returned for the previous part of the text, INITIAL_STATE at its start
+        :param text: next part of the text
+        :return: state after the part, and whether a keyword ended in it
+        """
+        transitions = self._transitions
+        failures = self._failures
+        matches = self._matches
+        for char in text.lower():
+            while state and char not in transitions[state]:
+                state = failures[state]
+            state = transitions[state].get(char, 0)
+            if matches[state]:
+                return state, True
+        return state, False
+
+    def _add(self, keyword: str) -> None:
+        state = 0
+        for char in keyword:
+            next_state = self._transitions[state].get(char)
+            if next_state is None:
+                next_state = len(self._transitions)
+                self._transitions.append({})
+                self._failures.append(0)
+                self._matches.append(False)
+                self._transitions[state][char] = next_state
+            state = next_state
+        self._matches[state] = True
+
+    def _build_failures(self) -> None:
+        # breadth-first, so the failure link of a state is always resolved before its children
+        # states one character deep keep failing back to the root
+        queue = deque(self._transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._transitions[state].items():
+                failure = self._failures[state]
+                while failure and char not in self._transitions[failure]:
+                    failure = self._failures[failure]
+                self._failures[next_state] = self._transitions[failure].get(char, 0)
+                # a keyword ending at the failure state also ends here
+                self._matches[next_state] = self._matches[next_state] or self._matches[self._failures[next_state]]
+                queue.append(next_state)
+
+
+@lru_cache(maxsize=KEYWORD_MATCHER_CACHE_SIZE)
+def get_keyword_matcher(keywords: str) -> KeywordMatcher:
+    """
+    Get the matcher of a moderation keywords config, one keyword per line, compiled once per config.
+    """
+    return KeywordMatcher(keywords.split("\n"))
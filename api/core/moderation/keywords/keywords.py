@@ -1,12 +1,21 @@
-from collections.abc import Sequence
-from typing import Any
+import threading
+from typing import Optional
 
 from core.moderation.base import Moderation, ModerationAction, ModerationInputsResult, ModerationOutputsResult
+from core.moderation.keywords.keyword_matcher import KeywordMatcher, get_keyword_matcher
 
 
 class KeywordsModeration(Moderation):
     name: str = "keywords"
 
+    def __init__(self, app_id: str, tenant_id: str, config: Optional[dict] = None) -> None:
+        super().__init__(app_id, tenant_id, config)
+        # matching state of the streamed output, which is moderated again every time it grows
+        self._output_lock = threading.Lock()
+        self._output_text = ""
+        self._output_state = KeywordMatcher.INITIAL_STATE
+        self._output_flagged = False
+
     @classmethod
     def validate_config(cls, tenant_id: str, config: dict) -> None:
         """
@@ -40,10 +49,8 @@ class KeywordsModeration(Moderation):
             if query:
                 inputs["query__"] = query
 
-            # Filter out empty values
-            keywords_list = [keyword for keyword in self.config["keywords"].split("\n") if keyword]
-
-            flagged = self._is_violated(inputs, keywords_list)
+            matcher = get_keyword_matcher(self.config["keywords"])
+            flagged = any(matcher.search(str(value)) for value in inputs.values())
 
         return ModerationInputsResult(
             flagged=flagged, action=ModerationAction.DIRECT_OUTPUT, preset_response=preset_response
@@ -56,18 +63,26 @@ class KeywordsModeration(Moderation):
             raise ValueError("The config is not set.")
 
         if self.config["outputs_config"]["enabled"]:
-            # Filter out empty values
-            keywords_list = [keyword for keyword in self.config["keywords"].split("\n") if keyword]
-
-            flagged = self._is_violated({"text": text}, keywords_list)
+            flagged = self._is_output_violated(get_keyword_matcher(self.config["keywords"]), text)
             preset_response = self.config["outputs_config"]["preset_response"]
 
         return ModerationOutputsResult(
             flagged=flagged, action=ModerationAction.DIRECT_OUTPUT, preset_response=preset_response
         )
 
-    def _is_violated(self, inputs: dict, keywords_list: list) -> bool:
-        return any(self._check_keywords_in_value(keywords_list, value) for value in inputs.values())
-
-    def _check_keywords_in_value(self, keywords_list: Sequence[str], value: Any) -> bool:
-        return any(keyword.lower() in str(value).lower() for keyword in keywords_list)
+    def _is_output_violated(self, matcher: KeywordMatcher, text: str) -> bool:
+        """
+        Check the output, only matching the part that was not matched yet when it extends the previous output.
+        """
+        with self._output_lock:
+            if not text.startswith(self._output_text):
+                self._output_text = ""
+                self._output_state = KeywordMatcher.INITIAL_STATE
+                self._output_flagged = False
+
+            if not self._output_flagged:
+                self._output_state, self._output_flagged = matcher.feed(
+                    self._output_state, text[len(self._output_text) :]
+                )
+            self._output_text = text
+            return self._output_flagged
@@ -4,7 +4,7 @@ import time
 from typing import Any, Optional
 
 from flask import Flask, current_app
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 
 from configs import dify_config
 from core.app.apps.base_app_queue_manager import AppQueueManager, PublishFrom
@@ -34,6 +34,9 @@ class OutputModeration(BaseModel):
     final_output: Optional[str] = None
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
+    # kept across calls, so moderations that match streamed text incrementally only match the new part
+    _moderation_factory: Optional[ModerationFactory] = PrivateAttr(default=None)
+
     def should_direct_output(self) -> bool:
         return self.final_output is not None
 
@@ -119,11 +122,12 @@ class OutputModeration(BaseModel):
 
     def moderation(self, tenant_id: str, app_id: str, moderation_buffer: str) -> Optional[ModerationOutputsResult]:
         try:
-            moderation_factory = ModerationFactory(
-                name=self.rule.type, app_id=app_id, tenant_id=tenant_id, config=self.rule.config
-            )
+            if self._moderation_factory is None:
+                self._moderation_factory = ModerationFactory(
+                    name=self.rule.type, app_id=app_id, tenant_id=tenant_id, config=self.rule.config
+                )
 
-            result: ModerationOutputsResult = moderation_factory.moderation_for_outputs(moderation_buffer)
+            result: ModerationOutputsResult = self._moderation_factory.moderation_for_outputs(moderation_buffer)
             return result
         except Exception as e:
             logger.exception(f"Moderation Output error, app_id: {app_id}")
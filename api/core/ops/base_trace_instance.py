@@ -24,3 +24,10 @@ class BaseTraceInstance(ABC):
         Subclasses must implement specific tracing logic for activities.
         """
         ...
+
+    def flush(self):
+        """
+        Ship the activities buffered by trace().
+        Called once after each batch of traces, subclasses batching their uploads must override it.
+        """
+        return None
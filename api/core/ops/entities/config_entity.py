@@ -90,3 +90,4 @@ class OpikConfig(BaseTracingConfig):
 
 OPS_FILE_PATH = "ops_trace/"
 OPS_TRACE_FAILED_KEY = "FAILED_OPS_TRACE"
+OPS_TRACE_DROPPED_KEY = "DROPPED_OPS_TRACE"
@@ -112,7 +112,7 @@ class TaskData(BaseModel):
     trace_info: Any
 
 
-trace_info_info_map = {
+trace_info_info_map: dict[str, type[BaseTraceInfo]] = {
     "WorkflowTraceInfo": WorkflowTraceInfo,
     "MessageTraceInfo": MessageTraceInfo,
     "ModerationTraceInfo": ModerationTraceInfo,
@@ -439,6 +439,12 @@ class LangFuseDataTrace(BaseTraceInstance):
 
         generation.end(**format_generation_data)
 
+    def flush(self):
+        try:
+            self.langfuse_client.flush()
+        except Exception as e:
+            raise ValueError(f"LangFuse Failed to flush: {str(e)}")
+
     def api_check(self):
         try:
             return self.langfuse_client.auth_check()
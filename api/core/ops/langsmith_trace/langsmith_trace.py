@@ -45,6 +45,9 @@ class LangSmithDataTrace(BaseTraceInstance):
         self.project_id = None
         self.langsmith_client = Client(api_key=langsmith_config.api_key, api_url=langsmith_config.endpoint)
         self.file_base_url = os.getenv("FILES_URL", "http://127.0.0.1:5001")
+        # runs carrying trace_id and dotted_order are buffered and sent with one batch ingest on flush,
+        # runs whose position in the trace is unknown are created one by one
+        self.pending_runs: list[dict] = []
 
     def trace(self, trace_info: BaseTraceInfo):
         if isinstance(trace_info, WorkflowTraceInfo):
@@ -253,6 +256,8 @@ class LangSmithDataTrace(BaseTraceInstance):
         if message_data is None:
             return
         message_id = message_data.id
+        start_time = trace_info.start_time or message_data.created_at
+        message_trace_id, message_dotted_order = self._get_run_order(message_id, start_time)
 
         user_id = message_data.from_account_id
         metadata["user_id"] = user_id
@@ -273,7 +278,7 @@ class LangSmithDataTrace(BaseTraceInstance):
             name=TraceTaskName.MESSAGE_TRACE.value,
             inputs=trace_info.inputs,
             run_type=LangSmithRunType.chain,
-            start_time=trace_info.start_time,
+            start_time=start_time,
             end_time=trace_info.end_time,
             outputs=message_data.answer,
             extra={"metadata": metadata},
@@ -287,13 +292,15 @@ class LangSmithDataTrace(BaseTraceInstance):
             reference_example_id=None,
             input_attachments={},
             output_attachments={},
-            trace_id=None,
-            dotted_order=None,
+            trace_id=message_trace_id,
+            dotted_order=message_dotted_order,
             parent_run_id=None,
         )
         self.add_run(message_run)
 
         # create llm run parented to message run
+        llm_run_id = str(uuid.uuid4())
+        llm_trace_id, llm_dotted_order = self._get_run_order(llm_run_id, start_time, message_id, start_time)
         llm_run = LangSmithRunModel(
             input_tokens=trace_info.message_tokens,
             output_tokens=trace_info.answer_tokens,
@@ -301,7 +308,7 @@ class LangSmithDataTrace(BaseTraceInstance):
             name="llm",
             inputs=trace_info.inputs,
             run_type=LangSmithRunType.llm,
-            start_time=trace_info.start_time,
+            start_time=start_time,
             end_time=trace_info.end_time,
             outputs=message_data.answer,
             extra={"metadata": metadata},
@@ -316,15 +323,20 @@ class LangSmithDataTrace(BaseTraceInstance):
             reference_example_id=None,
             input_attachments={},
             output_attachments={},
-            trace_id=None,
-            dotted_order=None,
-            id=str(uuid.uuid4()),
+            trace_id=llm_trace_id,
+            dotted_order=llm_dotted_order,
+            id=llm_run_id,
         )
         self.add_run(llm_run)
 
     def moderation_trace(self, trace_info: ModerationTraceInfo):
         if trace_info.message_data is None:
             return
+        run_id = str(uuid.uuid4())
+        start_time = trace_info.start_time or trace_info.message_data.created_at
+        trace_id, dotted_order = self._get_run_order(
+            run_id, start_time, trace_info.message_id, trace_info.message_data.created_at
+        )
         langsmith_run = LangSmithRunModel(
             name=TraceTaskName.MODERATION_TRACE.value,
             inputs=trace_info.inputs,
@@ -338,9 +350,9 @@ class LangSmithDataTrace(BaseTraceInstance):
             extra={"metadata": trace_info.metadata},
             tags=["moderation"],
             parent_run_id=trace_info.message_id,
-            start_time=trace_info.start_time or trace_info.message_data.created_at,
+            start_time=start_time,
             end_time=trace_info.end_time or trace_info.message_data.updated_at,
-            id=str(uuid.uuid4()),
+            id=run_id,
             serialized=None,
             events=[],
             session_id=None,
@@ -348,8 +360,8 @@ class LangSmithDataTrace(BaseTraceInstance):
             reference_example_id=None,
             input_attachments={},
             output_attachments={},
-            trace_id=None,
-            dotted_order=None,
+            trace_id=trace_id,
+            dotted_order=dotted_order,
             error="",
             file_list=[],
         )
@@ -360,6 +372,9 @@ class LangSmithDataTrace(BaseTraceInstance):
         message_data = trace_info.message_data
         if message_data is None:
             return
+        run_id = str(uuid.uuid4())
+        start_time = trace_info.start_time or message_data.created_at
+        trace_id, dotted_order = self._get_run_order(run_id, start_time, trace_info.message_id, message_data.created_at)
         suggested_question_run = LangSmithRunModel(
             name=TraceTaskName.SUGGESTED_QUESTION_TRACE.value,
             inputs=trace_info.inputs,
@@ -368,9 +383,9 @@ class LangSmithDataTrace(BaseTraceInstance):
             extra={"metadata": trace_info.metadata},
             tags=["suggested_question"],
             parent_run_id=trace_info.message_id,
-            start_time=trace_info.start_time or message_data.created_at,
+            start_time=start_time,
             end_time=trace_info.end_time or message_data.updated_at,
-            id=str(uuid.uuid4()),
+            id=run_id,
             serialized=None,
             events=[],
             session_id=None,
@@ -378,8 +393,8 @@ class LangSmithDataTrace(BaseTraceInstance):
             reference_example_id=None,
             input_attachments={},
             output_attachments={},
-            trace_id=None,
-            dotted_order=None,
+            trace_id=trace_id,
+            dotted_order=dotted_order,
             error="",
             file_list=[],
         )
@@ -389,6 +404,11 @@ class LangSmithDataTrace(BaseTraceInstance):
     def dataset_retrieval_trace(self, trace_info: DatasetRetrievalTraceInfo):
         if trace_info.message_data is None:
             return
+        run_id = str(uuid.uuid4())
+        start_time = trace_info.start_time or trace_info.message_data.created_at
+        trace_id, dotted_order = self._get_run_order(
+            run_id, start_time, trace_info.message_id, trace_info.message_data.created_at
+        )
         dataset_retrieval_run = LangSmithRunModel(
             name=TraceTaskName.DATASET_RETRIEVAL_TRACE.value,
             inputs=trace_info.inputs,
@@ -397,9 +417,9 @@ class LangSmithDataTrace(BaseTraceInstance):
             extra={"metadata": trace_info.metadata},
             tags=["dataset_retrieval"],
             parent_run_id=trace_info.message_id,
-            start_time=trace_info.start_time or trace_info.message_data.created_at,
+            start_time=start_time,
             end_time=trace_info.end_time or trace_info.message_data.updated_at,
-            id=str(uuid.uuid4()),
+            id=run_id,
             serialized=None,
             events=[],
             session_id=None,
@@ -407,8 +427,8 @@ class LangSmithDataTrace(BaseTraceInstance):
             reference_example_id=None,
             input_attachments={},
             output_attachments={},
-            trace_id=None,
-            dotted_order=None,
+            trace_id=trace_id,
+            dotted_order=dotted_order,
             error="",
             file_list=[],
         )
@@ -416,6 +436,14 @@ class LangSmithDataTrace(BaseTraceInstance):
         self.add_run(dataset_retrieval_run)
 
     def tool_trace(self, trace_info: ToolTraceInfo):
+        run_id = str(uuid.uuid4())
+        start_time = trace_info.start_time or datetime.now()
+        trace_id, dotted_order = self._get_run_order(
+            run_id,
+            start_time,
+            trace_info.message_id,
+            trace_info.message_data.created_at if trace_info.message_data is not None else None,
+        )
         tool_run = LangSmithRunModel(
             name=trace_info.tool_name,
             inputs=trace_info.tool_inputs,
@@ -426,10 +454,10 @@ class LangSmithDataTrace(BaseTraceInstance):
             },
             tags=["tool", trace_info.tool_name],
             parent_run_id=trace_info.message_id,
-            start_time=trace_info.start_time,
+            start_time=start_time,
             end_time=trace_info.end_time,
             file_list=[cast(str, trace_info.file_url)],
-            id=str(uuid.uuid4()),
+            id=run_id,
             serialized=None,
             events=[],
             session_id=None,
@@ -437,14 +465,17 @@ class LangSmithDataTrace(BaseTraceInstance):
             reference_example_id=None,
             input_attachments={},
             output_attachments={},
-            trace_id=None,
-            dotted_order=None,
+            trace_id=trace_id,
+            dotted_order=dotted_order,
             error=trace_info.error or "",
         )
 
         self.add_run(tool_run)
 
     def generate_name_trace(self, trace_info: GenerateNameTraceInfo):
+        run_id = str(uuid.uuid4())
+        start_time = trace_info.start_time or datetime.now()
+        trace_id, dotted_order = self._get_run_order(run_id, start_time)
         name_run = LangSmithRunModel(
             name=TraceTaskName.GENERATE_NAME_TRACE.value,
             inputs=trace_info.inputs,
@@ -452,9 +483,9 @@ class LangSmithDataTrace(BaseTraceInstance):
             run_type=LangSmithRunType.tool,
             extra={"metadata": trace_info.metadata},
             tags=["generate_name"],
-            start_time=trace_info.start_time or datetime.now(),
+            start_time=start_time,
             end_time=trace_info.end_time or datetime.now(),
-            id=str(uuid.uuid4()),
+            id=run_id,
             serialized=None,
             events=[],
             session_id=None,
@@ -462,8 +493,8 @@ class LangSmithDataTrace(BaseTraceInstance):
             reference_example_id=None,
             input_attachments={},
             output_attachments={},
-            trace_id=None,
-            dotted_order=None,
+            trace_id=trace_id,
+            dotted_order=dotted_order,
             error="",
             file_list=[],
             parent_run_id=None,
@@ -471,6 +502,26 @@ class LangSmithDataTrace(BaseTraceInstance):
 
         self.add_run(name_run)
 
+    @staticmethod
+    def _get_run_order(
+        run_id: str,
+        start_time: datetime | str,
+        parent_run_id: Optional[str] = None,
+        parent_start_time: Optional[datetime | str] = None,
+    ) -> tuple[Optional[str], Optional[str]]:
+        """
+        trace_id and dotted_order of a run, which batch ingest requires.
+
+        The parent must be the root run of its trace, e.g. the message run. When the start time
+        of the parent is unknown, so is the dotted order, and the run is created on its own.
+        """
+        if parent_run_id is None:
+            return run_id, generate_dotted_order(run_id, start_time)
+        if parent_start_time is None:
+            return None, None
+        parent_dotted_order = generate_dotted_order(parent_run_id, parent_start_time)
+        return parent_run_id, generate_dotted_order(run_id, start_time, parent_dotted_order)
+
     def add_run(self, run_data: LangSmithRunModel):
         data = run_data.model_dump()
         if self.project_id:
@@ -479,6 +530,9 @@ class LangSmithDataTrace(BaseTraceInstance):
             data["session_name"] = self.project_name
 
         data = filter_none_values(data)
+        if data.get("trace_id") and data.get("dotted_order"):
+            self.pending_runs.append(data)
+            return
         try:
             self.langsmith_client.create_run(**data)
             logger.debug("LangSmith Run created successfully.")
@@ -494,6 +548,16 @@ class LangSmithDataTrace(BaseTraceInstance):
         except Exception as e:
             raise ValueError(f"LangSmith Failed to update run: {str(e)}")
 
+    def flush(self):
+        pending_runs, self.pending_runs = self.pending_runs, []
+        if not pending_runs:
+            return
+        try:
+            self.langsmith_client.batch_ingest_runs(create=pending_runs)
+            logger.debug(f"LangSmith {len(pending_runs)} Runs created successfully.")
+        except Exception as e:
+            raise ValueError(f"LangSmith Failed to create runs: {str(e)}")
+
     def api_check(self):
         try:
             random_project_name = f"test_project_{datetime.now().strftime('%Y%m%d%H%M%S')}"
@@ -453,6 +453,12 @@ class OpikDataTrace(BaseTraceInstance):
         except Exception as e:
             raise ValueError(f"Opik Failed to create span: {str(e)}")
 
+    def flush(self):
+        try:
+            self.opik_client.flush()
+        except Exception as e:
+            raise ValueError(f"Opik Failed to flush: {str(e)}")
+
     def api_check(self):
         try:
             self.opik_client.auth_check()
@@ -1,3 +1,4 @@
+import gzip
 import json
 import logging
 import os
@@ -15,6 +16,7 @@ from sqlalchemy.orm import Session
 from core.helper.encrypter import decrypt_token, encrypt_token, obfuscated_token
 from core.ops.entities.config_entity import (
     OPS_FILE_PATH,
+    OPS_TRACE_DROPPED_KEY,
     LangfuseConfig,
     LangSmithConfig,
     OpikConfig,
@@ -36,10 +38,11 @@ from core.ops.langsmith_trace.langsmith_trace import LangSmithDataTrace
 from core.ops.opik_trace.opik_trace import OpikDataTrace
 from core.ops.utils import get_message_data
 from extensions.ext_database import db
+from extensions.ext_redis import redis_client
 from extensions.ext_storage import storage
 from models.model import App, AppModelConfig, Conversation, Message, MessageFile, TraceAppConfig
 from models.workflow import WorkflowAppLog, WorkflowRun
-from tasks.ops_trace_task import process_trace_tasks
+from tasks.ops_trace_task import process_trace_batch_tasks
 
 provider_config_map: dict[str, dict[str, Any]] = {
     TracingProviderEnum.LANGFUSE.value: {
@@ -738,9 +741,12 @@ class TraceTask:
 
 
 trace_manager_timer: Optional[threading.Timer] = None
-trace_manager_queue: queue.Queue = queue.Queue()
-trace_manager_interval = int(os.getenv("TRACE_QUEUE_MANAGER_INTERVAL", 5))
 trace_manager_batch_size = int(os.getenv("TRACE_QUEUE_MANAGER_BATCH_SIZE", 100))
+trace_manager_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("TRACE_QUEUE_MANAGER_MAX_SIZE", 10000)))
+trace_manager_interval = int(os.getenv("TRACE_QUEUE_MANAGER_INTERVAL", 5))
+# traces dropped per app because the queue was full, flushed to redis by the timer
+trace_manager_dropped_counts: dict[str, int] = {}
+trace_manager_dropped_lock = threading.Lock()
 
 
 class TraceQueueManager:
@@ -759,7 +765,11 @@ class TraceQueueManager:
         try:
             if self.trace_instance:
                 trace_task.app_id = self.app_id
-                trace_manager_queue.put(trace_task)
+                trace_manager_queue.put_nowait(trace_task)
+        except queue.Full:
+            # apply backpressure by shedding traces instead of blocking the request
+            with trace_manager_dropped_lock:
+                trace_manager_dropped_counts[self.app_id] = trace_manager_dropped_counts.get(self.app_id, 0) + 1
         except Exception as e:
             logging.exception(f"Error adding trace task, trace_type {trace_task.trace_type}")
         finally:
@@ -776,11 +786,18 @@ class TraceQueueManager:
 
     def run(self):
         try:
-            tasks = self.collect_tasks()
-            if tasks:
-                self.send_to_celery(tasks)
+            # drain what is queued at most once per tick so the exporter catches up after bursts
+            max_batches = trace_manager_queue.maxsize // trace_manager_batch_size + 1
+            for _ in range(max_batches):
+                tasks = self.collect_tasks()
+                if tasks:
+                    self.send_to_celery(tasks)
+                if len(tasks) < trace_manager_batch_size:
+                    break
         except Exception as e:
             logging.exception("Error processing trace tasks")
+        finally:
+            self.flush_dropped_counts()
 
     def start_timer(self):
         global trace_manager_timer
@@ -792,20 +809,46 @@ class TraceQueueManager:
 
     def send_to_celery(self, tasks: list[TraceTask]):
         with self.flask_app.app_context():
+            batches: dict[str, list[dict]] = {}
             for task in tasks:
                 if task.app_id is None:
                     continue
-                file_id = uuid4().hex
-                trace_info = task.execute()
+                try:
+                    trace_info = task.execute()
+                except Exception:
+                    logging.exception(f"Error executing trace task, trace_type {task.trace_type}")
+                    continue
                 task_data = TaskData(
                     app_id=task.app_id,
                     trace_info_type=type(trace_info).__name__,
                     trace_info=trace_info.model_dump() if trace_info else None,
                 )
-                file_path = f"{OPS_FILE_PATH}{task.app_id}/{file_id}.json"
-                storage.save(file_path, task_data.model_dump_json().encode("utf-8"))
+                batches.setdefault(task.app_id, []).append(task_data.model_dump(mode="json"))
+
+            # one storage file and one celery task per app, the app decides the tracing provider
+            for app_id, tasks_data in batches.items():
+                file_id = uuid4().hex
+                file_path = f"{OPS_FILE_PATH}{app_id}/{file_id}.json.gz"
+                storage.save(file_path, gzip.compress(json.dumps(tasks_data).encode("utf-8")))
                 file_info = {
                     "file_id": file_id,
-                    "app_id": task.app_id,
+                    "app_id": app_id,
                 }
-                process_trace_tasks.delay(file_info)
+                process_trace_batch_tasks.delay(file_info)
+
+    @staticmethod
+    def flush_dropped_counts():
+        with trace_manager_dropped_lock:
+            dropped_counts = dict(trace_manager_dropped_counts)
+            trace_manager_dropped_counts.clear()
+        if not dropped_counts:
+            return
+
+        try:
+            with redis_client.pipeline() as pipe:
+                for app_id, count in dropped_counts.items():
+                    pipe.incrby(f"{OPS_TRACE_DROPPED_KEY}_{app_id}", count)
+                pipe.execute()
+        except Exception:
+            logging.exception("Error recording dropped trace tasks")
+        logging.warning(f"Trace queue is full, dropped trace tasks: {dropped_counts}")
@@ -1,11 +1,16 @@
 import inspect
 import json
 import logging
+import os
+import threading
+import time
 from collections.abc import Callable, Generator
-from typing import TypeVar
+from functools import lru_cache
+from typing import Any, TypeVar, cast
 
 import requests
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
+from requests.adapters import HTTPAdapter
 from yarl import URL
 
 from configs import dify_config
@@ -36,6 +41,51 @@ T = TypeVar("T", bound=(BaseModel | dict | list | bool | str))
 
 logger = logging.getLogger(__name__)
 
+try:
+    import orjson  # type: ignore
+
+    _json_loads: Callable[[str | bytes], Any] = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+_session: requests.Session | None = None
+_session_pid: int | None = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """
+    Get the keep-alive session shared by all plugin daemon calls of this process.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=dify_config.PLUGIN_DAEMON_POOL_MAX_SIZE,
+                    max_retries=0,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+
+def _create_type_adapter(data_type: type) -> TypeAdapter[Any]:
+    return TypeAdapter(data_type)
+
+
+# building a TypeAdapter compiles a validator, so they are built once per response type
+_get_type_adapter: Callable[[type], TypeAdapter[Any]] = lru_cache(maxsize=128)(_create_type_adapter)
+
+
+def _validate_data(data_type: type[T], data: Any) -> T:
+    if inspect.isclass(data_type) and issubclass(data_type, BaseModel):
+        return data_type.model_validate(data)  # type: ignore
+    return cast(T, _get_type_adapter(data_type).validate_python(data))
+
 
 class BasePluginManager:
     def _request(
@@ -60,7 +110,7 @@ class BasePluginManager:
             data = json.dumps(data)
 
         try:
-            response = requests.request(
+            response = _get_session().request(
                 method=method, url=str(url), headers=headers, data=data, params=params, stream=stream, files=files
             )
         except requests.exceptions.ConnectionError:
@@ -103,7 +153,7 @@ class BasePluginManager:
         Make a stream request to the plugin daemon inner API and yield the response as a model.
         """
         for line in self._stream_request(method, path, params, headers, data, files):
-            yield type(**json.loads(line))  # type: ignore
+            yield type(**_json_loads(line))  # type: ignore
 
     def _request_with_model(
         self,
@@ -167,31 +217,39 @@ class BasePluginManager:
         """
         Make a stream request to the plugin daemon inner API and yield the response as a model.
         """
+        started_at = time.perf_counter()
+        first_chunk = True
         for line in self._stream_request(method, path, params, headers, data, files):
-            line_data = None
+            # only the payload is validated, code and message are read from the raw chunk
             try:
-                line_data = json.loads(line)
-                rep = PluginDaemonBasicResponse[type](**line_data)  # type: ignore
+                line_data = _json_loads(line)
             except Exception:
+                raise ValueError(line)
+            if not isinstance(line_data, dict) or "code" not in line_data:
                 # TODO modify this when line_data has code and message
-                if line_data and "error" in line_data:
+                if isinstance(line_data, dict) and "error" in line_data:
                     raise ValueError(line_data["error"])
                 else:
                     raise ValueError(line)
 
-            if rep.code != 0:
-                if rep.code == -500:
+            code, message = line_data["code"], line_data.get("message", "")
+            if code != 0:
+                if code == -500:
                     try:
-                        error = PluginDaemonError(**json.loads(rep.message))
+                        error = PluginDaemonError(**json.loads(message))
                     except Exception:
-                        raise PluginDaemonInnerError(code=rep.code, message=rep.message)
+                        raise PluginDaemonInnerError(code=code, message=message)
 
                     self._handle_plugin_daemon_error(error.error_type, error.message)
-                raise ValueError(f"plugin daemon: {rep.message}, code: {rep.code}")
-            if rep.data is None:
+                raise ValueError(f"plugin daemon: {message}, code: {code}")
+            if line_data.get("data") is None:
                 frame = inspect.currentframe()
                 raise ValueError(f"got empty data from plugin daemon: {frame.f_lineno if frame else 'unknown'}")
-            yield rep.data
+
+            if first_chunk:
+                first_chunk = False
+                logger.debug(f"First chunk from plugin daemon {path} in {time.perf_counter() - started_at:.3f}s")
+            yield _validate_data(type, line_data["data"])
 
     def _handle_plugin_daemon_error(self, error_type: str, message: str):
         """
@@ -1,11 +1,22 @@
+import heapq
 import json
+import math
 from collections import defaultdict
+from collections.abc import Generator, Iterable
+from contextlib import ExitStack, contextmanager
 from typing import Any, Optional
 
 from pydantic import BaseModel
+from sqlalchemy import func
 
 from configs import dify_config
 from core.rag.datasource.keyword.jieba.jieba_keyword_table_handler import JiebaKeywordTableHandler
+from core.rag.datasource.keyword.jieba.sharded_keyword_table import (
+    KEYWORD_SHARD,
+    NODE_SHARD,
+    SHARDED_KEYWORD_TABLE_TYPE,
+    ShardedKeywordTable,
+)
 from core.rag.datasource.keyword.keyword_base import BaseKeyword
 from core.rag.models.document import Document
 from extensions.ext_database import db
@@ -24,81 +35,128 @@ class Jieba(BaseKeyword):
         self._config = KeywordTableConfig()
 
     def create(self, texts: list[Document], **kwargs) -> BaseKeyword:
-        lock_name = "keyword_indexing_lock_{}".format(self.dataset.id)
-        with redis_client.lock(lock_name, timeout=600):
-            keyword_table_handler = JiebaKeywordTableHandler()
-            keyword_table = self._get_dataset_keyword_table()
-            for text in texts:
-                keywords = keyword_table_handler.extract_keywords(
-                    text.page_content, self._config.max_keywords_per_chunk
-                )
-                if text.metadata is not None:
-                    self._update_segment_keywords(self.dataset.id, text.metadata["doc_id"], list(keywords))
-                    keyword_table = self._add_text_to_keyword_table(
-                        keyword_table or {}, text.metadata["doc_id"], list(keywords)
-                    )
+        keyword_table_handler = JiebaKeywordTableHandler()
+        node_keywords: dict[str, list[str]] = {}
+        for text in texts:
+            keywords = keyword_table_handler.extract_keywords(text.page_content, self._config.max_keywords_per_chunk)
+            if text.metadata is not None:
+                self._update_segment_keywords(self.dataset.id, text.metadata["doc_id"], list(keywords))
+                node_keywords[text.metadata["doc_id"]] = list(keywords)
 
-            self._save_dataset_keyword_table(keyword_table)
+        self._add_to_keyword_table(node_keywords)
 
-            return self
+        return self
 
     def add_texts(self, texts: list[Document], **kwargs):
-        lock_name = "keyword_indexing_lock_{}".format(self.dataset.id)
-        with redis_client.lock(lock_name, timeout=600):
-            keyword_table_handler = JiebaKeywordTableHandler()
-
-            keyword_table = self._get_dataset_keyword_table()
-            keywords_list = kwargs.get("keywords_list")
-            for i in range(len(texts)):
-                text = texts[i]
-                if keywords_list:
-                    keywords = keywords_list[i]
-                    if not keywords:
-                        keywords = keyword_table_handler.extract_keywords(
-                            text.page_content, self._config.max_keywords_per_chunk
-                        )
-                else:
+        keyword_table_handler = JiebaKeywordTableHandler()
+
+        keywords_list = kwargs.get("keywords_list")
+        node_keywords: dict[str, list[str]] = {}
+        for i in range(len(texts)):
+            text = texts[i]
+            if keywords_list:
+                keywords = keywords_list[i]
+                if not keywords:
                     keywords = keyword_table_handler.extract_keywords(
                         text.page_content, self._config.max_keywords_per_chunk
                     )
-                if text.metadata is not None:
-                    self._update_segment_keywords(self.dataset.id, text.metadata["doc_id"], list(keywords))
-                    keyword_table = self._add_text_to_keyword_table(
-                        keyword_table or {}, text.metadata["doc_id"], list(keywords)
-                    )
+            else:
+                keywords = keyword_table_handler.extract_keywords(
+                    text.page_content, self._config.max_keywords_per_chunk
+                )
+            if text.metadata is not None:
+                self._update_segment_keywords(self.dataset.id, text.metadata["doc_id"], list(keywords))
+                node_keywords[text.metadata["doc_id"]] = list(keywords)
 
-            self._save_dataset_keyword_table(keyword_table)
+        self._add_to_keyword_table(node_keywords)
 
     def text_exists(self, id: str) -> bool:
-        keyword_table = self._get_dataset_keyword_table()
-        if keyword_table is None:
-            return False
-        return id in set.union(*keyword_table.values())
+        keyword_table = self._get_keyword_table_shards()
+        shard_id = keyword_table.shard_of(id)
+        return id in keyword_table.load(NODE_SHARD, [shard_id])[shard_id]
 
     def delete_by_ids(self, ids: list[str]) -> None:
-        lock_name = "keyword_indexing_lock_{}".format(self.dataset.id)
-        with redis_client.lock(lock_name, timeout=600):
-            keyword_table = self._get_dataset_keyword_table()
-            if keyword_table is not None:
-                keyword_table = self._delete_ids_from_keyword_table(keyword_table, ids)
-
-            self._save_dataset_keyword_table(keyword_table)
+        keyword_table = self._get_keyword_table_shards()
+        node_shard_ids = keyword_table.group_by_shard(ids)
+        # the node shards tell which keywords, and therefore which keyword shards, reference the ids
+        keyword_node_ids = self._get_keyword_node_ids(node_shard_ids, keyword_table.load(NODE_SHARD, node_shard_ids))
+
+        while True:
+            keyword_shard_ids = keyword_table.group_by_shard(keyword_node_ids)
+            with self._lock_shards({NODE_SHARD: node_shard_ids, KEYWORD_SHARD: keyword_shard_ids}):
+                node_shards = keyword_table.load(NODE_SHARD, node_shard_ids)
+                locked_keyword_node_ids = keyword_node_ids
+                keyword_node_ids = self._get_keyword_node_ids(node_shard_ids, node_shards)
+                if not keyword_node_ids.keys() <= locked_keyword_node_ids.keys():
+                    # keywords were added to the ids before the locks were taken, lock their shards too
+                    continue
+
+                for node_ids in node_shard_ids.values():
+                    for node_id in node_ids:
+                        node_shards[keyword_table.shard_of(node_id)].pop(node_id, None)
+
+                keyword_shards = keyword_table.load(KEYWORD_SHARD, keyword_shard_ids)
+                for shard_id, shard_keywords in keyword_shard_ids.items():
+                    for keyword in shard_keywords:
+                        postings = keyword_shards[shard_id].get(keyword)
+                        if postings is None or keyword not in keyword_node_ids:
+                            continue
+                        postings.difference_update(keyword_node_ids[keyword])
+                        if not postings:
+                            del keyword_shards[shard_id][keyword]
+
+                keyword_table.save(KEYWORD_SHARD, keyword_shards, commit=False)
+                keyword_table.save(NODE_SHARD, node_shards)
+                return
+
+    @staticmethod
+    def _get_keyword_node_ids(
+        node_shard_ids: dict[int, set[str]], node_shards: dict[int, dict[str, set[str]]]
+    ) -> dict[str, set[str]]:
+        keyword_node_ids: dict[str, set[str]] = {}
+        for shard_id, node_ids in node_shard_ids.items():
+            for node_id in node_ids:
+                for keyword in node_shards[shard_id].get(node_id, set()):
+                    keyword_node_ids.setdefault(keyword, set()).add(node_id)
+        return keyword_node_ids
 
     def search(self, query: str, **kwargs: Any) -> list[Document]:
-        keyword_table = self._get_dataset_keyword_table()
+        keyword_table = self._get_keyword_table_shards()
 
         k = kwargs.get("top_k", 4)
 
-        sorted_chunk_indices = self._retrieve_ids_by_query(keyword_table or {}, query, k)
+        keyword_table_handler = JiebaKeywordTableHandler()
+        keywords = keyword_table_handler.extract_keywords(query)
+
+        # only the shards holding the query keywords are loaded
+        keyword_shard_ids = keyword_table.group_by_shard(keywords)
+        keyword_shards = keyword_table.load(KEYWORD_SHARD, keyword_shard_ids)
+        query_keyword_table = {
+            keyword: keyword_shards[shard_id][keyword]
+            for shard_id, shard_keywords in keyword_shard_ids.items()
+            for keyword in shard_keywords
+            if keyword in keyword_shards[shard_id]
+        }
 
-        documents = []
-        for chunk_index in sorted_chunk_indices:
-            segment = (
-                db.session.query(DocumentSegment)
-                .filter(DocumentSegment.dataset_id == self.dataset.id, DocumentSegment.index_node_id == chunk_index)
-                .first()
+        ranked_chunks = self._retrieve_ids_by_query(
+            query_keyword_table, keywords, k, corpus_size=self._get_corpus_size()
+        )
+        if not ranked_chunks:
+            return []
+
+        segments = (
+            db.session.query(DocumentSegment)
+            .filter(
+                DocumentSegment.dataset_id == self.dataset.id,
+                DocumentSegment.index_node_id.in_([chunk_index for chunk_index, _ in ranked_chunks]),
             )
+            .all()
+        )
+        segment_map = {segment.index_node_id: segment for segment in segments}
 
+        documents = []
+        for chunk_index, score in ranked_chunks:
+            segment = segment_map.get(chunk_index)
             if segment:
                 documents.append(
                     Document(
@@ -108,6 +166,8 @@ class Jieba(BaseKeyword):
                             "doc_hash": segment.index_node_hash,
                             "document_id": segment.document_id,
                             "dataset_id": segment.dataset_id,
+                            # kept apart from "score", which rerankers read as the vector similarity
+                            "keyword_score": score,
                         },
                     )
                 )
@@ -119,96 +179,173 @@ class Jieba(BaseKeyword):
         with redis_client.lock(lock_name, timeout=600):
             dataset_keyword_table = self.dataset.dataset_keyword_table
             if dataset_keyword_table:
+                header = self._get_sharded_header(dataset_keyword_table)
+                if header:
+                    ShardedKeywordTable(
+                        self.dataset, dataset_keyword_table.data_source_type, header["__data__"]["shard_count"]
+                    ).delete_all()
                 db.session.delete(dataset_keyword_table)
                 db.session.commit()
                 if dataset_keyword_table.data_source_type != "database":
                     file_key = "keyword_files/" + self.dataset.tenant_id + "/" + self.dataset.id + ".txt"
-                    storage.delete(file_key)
+                    if storage.exists(file_key):
+                        storage.delete(file_key)
 
-    def _save_dataset_keyword_table(self, keyword_table):
-        keyword_table_dict = {
-            "__type__": "keyword_table",
-            "__data__": {"index_id": self.dataset.id, "summary": None, "table": keyword_table},
-        }
-        dataset_keyword_table = self.dataset.dataset_keyword_table
-        keyword_data_source_type = dataset_keyword_table.data_source_type
-        if keyword_data_source_type == "database":
-            dataset_keyword_table.keyword_table = json.dumps(keyword_table_dict, cls=SetEncoder)
-            db.session.commit()
-        else:
-            file_key = "keyword_files/" + self.dataset.tenant_id + "/" + self.dataset.id + ".txt"
-            if storage.exists(file_key):
-                storage.delete(file_key)
-            storage.save(file_key, json.dumps(keyword_table_dict, cls=SetEncoder).encode("utf-8"))
-
-    def _get_dataset_keyword_table(self) -> Optional[dict]:
+    def _get_keyword_table_shards(self) -> ShardedKeywordTable:
         dataset_keyword_table = self.dataset.dataset_keyword_table
         if dataset_keyword_table:
-            keyword_table_dict = dataset_keyword_table.keyword_table_dict
-            if keyword_table_dict:
-                return dict(keyword_table_dict["__data__"]["table"])
-        else:
-            keyword_data_source_type = dify_config.KEYWORD_DATA_SOURCE_TYPE
-            dataset_keyword_table = DatasetKeywordTable(
-                dataset_id=self.dataset.id,
-                keyword_table="",
-                data_source_type=keyword_data_source_type,
-            )
-            if keyword_data_source_type == "database":
-                dataset_keyword_table.keyword_table = json.dumps(
-                    {
-                        "__type__": "keyword_table",
-                        "__data__": {"index_id": self.dataset.id, "summary": None, "table": {}},
-                    },
-                    cls=SetEncoder,
+            header = self._get_sharded_header(dataset_keyword_table)
+            if header:
+                return ShardedKeywordTable(
+                    self.dataset, dataset_keyword_table.data_source_type, header["__data__"]["shard_count"]
                 )
-            db.session.add(dataset_keyword_table)
-            db.session.commit()
-
-        return {}
+            return self._migrate_legacy_keyword_table()
 
-    def _add_text_to_keyword_table(self, keyword_table: dict, id: str, keywords: list[str]) -> dict:
-        for keyword in keywords:
-            if keyword not in keyword_table:
-                keyword_table[keyword] = set()
-            keyword_table[keyword].add(id)
-        return keyword_table
-
-    def _delete_ids_from_keyword_table(self, keyword_table: dict, ids: list[str]) -> dict:
-        # get set of ids that correspond to node
-        node_idxs_to_delete = set(ids)
+        lock_name = "keyword_indexing_lock_{}".format(self.dataset.id)
+        with redis_client.lock(lock_name, timeout=600):
+            dataset_keyword_table = self.dataset.dataset_keyword_table
+            if dataset_keyword_table:
+                header = self._get_sharded_header(dataset_keyword_table)
+                if header:
+                    return ShardedKeywordTable(
+                        self.dataset, dataset_keyword_table.data_source_type, header["__data__"]["shard_count"]
+                    )
+            else:
+                keyword_table = ShardedKeywordTable(
+                    self.dataset, dify_config.KEYWORD_DATA_SOURCE_TYPE, dify_config.KEYWORD_TABLE_SHARD_COUNT
+                )
+                dataset_keyword_table = DatasetKeywordTable(
+                    dataset_id=self.dataset.id,
+                    keyword_table=json.dumps(keyword_table.header()),
+                    data_source_type=dify_config.KEYWORD_DATA_SOURCE_TYPE,
+                )
+                db.session.add(dataset_keyword_table)
+                db.session.commit()
+                return keyword_table
 
-        # delete node_idxs from keyword to node idxs mapping
-        keywords_to_delete = set()
-        for keyword, node_idxs in keyword_table.items():
-            if node_idxs_to_delete.intersection(node_idxs):
-                keyword_table[keyword] = node_idxs.difference(node_idxs_to_delete)
-                if not keyword_table[keyword]:
-                    keywords_to_delete.add(keyword)
+        return self._migrate_legacy_keyword_table()
 
-        for keyword in keywords_to_delete:
-            del keyword_table[keyword]
+    def _migrate_legacy_keyword_table(self) -> ShardedKeywordTable:
+        """Split a legacy single-blob `keyword_table` into shards, once per dataset."""
+        lock_name = "keyword_indexing_lock_{}".format(self.dataset.id)
+        with redis_client.lock(lock_name, timeout=600):
+            dataset_keyword_table = self.dataset.dataset_keyword_table
+            data_source_type = dataset_keyword_table.data_source_type
+            header = self._get_sharded_header(dataset_keyword_table)
+            if header:
+                # migrated by another worker while waiting for the lock
+                return ShardedKeywordTable(self.dataset, data_source_type, header["__data__"]["shard_count"])
 
-        return keyword_table
+            keyword_table_dict = dataset_keyword_table.keyword_table_dict
+            legacy_keyword_table = dict(keyword_table_dict["__data__"]["table"]) if keyword_table_dict else {}
 
-    def _retrieve_ids_by_query(self, keyword_table: dict, query: str, k: int = 4):
-        keyword_table_handler = JiebaKeywordTableHandler()
-        keywords = keyword_table_handler.extract_keywords(query)
+            keyword_table = ShardedKeywordTable(self.dataset, data_source_type, dify_config.KEYWORD_TABLE_SHARD_COUNT)
+            keyword_table.save_all(legacy_keyword_table, commit=False)
+            dataset_keyword_table.keyword_table = json.dumps(keyword_table.header())
+            db.session.commit()
 
-        # go through text chunks in order of most matching keywords
-        chunk_indices_count: dict[str, int] = defaultdict(int)
-        keywords_list = [keyword for keyword in keywords if keyword in set(keyword_table.keys())]
-        for keyword in keywords_list:
-            for node_id in keyword_table[keyword]:
-                chunk_indices_count[node_id] += 1
+            if data_source_type != "database":
+                file_key = "keyword_files/" + self.dataset.tenant_id + "/" + self.dataset.id + ".txt"
+                if storage.exists(file_key):
+                    storage.delete(file_key)
 
-        sorted_chunk_indices = sorted(
-            chunk_indices_count.keys(),
-            key=lambda x: chunk_indices_count[x],
-            reverse=True,
+            return keyword_table
+
+    @staticmethod
+    def _get_sharded_header(dataset_keyword_table: DatasetKeywordTable) -> Optional[dict]:
+        if not dataset_keyword_table.keyword_table:
+            return None
+        try:
+            header = json.loads(dataset_keyword_table.keyword_table)
+        except json.JSONDecodeError:
+            return None
+        if isinstance(header, dict) and header.get("__type__") == SHARDED_KEYWORD_TABLE_TYPE:
+            return header
+        return None
+
+    @contextmanager
+    def _lock_shards(self, shard_ids: dict[str, dict[int, set[str]]]) -> Generator[None, None, None]:
+        """
+        Lock the given shards of every kind in one pass, always in the same (kind, shard id) order so
+        writers touching overlapping shards cannot deadlock.
+        """
+        lock_names = sorted(
+            "keyword_indexing_lock_{}_{}_{:04d}".format(self.dataset.id, kind, shard_id)
+            for kind, kind_shard_ids in shard_ids.items()
+            for shard_id in kind_shard_ids
         )
-
-        return sorted_chunk_indices[:k]
+        with ExitStack() as stack:
+            for lock_name in lock_names:
+                stack.enter_context(redis_client.lock(lock_name, timeout=600))
+            yield
+
+    def _add_to_keyword_table(self, node_keywords: dict[str, list[str]]) -> None:
+        """Merge node id -> keywords postings, touching only the shards they hash to."""
+        if not node_keywords:
+            return
+        keyword_table = self._get_keyword_table_shards()
+
+        keyword_node_ids: dict[str, set[str]] = {}
+        for node_id, keywords in node_keywords.items():
+            for keyword in keywords:
+                keyword_node_ids.setdefault(keyword, set()).add(node_id)
+
+        node_shard_ids = keyword_table.group_by_shard(node_keywords)
+        keyword_shard_ids = keyword_table.group_by_shard(keyword_node_ids)
+        with self._lock_shards({NODE_SHARD: node_shard_ids, KEYWORD_SHARD: keyword_shard_ids}):
+            node_shards = keyword_table.load(NODE_SHARD, node_shard_ids)
+            for shard_id, node_ids in node_shard_ids.items():
+                for node_id in node_ids:
+                    node_shards[shard_id].setdefault(node_id, set()).update(node_keywords[node_id])
+
+            keyword_shards = keyword_table.load(KEYWORD_SHARD, keyword_shard_ids)
+            for shard_id, shard_keywords in keyword_shard_ids.items():
+                for keyword in shard_keywords:
+                    keyword_shards[shard_id].setdefault(keyword, set()).update(keyword_node_ids[keyword])
+
+            keyword_table.save(NODE_SHARD, node_shards, commit=False)
+            keyword_table.save(KEYWORD_SHARD, keyword_shards)
+
+    def _retrieve_ids_by_query(
+        self, keyword_table: dict, keywords: Iterable[str], k: int = 4, corpus_size: int = 0
+    ) -> list[tuple[str, float]]:
+        """
+        Rank chunks by the summed idf of the query keywords they hold and return the top k (node id, score) pairs.
+        Postings only record that a chunk holds a keyword, not how often or how long the chunk is, so this is an
+        idf-weighted keyword match rather than BM25. Scores are normalized into [0, 1] by the best achievable score.
+        """
+        keywords_list = [keyword for keyword in keywords if keyword in keyword_table]
+        if not keywords_list:
+            return []
+
+        corpus_size = max(corpus_size, *(len(keyword_table[keyword]) for keyword in keywords_list))
+        chunk_scores: dict[str, float] = defaultdict(float)
+        max_score = 0.0
+        for keyword in keywords_list:
+            postings = keyword_table[keyword]
+            idf = math.log(1 + (corpus_size - len(postings) + 0.5) / (len(postings) + 0.5))
+            max_score += idf
+            for node_id in postings:
+                chunk_scores[node_id] += idf
+
+        top_chunks = heapq.nlargest(k, chunk_scores.items(), key=lambda item: (item[1], item[0]))
+
+        return [(node_id, score / max_score if max_score else 0.0) for node_id, score in top_chunks]
+
+    def _get_corpus_size(self) -> int:
+        """Number of indexed chunks in the dataset, cached briefly as it only feeds the idf estimate."""
+        cache_key = "keyword_search_corpus_size_{}".format(self.dataset.id)
+        corpus_size = redis_client.get(cache_key)
+        if corpus_size is not None:
+            return int(corpus_size)
+
+        corpus_size = (
+            db.session.query(func.count(DocumentSegment.id))
+            .filter(DocumentSegment.dataset_id == self.dataset.id, DocumentSegment.enabled == True)
+            .scalar()
+        ) or 0
+        redis_client.setex(cache_key, 600, corpus_size)
+        return int(corpus_size)
 
     def _update_segment_keywords(self, dataset_id: str, node_id: str, keywords: list[str]):
         document_segment = (
@@ -222,37 +359,22 @@ class Jieba(BaseKeyword):
             db.session.commit()
 
     def create_segment_keywords(self, node_id: str, keywords: list[str]):
-        keyword_table = self._get_dataset_keyword_table()
         self._update_segment_keywords(self.dataset.id, node_id, keywords)
-        keyword_table = self._add_text_to_keyword_table(keyword_table or {}, node_id, keywords)
-        self._save_dataset_keyword_table(keyword_table)
+        self._add_to_keyword_table({node_id: keywords})
 
     def multi_create_segment_keywords(self, pre_segment_data_list: list):
         keyword_table_handler = JiebaKeywordTableHandler()
-        keyword_table = self._get_dataset_keyword_table()
+        node_keywords: dict[str, list[str]] = {}
         for pre_segment_data in pre_segment_data_list:
             segment = pre_segment_data["segment"]
             if pre_segment_data["keywords"]:
                 segment.keywords = pre_segment_data["keywords"]
-                keyword_table = self._add_text_to_keyword_table(
-                    keyword_table or {}, segment.index_node_id, pre_segment_data["keywords"]
-                )
+                node_keywords[segment.index_node_id] = pre_segment_data["keywords"]
             else:
                 keywords = keyword_table_handler.extract_keywords(segment.content, self._config.max_keywords_per_chunk)
                 segment.keywords = list(keywords)
-                keyword_table = self._add_text_to_keyword_table(
-                    keyword_table or {}, segment.index_node_id, list(keywords)
-                )
-        self._save_dataset_keyword_table(keyword_table)
+                node_keywords[segment.index_node_id] = list(keywords)
+        self._add_to_keyword_table(node_keywords)
 
     def update_segment_keywords_index(self, node_id: str, keywords: list[str]):
-        keyword_table = self._get_dataset_keyword_table()
-        keyword_table = self._add_text_to_keyword_table(keyword_table or {}, node_id, keywords)
-        self._save_dataset_keyword_table(keyword_table)
-
-
-class SetEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, set):
-            return list(obj)
-        return super().default(obj)
+        self._add_to_keyword_table({node_id: keywords})
@@ -0,0 +1,139 @@
+import json
+import zlib
+from collections.abc import Iterable, Mapping
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from extensions.ext_database import db
+from extensions.ext_storage import storage
+from models.dataset import Dataset, DatasetKeywordTableShard
+
+SHARDED_KEYWORD_TABLE_TYPE = "sharded_keyword_table"
+LEGACY_KEYWORD_TABLE_TYPE = "keyword_table"
+
+# keyword -> node ids postings lists
+KEYWORD_SHARD = "keyword"
+# node id -> keywords, used to find the postings to drop when a node is deleted
+NODE_SHARD = "node"
+
+ShardTable = dict[str, set[str]]
+
+
+class ShardedKeywordTable:
+    """
+    Keyword index of a dataset split into fixed-size shards by a stable hash of the key.
+
+    Shards are stored as rows of `dataset_keyword_table_shards` when the data source type is
+    "database", otherwise as one object per shard under `keyword_files/` in storage.
+    """
+
+    def __init__(self, dataset: Dataset, data_source_type: str, shard_count: int):
+        self._dataset = dataset
+        self._data_source_type = data_source_type
+        self.shard_count = shard_count
+
+    def shard_of(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self.shard_count
+
+    def group_by_shard(self, keys: Iterable[str]) -> dict[int, set[str]]:
+        shards: dict[int, set[str]] = {}
+        for key in keys:
+            shards.setdefault(self.shard_of(key), set()).add(key)
+        return shards
+
+    def header(self) -> dict:
+        return {
+            "__type__": SHARDED_KEYWORD_TABLE_TYPE,
+            "__data__": {"index_id": self._dataset.id, "shard_count": self.shard_count},
+        }
+
+    def load(self, kind: str, shard_ids: Iterable[int]) -> dict[int, ShardTable]:
+        shard_ids = sorted(set(shard_ids))
+        shards: dict[int, ShardTable] = {shard_id: {} for shard_id in shard_ids}
+        if not shard_ids:
+            return shards
+
+        if self._data_source_type == "database":
+            rows = (
+                db.session.query(DatasetKeywordTableShard.shard_id, DatasetKeywordTableShard.postings)
+                .filter(
+                    DatasetKeywordTableShard.dataset_id == self._dataset.id,
+                    DatasetKeywordTableShard.kind == kind,
+                    DatasetKeywordTableShard.shard_id.in_(shard_ids),
+                )
+                .all()
+            )
+            for shard_id, postings in rows:
+                shards[shard_id] = self._decode(postings)
+        else:
+            for shard_id in shard_ids:
+                file_key = self._file_key(kind, shard_id)
+                if storage.exists(file_key):
+                    shards[shard_id] = self._decode(storage.load_once(file_key).decode("utf-8"))
+
+        return shards
+
+    def save(self, kind: str, shards: Mapping[int, ShardTable], commit: bool = True) -> None:
+        if not shards:
+            return
+
+        if self._data_source_type == "database":
+            rows = [
+                {
+                    "dataset_id": self._dataset.id,
+                    "kind": kind,
+                    "shard_id": shard_id,
+                    "postings": self._encode(table),
+                }
+                for shard_id, table in shards.items()
+            ]
+            stmt = insert(DatasetKeywordTableShard).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["dataset_id", "kind", "shard_id"],
+                set_={"postings": stmt.excluded.postings, "updated_at": func.current_timestamp()},
+            )
+            db.session.execute(stmt)
+            if commit:
+                db.session.commit()
+        else:
+            for shard_id, table in shards.items():
+                storage.save(self._file_key(kind, shard_id), self._encode(table).encode("utf-8"))
+
+    def save_all(self, keyword_table: Mapping[str, Iterable[str]], commit: bool = True) -> None:
+        """Write a whole keyword -> node ids table, e.g. when migrating from the legacy single-blob format."""
+        keyword_shards: dict[int, ShardTable] = {shard_id: {} for shard_id in range(self.shard_count)}
+        node_shards: dict[int, ShardTable] = {shard_id: {} for shard_id in range(self.shard_count)}
+        for keyword, node_ids in keyword_table.items():
+            keyword_shards[self.shard_of(keyword)][keyword] = set(node_ids)
+            for node_id in node_ids:
+                node_shards[self.shard_of(node_id)].setdefault(node_id, set()).add(keyword)
+
+        self.save(KEYWORD_SHARD, keyword_shards, commit=False)
+        self.save(NODE_SHARD, node_shards, commit=False)
+        if commit:
+            db.session.commit()
+
+    def delete_all(self) -> None:
+        if self._data_source_type == "database":
+            db.session.query(DatasetKeywordTableShard).filter(
+                DatasetKeywordTableShard.dataset_id == self._dataset.id
+            ).delete()
+            db.session.commit()
+        else:
+            for kind in (KEYWORD_SHARD, NODE_SHARD):
+                for shard_id in range(self.shard_count):
+                    file_key = self._file_key(kind, shard_id)
+                    if storage.exists(file_key):
+                        storage.delete(file_key)
+
+    def _file_key(self, kind: str, shard_id: int) -> str:
+        return f"keyword_files/{self._dataset.tenant_id}/{self._dataset.id}/{kind}_{shard_id}.txt"
+
+    @staticmethod
+    def _encode(table: ShardTable) -> str:
+        return json.dumps({key: sorted(values) for key, values in table.items()})
+
+    @staticmethod
+    def _decode(postings: str) -> ShardTable:
+        return {key: set(values) for key, values in json.loads(postings).items()} if postings else {}
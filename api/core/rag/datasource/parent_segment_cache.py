@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping
+from typing import Optional
+
+from configs import dify_config
+from models.dataset import DocumentSegment
+
+
+class ParentSegmentCache:
+    """
+    Process-local LRU of the parent segments hydrated for parent-child retrieval.
+
+    Entries are keyed by dataset id, segment id and the hash of the segment content, so an edited parent is
+    never served from the cache. Fields the hash does not cover, like the hit count or the keywords, may be
+    stale for up to `RETRIEVAL_PARENT_SEGMENT_CACHE_TTL` seconds, after which the entry expires. Cached segments
+    are detached and shared by every retrieval, they must be merged into a session before they are used and must
+    not be modified.
+    """
+
+    # values are the expiry time on the monotonic clock and the segment
+    _entries: OrderedDict[tuple[str, str, Optional[str]], tuple[float, DocumentSegment]] = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_many(cls, dataset_id: str, segment_hashes: Mapping[str, Optional[str]]) -> dict[str, DocumentSegment]:
+        """
+        Get the cached parent segments of a dataset
+        :param dataset_id: dataset id
+        :param segment_hashes: current content hash of each segment id
+        :return: cached segments by segment id
+        """
+        if not dify_config.RETRIEVAL_PARENT_SEGMENT_CACHE_SIZE:
+            return {}
+
+        segments = {}
+        now = time.monotonic()
+        with cls._lock:
+            for segment_id, segment_hash in segment_hashes.items():
+                key = (dataset_id, segment_id, segment_hash)
+                entry = cls._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, segment = entry
+                if expires_at <= now:
+                    del cls._entries[key]
+                    continue
+                cls._entries.move_to_end(key)
+                segments[segment_id] = segment
+        return segments
+
+    @classmethod
+    def set_many(cls, segments: Iterable[DocumentSegment]) -> None:
+        if not dify_config.RETRIEVAL_PARENT_SEGMENT_CACHE_SIZE:
+            return
+
+        expires_at = time.monotonic() + dify_config.RETRIEVAL_PARENT_SEGMENT_CACHE_TTL
+        with cls._lock:
+            for segment in segments:
+                key = (segment.dataset_id, segment.id, segment.index_node_hash)
+                cls._entries[key] = (expires_at, segment)
+                cls._entries.move_to_end(key)
+            while len(cls._entries) > dify_config.RETRIEVAL_PARENT_SEGMENT_CACHE_SIZE:
+                cls._entries.popitem(last=False)
@@ -1,13 +1,16 @@
 import concurrent.futures
+from collections.abc import Iterable
 from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 from flask import Flask, current_app
-from sqlalchemy.orm import load_only
+from sqlalchemy import select
+from sqlalchemy.orm import Session, load_only
 
 from configs import dify_config
 from core.rag.data_post_processor.data_post_processor import DataPostProcessor
 from core.rag.datasource.keyword.keyword_factory import Keyword
+from core.rag.datasource.parent_segment_cache import ParentSegmentCache
 from core.rag.datasource.vdb.vector_factory import Vector
 from core.rag.embedding.retrieval import RetrievalSegments
 from core.rag.index_processor.constant.index_type import IndexType
@@ -265,6 +268,48 @@ class RetrievalService:
                 .all()
             }
 
+            # Batch query the child chunks hit in parent-child documents, with the content hash of their parents
+            child_index_node_ids = set()
+            index_node_ids = set()
+            for document in documents:
+                dataset_document = dataset_documents.get(document.metadata.get("document_id"))
+                if not dataset_document or not document.metadata.get("doc_id"):
+                    continue
+                if dataset_document.doc_form == IndexType.PARENT_CHILD_INDEX:
+                    child_index_node_ids.add(document.metadata["doc_id"])
+                else:
+                    index_node_ids.add(document.metadata["doc_id"])
+
+            child_chunks: dict[str, tuple[ChildChunk, str, Optional[str]]] = {}
+            if child_index_node_ids:
+                child_chunk_rows = db.session.execute(
+                    select(ChildChunk, DocumentSegment.dataset_id, DocumentSegment.index_node_hash)
+                    .join(DocumentSegment, DocumentSegment.id == ChildChunk.segment_id)
+                    .where(
+                        ChildChunk.index_node_id.in_(child_index_node_ids),
+                        DocumentSegment.enabled == True,
+                        DocumentSegment.status == "completed",
+                    )
+                )
+                for child_chunk, segment_dataset_id, segment_hash in child_chunk_rows:
+                    child_chunks.setdefault(child_chunk.index_node_id, (child_chunk, segment_dataset_id, segment_hash))
+            parent_segments = cls._get_parent_segments(child_chunks.values())
+
+            # Batch query the segments hit in other documents
+            segments: dict[tuple[str, str], DocumentSegment] = {}
+            if index_node_ids:
+                for index_node_segment in db.session.scalars(
+                    select(DocumentSegment).where(
+                        DocumentSegment.dataset_id.in_({doc.dataset_id for doc in dataset_documents.values()}),
+                        DocumentSegment.index_node_id.in_(index_node_ids),
+                        DocumentSegment.enabled == True,
+                        DocumentSegment.status == "completed",
+                    )
+                ):
+                    segments.setdefault(
+                        (index_node_segment.dataset_id, index_node_segment.index_node_id), index_node_segment
+                    )
+
             records = []
             include_segment_ids = set()
             segment_child_map = {}
@@ -279,44 +324,23 @@ class RetrievalService:
 
                 if dataset_document.doc_form == IndexType.PARENT_CHILD_INDEX:
                     # Handle parent-child documents
-                    child_index_node_id = document.metadata.get("doc_id")
-
-                    child_chunk = (
-                        db.session.query(ChildChunk).filter(ChildChunk.index_node_id == child_index_node_id).first()
-                    )
-
-                    if not child_chunk:
+                    child_chunk_entry = child_chunks.get(document.metadata.get("doc_id", ""))
+                    if not child_chunk_entry or child_chunk_entry[1] != dataset_document.dataset_id:
                         continue
 
-                    segment = (
-                        db.session.query(DocumentSegment)
-                        .filter(
-                            DocumentSegment.dataset_id == dataset_document.dataset_id,
-                            DocumentSegment.enabled == True,
-                            DocumentSegment.status == "completed",
-                            DocumentSegment.id == child_chunk.segment_id,
-                        )
-                        .options(
-                            load_only(
-                                DocumentSegment.id,
-                                DocumentSegment.content,
-                                DocumentSegment.answer,
-                            )
-                        )
-                        .first()
-                    )
-
+                    child_chunk = child_chunk_entry[0]
+                    segment = parent_segments.get(child_chunk.segment_id)
                     if not segment:
                         continue
 
+                    child_chunk_detail = {
+                        "id": child_chunk.id,
+                        "content": child_chunk.content,
+                        "position": child_chunk.position,
+                        "score": document.metadata.get("score", 0.0),
+                    }
                     if segment.id not in include_segment_ids:
                         include_segment_ids.add(segment.id)
-                        child_chunk_detail = {
-                            "id": child_chunk.id,
-                            "content": child_chunk.content,
-                            "position": child_chunk.position,
-                            "score": document.metadata.get("score", 0.0),
-                        }
                         map_detail = {
                             "max_score": document.metadata.get("score", 0.0),
                             "child_chunks": [child_chunk_detail],
@@ -327,12 +351,6 @@ class RetrievalService:
                         }
                         records.append(record)
                     else:
-                        child_chunk_detail = {
-                            "id": child_chunk.id,
-                            "content": child_chunk.content,
-                            "position": child_chunk.position,
-                            "score": document.metadata.get("score", 0.0),
-                        }
                         segment_child_map[segment.id]["child_chunks"].append(child_chunk_detail)
                         segment_child_map[segment.id]["max_score"] = max(
                             segment_child_map[segment.id]["max_score"], document.metadata.get("score", 0.0)
@@ -343,17 +361,7 @@ class RetrievalService:
                     if not index_node_id:
                         continue
 
-                    segment = (
-                        db.session.query(DocumentSegment)
-                        .filter(
-                            DocumentSegment.dataset_id == dataset_document.dataset_id,
-                            DocumentSegment.enabled == True,
-                            DocumentSegment.status == "completed",
-                            DocumentSegment.index_node_id == index_node_id,
-                        )
-                        .first()
-                    )
-
+                    segment = segments.get((dataset_document.dataset_id, index_node_id))
                     if not segment:
                         continue
 
@@ -374,3 +382,38 @@ class RetrievalService:
         except Exception as e:
             db.session.rollback()
             raise e
+
+    @classmethod
+    def _get_parent_segments(
+        cls, child_chunks: Iterable[tuple[ChildChunk, str, Optional[str]]]
+    ) -> dict[str, DocumentSegment]:
+        """Get the parent segments of child chunks, from the cache if their content is unchanged"""
+        segment_hashes: dict[str, dict[str, Optional[str]]] = {}
+        for child_chunk, dataset_id, segment_hash in child_chunks:
+            segment_hashes.setdefault(dataset_id, {})[child_chunk.segment_id] = segment_hash
+
+        segments: dict[str, DocumentSegment] = {}
+        for dataset_id, dataset_segment_hashes in segment_hashes.items():
+            segments.update(ParentSegmentCache.get_many(dataset_id, dataset_segment_hashes))
+
+        missing_segment_ids = {
+            segment_id
+            for dataset_segment_hashes in segment_hashes.values()
+            for segment_id in dataset_segment_hashes
+            if segment_id not in segments
+        }
+        if missing_segment_ids:
+            # loaded outside of the request session, so the cached segments keep their state once detached
+            with Session(db.engine, expire_on_commit=False) as session:
+                missing_segments = session.scalars(
+                    select(DocumentSegment).where(
+                        DocumentSegment.id.in_(missing_segment_ids),
+                        DocumentSegment.enabled == True,
+                        DocumentSegment.status == "completed",
+                    )
+                ).all()
+            ParentSegmentCache.set_many(missing_segments)
+            segments.update({segment.id: segment for segment in missing_segments})
+
+        # attach copies of the segments to the request session without querying them again
+        return {segment_id: db.session.merge(segment, load=False) for segment_id, segment in segments.items()}
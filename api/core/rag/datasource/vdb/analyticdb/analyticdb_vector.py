@@ -46,6 +46,11 @@ class AnalyticdbVector(BaseVector):
     def text_exists(self, id: str) -> bool:
         return self.analyticdb_vector.text_exists(id)
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        if isinstance(self.analyticdb_vector, AnalyticdbVectorBySql):
+            return self.analyticdb_vector.get_existing_ids(ids)
+        return super().get_existing_ids(ids)
+
     def delete_by_ids(self, ids: list[str]) -> None:
         self.analyticdb_vector.delete_by_ids(ids)
 
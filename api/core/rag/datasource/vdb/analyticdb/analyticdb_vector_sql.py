@@ -176,6 +176,13 @@ class AnalyticdbVectorBySql:
             cur.execute(f"SELECT id FROM {self.table_name} WHERE ref_doc_id = %s", (id,))
             return cur.fetchone() is not None
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        if not ids:
+            return set()
+        with self._get_cursor() as cur:
+            cur.execute(f"SELECT ref_doc_id FROM {self.table_name} WHERE ref_doc_id IN %s", (tuple(ids),))
+            return {record[0] for record in cur}
+
     def delete_by_ids(self, ids: list[str]) -> None:
         with self._get_cursor() as cur:
             try:
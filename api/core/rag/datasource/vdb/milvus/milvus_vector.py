@@ -196,6 +196,23 @@ class MilvusVector(BaseVector):
 
         return len(result) > 0
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        """
+        Return the subset of the given doc ids that exist in the collection.
+        """
+        if not ids or not self._client.has_collection(self._collection_name):
+            return set()
+
+        existing_ids: set[str] = set()
+        for i in range(0, len(ids), 1000):
+            result = self._client.query(
+                collection_name=self._collection_name,
+                filter=f'metadata["doc_id"] in {json.dumps(ids[i : i + 1000])}',
+                output_fields=[Field.METADATA_KEY.value],
+            )
+            existing_ids.update(row[Field.METADATA_KEY.value]["doc_id"] for row in result)
+        return existing_ids
+
     def field_exists(self, field: str) -> bool:
         """
         Check if a field exists in the collection.
@@ -99,6 +99,14 @@ class MyScaleVector(BaseVector):
         results = self._client.query(f"SELECT id FROM {self._config.database}.{self._collection_name} WHERE id='{id}'")
         return results.row_count > 0
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        if not ids:
+            return set()
+        rows = self._client.query(
+            f"SELECT id FROM {self._config.database}.{self._collection_name} WHERE id IN {str(tuple(ids))}"
+        ).result_rows
+        return {row[0] for row in rows}
+
     def delete_by_ids(self, ids: list[str]) -> None:
         if not ids:
             return
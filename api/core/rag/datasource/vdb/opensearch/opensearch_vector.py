@@ -4,7 +4,7 @@ import ssl
 from typing import Any, Optional
 from uuid import uuid4
 
-from opensearchpy import OpenSearch, helpers
+from opensearchpy import NotFoundError, OpenSearch, helpers
 from opensearchpy.helpers import BulkIndexError
 from pydantic import BaseModel, model_validator
 
@@ -141,6 +141,15 @@ class OpenSearchVector(BaseVector):
         except:
             return False
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        if not ids:
+            return set()
+        try:
+            response = self._client.mget(index=self._collection_name.lower(), body={"ids": ids}, _source=False)
+        except NotFoundError:
+            return set()
+        return {doc["_id"] for doc in response["docs"] if doc.get("found")}
+
     def search_by_vector(self, query_vector: list[float], **kwargs: Any) -> list[Document]:
         # Make sure query_vector is a list
         if not isinstance(query_vector, list):
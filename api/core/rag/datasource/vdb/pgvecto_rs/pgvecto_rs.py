@@ -6,7 +6,7 @@ from uuid import UUID, uuid4
 from numpy import ndarray
 from pgvecto_rs.sqlalchemy import VECTOR  # type: ignore
 from pydantic import BaseModel, model_validator
-from sqlalchemy import Float, String, create_engine, insert, select, text
+from sqlalchemy import Float, String, bindparam, create_engine, insert, select, text
 from sqlalchemy import text as sql_text
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import Mapped, Session, mapped_column
@@ -177,6 +177,16 @@ class PGVectoRS(BaseVector):
             result = session.execute(select_statement).fetchall()
         return len(result) > 0
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        if not ids:
+            return set()
+        with Session(self._client) as session:
+            select_statement = sql_text(
+                f"SELECT meta->>'doc_id' FROM {self._collection_name} WHERE meta->>'doc_id' IN :ids"
+            ).bindparams(bindparam("ids", expanding=True))
+            result = session.execute(select_statement, {"ids": ids}).fetchall()
+        return {row[0] for row in result}
+
     def search_by_vector(self, query_vector: list[float], **kwargs: Any) -> list[Document]:
         with Session(self._client) as session:
             stmt = (
@@ -320,6 +320,20 @@ class QdrantVector(BaseVector):
 
         return len(response) > 0
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        if not ids:
+            return set()
+        all_collection_name = [collection.name for collection in self._client.get_collections().collections]
+        if self._collection_name not in all_collection_name:
+            return set()
+        existing_ids: set[str] = set()
+        for i in range(0, len(ids), 1000):
+            response = self._client.retrieve(
+                collection_name=self._collection_name, ids=ids[i : i + 1000], with_payload=False, with_vectors=False
+            )
+            existing_ids.update(str(record.id) for record in response)
+        return existing_ids
+
     def search_by_vector(self, query_vector: list[float], **kwargs: Any) -> list[Document]:
         from qdrant_client.http import models
 
@@ -3,7 +3,7 @@ import uuid
 from typing import Any, Optional
 
 from pydantic import BaseModel, model_validator
-from sqlalchemy import Column, String, Table, create_engine, insert
+from sqlalchemy import Column, String, Table, bindparam, create_engine, insert
 from sqlalchemy import text as sql_text
 from sqlalchemy.dialects.postgresql import JSON, TEXT
 from sqlalchemy.orm import Session
@@ -222,6 +222,16 @@ class RelytVector(BaseVector):
             result = session.execute(select_statement).fetchall()
         return len(result) > 0
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        if not ids:
+            return set()
+        with Session(self.client) as session:
+            select_statement = sql_text(
+                f"""SELECT metadata->>'doc_id' FROM "{self._collection_name}" WHERE metadata->>'doc_id' IN :ids"""
+            ).bindparams(bindparam("ids", expanding=True))
+            result = session.execute(select_statement, {"ids": ids}).fetchall()
+        return {row[0] for row in result}
+
     def search_by_vector(self, query_vector: list[float], **kwargs: Any) -> list[Document]:
         results = self.similarity_search_with_score_by_vector(
             k=int(kwargs.get("top_k", 4)), embedding=query_vector, filter=kwargs.get("filter")
@@ -139,6 +139,18 @@ class TencentVector(BaseVector):
             return True
         return False
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        if not ids:
+            return set()
+        existing_ids: set[str] = set()
+        for i in range(0, len(ids), 1000):
+            batch_ids = ids[i : i + 1000]
+            docs = self._db.collection(self._collection_name).query(
+                document_ids=batch_ids, retrieve_vector=False, limit=len(batch_ids)
+            )
+            existing_ids.update(doc["id"] for doc in docs or [])
+        return existing_ids
+
     def delete_by_ids(self, ids: list[str]) -> None:
         if not ids:
             return
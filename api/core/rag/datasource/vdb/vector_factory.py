@@ -166,6 +166,9 @@ class Vector:
     def text_exists(self, id: str) -> bool:
         return self._vector_processor.text_exists(id)
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        return self._vector_processor.get_existing_ids(ids)
+
     def delete_by_ids(self, ids: list[str]) -> None:
         self._vector_processor.delete_by_ids(ids)
 
@@ -198,16 +201,14 @@ class Vector:
         return CacheEmbedding(embedding_model)
 
     def _filter_duplicate_texts(self, texts: list[Document]) -> list[Document]:
-        for text in texts.copy():
-            if text.metadata is None:
-                continue
-            doc_id = text.metadata["doc_id"]
-            if doc_id:
-                exists_duplicate_node = self.text_exists(doc_id)
-                if exists_duplicate_node:
-                    texts.remove(text)
-
-        return texts
+        doc_ids = list(
+            dict.fromkeys(text.metadata["doc_id"] for text in texts if text.metadata and text.metadata.get("doc_id"))
+        )
+        if not doc_ids:
+            return texts
+
+        existing_ids = self.get_existing_ids(doc_ids)
+        return [text for text in texts if not (text.metadata and text.metadata.get("doc_id") in existing_ids)]
 
     def __getattr__(self, name):
         if self._vector_processor is not None:
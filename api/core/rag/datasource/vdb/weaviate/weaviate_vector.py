@@ -164,6 +164,35 @@ class WeaviateVector(BaseVector):
 
         return True
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        collection_name = self._collection_name
+        schema = self._default_schema(self._collection_name)
+
+        if not ids or not self._client.schema.contains(schema):
+            return set()
+        existing_ids: set[str] = set()
+        for i in range(0, len(ids), 1000):
+            batch_ids = ids[i : i + 1000]
+            # doc_id is word tokenized, ContainsAny would match any shared token, Equal matches the whole id
+            operands: list[dict[str, Any]] = [
+                {"path": ["doc_id"], "operator": "Equal", "valueText": id} for id in batch_ids
+            ]
+            where_filter: dict[str, Any] = (
+                operands[0] if len(operands) == 1 else {"operator": "Or", "operands": operands}
+            )
+            result = (
+                self._client.query.get(collection_name, ["doc_id"])
+                .with_where(where_filter)
+                .with_limit(len(batch_ids))
+                .do()
+            )
+
+            if "errors" in result:
+                raise ValueError(f"Error during query: {result['errors']}")
+
+            existing_ids.update(entry["doc_id"] for entry in result["data"]["Get"][collection_name])
+        return existing_ids & set(ids)
+
     def delete_by_ids(self, ids: list[str]) -> None:
         # check whether the index already exists
         schema = self._default_schema(self._collection_name)
@@ -1,11 +1,14 @@
+import uuid
 from collections.abc import Sequence
 from typing import Any, Optional
 
-from sqlalchemy import func
+from sqlalchemy import delete, func, insert, select, update
 
+from configs import dify_config
 from core.model_manager import ModelManager
 from core.model_runtime.entities.model_entities import ModelType
-from core.rag.models.document import Document
+from core.rag.embedding.cached_token_counter import CachedTokenCounter
+from core.rag.models.document import ChildDocument, Document
 from extensions.ext_database import db
 from models.dataset import ChildChunk, Dataset, DocumentSegment
 
@@ -81,96 +84,141 @@ class DatasetDocumentStore:
 
         if embedding_model:
             page_content_list = [doc.page_content for doc in docs]
-            tokens_list = embedding_model.get_text_embedding_num_tokens(page_content_list)
+            tokens_list = CachedTokenCounter(embedding_model).get_num_tokens(page_content_list)
         else:
             tokens_list = [0] * len(docs)
 
-        for doc, tokens in zip(docs, tokens_list):
+        # segments are saved in batches, a failure keeps the batches already committed
+        batch_size = dify_config.INDEXING_SEGMENT_BATCH_SIZE
+        for start in range(0, len(docs), batch_size):
+            max_position = self._add_document_batch(
+                docs[start : start + batch_size],
+                tokens_list[start : start + batch_size],
+                max_position=max_position,
+                allow_update=allow_update,
+                save_child=save_child,
+            )
+
+    def _add_document_batch(
+        self,
+        docs: Sequence[Document],
+        tokens_list: Sequence[int],
+        max_position: int,
+        allow_update: bool,
+        save_child: bool,
+    ) -> int:
+        """
+        Save a batch of documents with one query for the existing segments and one statement per table and change,
+        return the max position of the segments of the document.
+        """
+        for doc in docs:
             if not isinstance(doc, Document):
                 raise ValueError("doc must be a Document")
 
             if doc.metadata is None:
                 raise ValueError("doc.metadata must be a dict")
 
-            segment_document = self.get_document_segment(doc_id=doc.metadata["doc_id"])
+        existing_segment_ids: dict[str, str] = {}
+        for segment_id, index_node_id in db.session.execute(
+            select(DocumentSegment.id, DocumentSegment.index_node_id).where(
+                DocumentSegment.dataset_id == self._dataset.id,
+                DocumentSegment.index_node_id.in_({doc.metadata["doc_id"] for doc in docs}),
+            )
+        ):
+            existing_segment_ids.setdefault(index_node_id, segment_id)
+
+        new_segments: dict[str, dict[str, Any]] = {}
+        updated_segments: dict[str, dict[str, Any]] = {}
+        # child chunks by segment id, those of updated segments replace the existing ones
+        child_chunks: dict[str, list[ChildDocument]] = {}
+        for doc, tokens in zip(docs, tokens_list):
+            doc_id = doc.metadata["doc_id"]
+            segment_id = existing_segment_ids.get(doc_id)
 
             # NOTE: doc could already exist in the store, but we overwrite it
-            if not allow_update and segment_document:
-                raise ValueError(
-                    f"doc_id {doc.metadata['doc_id']} already exists. Set allow_update to True to overwrite."
-                )
+            if not allow_update and segment_id:
+                raise ValueError(f"doc_id {doc_id} already exists. Set allow_update to True to overwrite.")
 
-            if not segment_document:
+            answer = doc.metadata.pop("answer", "") if doc.metadata.get("answer") else None
+            if not segment_id:
                 max_position += 1
-
-                segment_document = DocumentSegment(
-                    tenant_id=self._dataset.tenant_id,
-                    dataset_id=self._dataset.id,
-                    document_id=self._document_id,
-                    index_node_id=doc.metadata["doc_id"],
-                    index_node_hash=doc.metadata["doc_hash"],
-                    position=max_position,
-                    content=doc.page_content,
-                    word_count=len(doc.page_content),
-                    tokens=tokens,
-                    enabled=False,
-                    created_by=self._user_id,
-                )
-                if doc.metadata.get("answer"):
-                    segment_document.answer = doc.metadata.pop("answer", "")
-
-                db.session.add(segment_document)
-                db.session.flush()
-                if save_child:
-                    if doc.children:
-                        for postion, child in enumerate(doc.children, start=1):
-                            child_segment = ChildChunk(
-                                tenant_id=self._dataset.tenant_id,
-                                dataset_id=self._dataset.id,
-                                document_id=self._document_id,
-                                segment_id=segment_document.id,
-                                position=postion,
-                                index_node_id=child.metadata.get("doc_id"),
-                                index_node_hash=child.metadata.get("doc_hash"),
-                                content=child.page_content,
-                                word_count=len(child.page_content),
-                                type="automatic",
-                                created_by=self._user_id,
-                            )
-                            db.session.add(child_segment)
+                segment_id = str(uuid.uuid4())
+                existing_segment_ids[doc_id] = segment_id
+                new_segments[segment_id] = {
+                    "id": segment_id,
+                    "tenant_id": self._dataset.tenant_id,
+                    "dataset_id": self._dataset.id,
+                    "document_id": self._document_id,
+                    "index_node_id": doc_id,
+                    "index_node_hash": doc.metadata["doc_hash"],
+                    "position": max_position,
+                    "content": doc.page_content,
+                    "answer": answer,
+                    "word_count": len(doc.page_content),
+                    "tokens": tokens,
+                    "enabled": False,
+                    "created_by": self._user_id,
+                }
+                if save_child and doc.children:
+                    child_chunks[segment_id] = doc.children
             else:
-                segment_document.content = doc.page_content
-                if doc.metadata.get("answer"):
-                    segment_document.answer = doc.metadata.pop("answer", "")
-                segment_document.index_node_hash = doc.metadata.get("doc_hash")
-                segment_document.word_count = len(doc.page_content)
-                segment_document.tokens = tokens
+                # a doc repeated in the batch updates the segment it created
+                segment = new_segments.get(segment_id) or updated_segments.setdefault(segment_id, {"id": segment_id})
+                segment.update(
+                    {
+                        "content": doc.page_content,
+                        "index_node_hash": doc.metadata.get("doc_hash"),
+                        "word_count": len(doc.page_content),
+                        "tokens": tokens,
+                    }
+                )
+                if answer:
+                    segment["answer"] = answer
                 if save_child and doc.children:
-                    # delete the existing child chunks
-                    db.session.query(ChildChunk).filter(
+                    child_chunks[segment_id] = doc.children
+
+        try:
+            if new_segments:
+                db.session.execute(insert(DocumentSegment), list(new_segments.values()))
+            if updated_segments:
+                db.session.execute(update(DocumentSegment), list(updated_segments.values()))
+            replaced_segment_ids = [segment_id for segment_id in child_chunks if segment_id in updated_segments]
+            if replaced_segment_ids:
+                db.session.execute(
+                    delete(ChildChunk).where(
                         ChildChunk.tenant_id == self._dataset.tenant_id,
                         ChildChunk.dataset_id == self._dataset.id,
                         ChildChunk.document_id == self._document_id,
-                        ChildChunk.segment_id == segment_document.id,
-                    ).delete()
-                    # add new child chunks
-                    for position, child in enumerate(doc.children, start=1):
-                        child_segment = ChildChunk(
-                            tenant_id=self._dataset.tenant_id,
-                            dataset_id=self._dataset.id,
-                            document_id=self._document_id,
-                            segment_id=segment_document.id,
-                            position=position,
-                            index_node_id=child.metadata.get("doc_id"),
-                            index_node_hash=child.metadata.get("doc_hash"),
-                            content=child.page_content,
-                            word_count=len(child.page_content),
-                            type="automatic",
-                            created_by=self._user_id,
-                        )
-                        db.session.add(child_segment)
-
+                        ChildChunk.segment_id.in_(replaced_segment_ids),
+                    )
+                )
+            if child_chunks:
+                db.session.execute(
+                    insert(ChildChunk),
+                    [
+                        {
+                            "tenant_id": self._dataset.tenant_id,
+                            "dataset_id": self._dataset.id,
+                            "document_id": self._document_id,
+                            "segment_id": segment_id,
+                            "position": position,
+                            "index_node_id": child.metadata.get("doc_id"),
+                            "index_node_hash": child.metadata.get("doc_hash"),
+                            "content": child.page_content,
+                            "word_count": len(child.page_content),
+                            "type": "automatic",
+                            "created_by": self._user_id,
+                        }
+                        for segment_id, children in child_chunks.items()
+                        for position, child in enumerate(children, start=1)
+                    ],
+                )
             db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return max_position
 
     def document_exists(self, doc_id: str) -> bool:
         """Check if document exists."""
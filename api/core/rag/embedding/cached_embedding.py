@@ -1,8 +1,11 @@
 import base64
 import logging
+import threading
 from typing import Any, Optional, cast
 
 import numpy as np
+from cachetools import LRUCache
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 
 from configs import dify_config
@@ -18,6 +21,12 @@ from models.dataset import Embedding
 
 logger = logging.getLogger(__name__)
 
+# process-local tier of the document embedding cache, values are packed float32 vectors
+_local_cache: Optional[LRUCache] = (
+    LRUCache(maxsize=dify_config.EMBEDDING_CACHE_LOCAL_SIZE) if dify_config.EMBEDDING_CACHE_LOCAL_SIZE > 0 else None
+)
+_local_cache_lock = threading.Lock()
+
 
 class CacheEmbedding(Embeddings):
     def __init__(self, model_instance: ModelInstance, user: Optional[str] = None) -> None:
@@ -28,23 +37,19 @@ class CacheEmbedding(Embeddings):
         """Embed search docs in batches of 10."""
         # use doc embedding cache or store if not exists
         text_embeddings: list[Any] = [None for _ in range(len(texts))]
-        embedding_queue_indices = []
-        for i, text in enumerate(texts):
-            hash = helper.generate_text_hash(text)
-            embedding = (
-                db.session.query(Embedding)
-                .filter_by(
-                    model_name=self._model_instance.model, hash=hash, provider_name=self._model_instance.provider
-                )
-                .first()
-            )
-            if embedding:
-                text_embeddings[i] = embedding.get_embedding()
+        text_hashes = [helper.generate_text_hash(text) for text in texts]
+        cached_embeddings = self._get_cached_embeddings(set(text_hashes))
+
+        # texts sharing the same hash only need to be embedded once
+        embedding_queue: dict[str, list[int]] = {}
+        for i, hash in enumerate(text_hashes):
+            if hash in cached_embeddings:
+                text_embeddings[i] = cached_embeddings[hash]
             else:
-                embedding_queue_indices.append(i)
-        if embedding_queue_indices:
-            embedding_queue_texts = [texts[i] for i in embedding_queue_indices]
-            embedding_queue_embeddings = []
+                embedding_queue.setdefault(hash, []).append(i)
+        if embedding_queue:
+            embedding_queue_hashes = list(embedding_queue.keys())
+            new_embeddings: dict[str, list[float]] = {}
             try:
                 model_type_instance = cast(TextEmbeddingModel, self._model_instance.model_type_instance)
                 model_schema = model_type_instance.get_model_schema(
@@ -55,14 +60,15 @@ class CacheEmbedding(Embeddings):
                     if model_schema and ModelPropertyKey.MAX_CHUNKS in model_schema.model_properties
                     else 1
                 )
-                for i in range(0, len(embedding_queue_texts), max_chunks):
-                    batch_texts = embedding_queue_texts[i : i + max_chunks]
+                for i in range(0, len(embedding_queue_hashes), max_chunks):
+                    batch_hashes = embedding_queue_hashes[i : i + max_chunks]
+                    batch_texts = [texts[embedding_queue[hash][0]] for hash in batch_hashes]
 
                     embedding_result = self._model_instance.invoke_text_embedding(
                         texts=batch_texts, user=self._user, input_type=EmbeddingInputType.DOCUMENT
                     )
 
-                    for vector in embedding_result.embeddings:
+                    for hash, vector in zip(batch_hashes, embedding_result.embeddings):
                         try:
                             # FIXME: type ignore for numpy here
                             normalized_embedding = (vector / np.linalg.norm(vector)).tolist()  # type: ignore
@@ -71,28 +77,14 @@ class CacheEmbedding(Embeddings):
                                 # for issue #11827  float values are not json compliant
                                 logger.warning(f"Normalized embedding is nan: {normalized_embedding}")
                                 continue
-                            embedding_queue_embeddings.append(normalized_embedding)
-                        except IntegrityError:
-                            db.session.rollback()
+                            new_embeddings[hash] = normalized_embedding
                         except Exception:
                             logging.exception("Failed transform embedding")
-                cache_embeddings = []
-                try:
-                    for i, n_embedding in zip(embedding_queue_indices, embedding_queue_embeddings):
+
+                for hash, n_embedding in new_embeddings.items():
+                    for i in embedding_queue[hash]:
                         text_embeddings[i] = n_embedding
-                        hash = helper.generate_text_hash(texts[i])
-                        if hash not in cache_embeddings:
-                            embedding_cache = Embedding(
-                                model_name=self._model_instance.model,
-                                hash=hash,
-                                provider_name=self._model_instance.provider,
-                            )
-                            embedding_cache.set_embedding(n_embedding)
-                            db.session.add(embedding_cache)
-                            cache_embeddings.append(hash)
-                    db.session.commit()
-                except IntegrityError:
-                    db.session.rollback()
+                self._store_embeddings(new_embeddings)
             except Exception as ex:
                 db.session.rollback()
                 logger.exception("Failed to embed documents: %s")
@@ -100,6 +92,111 @@ class CacheEmbedding(Embeddings):
 
         return text_embeddings
 
+    def _cache_key(self, hash: str) -> tuple[str, str, str]:
+        return self._model_instance.provider, self._model_instance.model, hash
+
+    def _redis_cache_key(self, hash: str) -> str:
+        return f"doc_embedding_{self._model_instance.provider}_{self._model_instance.model}_{hash}"
+
+    def _get_cached_embeddings(self, hashes: set[str]) -> dict[str, list[float]]:
+        """
+        Resolve document embeddings from the process-local, Redis and database tiers in order.
+        Hits from a lower tier are promoted to the tiers above it.
+        """
+        found: dict[str, bytes] = {}
+
+        # process-local tier
+        if _local_cache is not None:
+            with _local_cache_lock:
+                for hash in hashes:
+                    packed = _local_cache.get(self._cache_key(hash))
+                    if packed is not None:
+                        found[hash] = packed
+        missing = [hash for hash in hashes if hash not in found]
+
+        # redis tier
+        redis_found: dict[str, bytes] = {}
+        if missing and dify_config.EMBEDDING_CACHE_REDIS_TTL > 0:
+            try:
+                values = redis_client.mget([self._redis_cache_key(hash) for hash in missing])
+                redis_found = {hash: value for hash, value in zip(missing, values) if value}
+            except Exception:
+                logger.exception("Failed to load document embeddings from redis")
+            found.update(redis_found)
+            missing = [hash for hash in missing if hash not in redis_found]
+
+        # database tier, one IN (...) query per batch of hashes
+        db_found: dict[str, bytes] = {}
+        batch_size = dify_config.EMBEDDING_CACHE_DB_BATCH_SIZE
+        for i in range(0, len(missing), batch_size):
+            rows = (
+                db.session.query(Embedding.hash, Embedding.embedding)
+                .filter(
+                    Embedding.model_name == self._model_instance.model,
+                    Embedding.provider_name == self._model_instance.provider,
+                    Embedding.hash.in_(missing[i : i + batch_size]),
+                )
+                .all()
+            )
+            for hash, embedding in rows:
+                # legacy pickled rows are repacked so the upper tiers only ever hold packed vectors
+                db_found[hash] = Embedding.pack_embedding(Embedding.unpack_embedding(embedding))
+        found.update(db_found)
+
+        self._set_local_cache({**redis_found, **db_found})
+        self._set_redis_cache(db_found)
+
+        return {hash: Embedding.unpack_embedding(packed) for hash, packed in found.items()}
+
+    def _store_embeddings(self, embeddings: dict[str, list[float]]) -> None:
+        """Persist newly computed embeddings to every cache tier."""
+        if not embeddings:
+            return
+        packed_embeddings = {hash: Embedding.pack_embedding(embedding) for hash, embedding in embeddings.items()}
+        rows = [
+            {
+                "model_name": self._model_instance.model,
+                "hash": hash,
+                "provider_name": self._model_instance.provider,
+                "embedding": packed,
+            }
+            for hash, packed in packed_embeddings.items()
+        ]
+        batch_size = dify_config.EMBEDDING_CACHE_DB_BATCH_SIZE
+        try:
+            for i in range(0, len(rows), batch_size):
+                stmt = (
+                    insert(Embedding)
+                    .values(rows[i : i + batch_size])
+                    .on_conflict_do_nothing(index_elements=["model_name", "hash", "provider_name"])
+                )
+                db.session.execute(stmt)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+
+        self._set_local_cache(packed_embeddings)
+        self._set_redis_cache(packed_embeddings)
+
+    def _set_local_cache(self, packed_embeddings: dict[str, bytes]) -> None:
+        if _local_cache is None or not packed_embeddings:
+            return
+        with _local_cache_lock:
+            for hash, packed in packed_embeddings.items():
+                _local_cache[self._cache_key(hash)] = packed
+
+    def _set_redis_cache(self, packed_embeddings: dict[str, bytes]) -> None:
+        ttl = dify_config.EMBEDDING_CACHE_REDIS_TTL
+        if ttl <= 0 or not packed_embeddings:
+            return
+        try:
+            with redis_client.pipeline(transaction=False) as pipe:
+                for hash, packed in packed_embeddings.items():
+                    pipe.setex(self._redis_cache_key(hash), ttl, packed)
+                pipe.execute()
+        except Exception:
+            logger.exception("Failed to add document embeddings to redis")
+
     def embed_query(self, text: str) -> list[float]:
         """Embed query text."""
         # use doc embedding cache or store if not exists
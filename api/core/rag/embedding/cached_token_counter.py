@@ -0,0 +1,59 @@
+import threading
+from typing import Optional
+
+from cachetools import LRUCache
+
+from configs import dify_config
+from core.model_manager import ModelInstance
+from libs import helper
+
+# process-local cache of the token counts of texts, keyed by provider, model and text hash
+_local_cache: Optional[LRUCache] = (
+    LRUCache(maxsize=dify_config.EMBEDDING_TOKEN_COUNT_CACHE_SIZE)
+    if dify_config.EMBEDDING_TOKEN_COUNT_CACHE_SIZE > 0
+    else None
+)
+_local_cache_lock = threading.Lock()
+
+
+class CachedTokenCounter:
+    """
+    Counts the tokens of texts with the tokenizer of an embedding model, each distinct text is only sent to the
+    model once, whether it is counted by the splitter, the docstore or the indexing runner.
+    """
+
+    def __init__(self, model_instance: ModelInstance) -> None:
+        self._model_instance = model_instance
+
+    def get_num_tokens(self, texts: list[str]) -> list[int]:
+        if not texts:
+            return []
+        if _local_cache is None:
+            return self._model_instance.get_text_embedding_num_tokens(texts=texts)
+
+        keys = [self._cache_key(helper.generate_text_hash(text)) for text in texts]
+        num_tokens: dict[tuple[str, str, str], int] = {}
+        with _local_cache_lock:
+            for key in keys:
+                cached_num_tokens = _local_cache.get(key)
+                if cached_num_tokens is not None:
+                    num_tokens[key] = cached_num_tokens
+
+        # texts sharing the same hash only need to be counted once
+        missing: dict[tuple[str, str, str], str] = {}
+        for key, text in zip(keys, texts):
+            if key not in num_tokens:
+                missing.setdefault(key, text)
+        if missing:
+            new_num_tokens = dict(
+                zip(missing, self._model_instance.get_text_embedding_num_tokens(texts=list(missing.values())))
+            )
+            with _local_cache_lock:
+                for key, count in new_num_tokens.items():
+                    _local_cache[key] = count
+            num_tokens.update(new_num_tokens)
+
+        return [num_tokens[key] for key in keys]
+
+    def _cache_key(self, hash: str) -> tuple[str, str, str]:
+        return self._model_instance.provider, self._model_instance.model, hash
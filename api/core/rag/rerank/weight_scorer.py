@@ -0,0 +1,139 @@
+import threading
+from collections.abc import Sequence
+from typing import Any, Optional
+
+import numpy as np
+from cachetools import LRUCache
+
+from core.rag.datasource.keyword.jieba.jieba_keyword_table_handler import JiebaKeywordTableHandler
+from core.rag.models.document import Document
+from libs import helper
+
+# keywords extracted from document contents, keyed by content hash
+_document_keywords_cache: LRUCache = LRUCache(maxsize=10000)
+_document_keywords_cache_lock = threading.Lock()
+
+
+def calculate_keyword_scores(query: str, documents: Sequence[Document]) -> list[float]:
+    """
+    Calculate the TF-IDF cosine similarity between the query and every document.
+
+    Documents recalled by keyword search keep the keyword score it ranked them with, which weighs
+    keywords by their idf over the whole dataset rather than over the recalled documents.
+
+    The documents form a sparse document x keyword matrix in coordinate form, the idf of every
+    keyword, the document norms and the dot products with the query are each computed with a
+    single weighted `np.bincount` over the non-zero entries.
+
+    :param query: search query
+    :param documents: documents to score, their extracted keywords are stored on `metadata["keywords"]`
+    :return: one score per document, in order
+    """
+    keyword_table_handler = JiebaKeywordTableHandler()
+    query_keywords = keyword_table_handler.extract_keywords(query, None)
+    documents_keywords = get_documents_keywords(documents, keyword_table_handler)
+    if not documents_keywords:
+        return []
+
+    vocabulary: dict[str, int] = {}
+    rows: list[int] = []
+    cols: list[int] = []
+    for row, document_keywords in enumerate(documents_keywords):
+        for keyword in document_keywords:
+            rows.append(row)
+            cols.append(vocabulary.setdefault(keyword, len(vocabulary)))
+
+    total_documents = len(documents)
+    if not vocabulary:
+        return _with_keyword_search_scores(documents, [0.0] * len(documents_keywords))
+
+    row_index = np.asarray(rows, dtype=np.int64)
+    col_index = np.asarray(cols, dtype=np.int64)
+
+    # keywords are sets, so every term frequency is 1 and a document's tf-idf weight is the idf
+    document_frequency = np.bincount(col_index, minlength=len(vocabulary))
+    idf = np.log((1 + total_documents) / (1 + document_frequency)) + 1
+    weights = idf[col_index]
+    document_norms = np.sqrt(np.bincount(row_index, weights=weights**2, minlength=len(documents_keywords)))
+
+    # query keywords that appear in no document have an idf of 0 and do not contribute
+    query_vector = np.zeros(len(vocabulary))
+    for keyword in query_keywords:
+        index = vocabulary.get(keyword)
+        if index is not None:
+            query_vector[index] = idf[index]
+    query_norm = np.linalg.norm(query_vector)
+
+    dot_products = np.bincount(row_index, weights=weights * query_vector[col_index], minlength=len(documents_keywords))
+    denominators = document_norms * query_norm
+    similarities: list[float] = np.divide(
+        dot_products, denominators, out=np.zeros_like(dot_products), where=denominators != 0
+    ).tolist()
+
+    return _with_keyword_search_scores(documents, similarities)
+
+
+def _with_keyword_search_scores(documents: Sequence[Document], similarities: list[float]) -> list[float]:
+    # similarities are in the order of the documents with metadata
+    documents_with_metadata = [document for document in documents if document.metadata is not None]
+    for i, document in enumerate(documents_with_metadata):
+        if document.metadata and "keyword_score" in document.metadata:
+            similarities[i] = document.metadata["keyword_score"]
+    return similarities
+
+
+def calculate_vector_scores(query_vector: Sequence[float], documents: Sequence[Document]) -> list[float]:
+    """
+    Calculate the cosine similarity between the query vector and every document.
+
+    Documents that already carry a score from the vector store keep it, documents without a vector
+    score 0, the remaining document vectors are scored with one matrix-vector product.
+    """
+    scores: list[Any] = [None] * len(documents)
+    vector_indices = []
+    vectors = []
+    for i, document in enumerate(documents):
+        if document.metadata and "score" in document.metadata:
+            scores[i] = document.metadata["score"]
+        elif document.vector is None:
+            scores[i] = 0.0
+        else:
+            vector_indices.append(i)
+            vectors.append(document.vector)
+
+    if vectors:
+        query = np.asarray(query_vector, dtype=np.float64)
+        matrix = np.asarray(vectors, dtype=np.float64)
+        cosine_similarities = (matrix @ query) / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+        for i, similarity in zip(vector_indices, cosine_similarities.tolist()):
+            scores[i] = similarity
+
+    return scores
+
+
+def get_documents_keywords(
+    documents: Sequence[Document], keyword_table_handler: Optional[JiebaKeywordTableHandler] = None
+) -> list[set[str]]:
+    """
+    Extract the keywords of every document with metadata and store them on `metadata["keywords"]`.
+
+    All keywords of the content are extracted, as the scores depend on them. The keywords stored on
+    segments are capped at the top keywords and cannot be used instead. Extractions are cached by
+    content hash, so documents recalled again skip jieba.
+    """
+    documents_keywords = []
+    for document in documents:
+        if document.metadata is None:
+            continue
+        text_hash = helper.generate_text_hash(document.page_content)
+        with _document_keywords_cache_lock:
+            keywords = _document_keywords_cache.get(text_hash)
+        if keywords is None:
+            keyword_table_handler = keyword_table_handler or JiebaKeywordTableHandler()
+            keywords = frozenset(keyword_table_handler.extract_keywords(document.page_content, None))
+            with _document_keywords_cache_lock:
+                _document_keywords_cache[text_hash] = keywords
+        document.metadata["keywords"] = set(keywords)
+        documents_keywords.append(set(keywords))
+
+    return documents_keywords
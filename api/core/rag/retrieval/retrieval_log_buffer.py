@@ -0,0 +1,221 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from collections.abc import Sequence
+from datetime import UTC, datetime
+from typing import Any, Optional
+
+from flask import Flask, current_app
+from sqlalchemy import Integer, String, cast, column, insert, select, update, values
+from sqlalchemy.orm import Session
+
+from configs import dify_config
+from core.rag.index_processor.constant.index_type import IndexType
+from core.rag.models.document import Document
+from extensions.ext_database import db
+from models.dataset import ChildChunk, DatasetQuery, DocumentSegment
+from models.dataset import Document as DatasetDocument
+from models.types import StringUUID
+
+logger = logging.getLogger(__name__)
+
+# consecutive failed flushes after which the buffered hits and queries are dropped
+MAX_FLUSH_ATTEMPTS = 3
+
+
+class RetrievalLogBuffer:
+    """
+    Buffers the hit counts of retrieved segments and the dataset queries of a process, off the request path.
+
+    Buffered hits are aggregated per segment and written by a background thread with one
+    UPDATE ... FROM (VALUES ...) per flush, buffered queries with one multi-row INSERT. What a failed
+    flush could not write is buffered again, until `MAX_FLUSH_ATTEMPTS` flushes in a row have failed.
+    """
+
+    # hits keyed by (document id, dataset id, index node id)
+    _hits: Counter[tuple[str, Optional[str], str]] = Counter()
+    _queries: list[dict[str, Any]] = []
+    _lock = threading.Lock()
+    _flusher: Optional[threading.Thread] = None
+    _failed_flushes = 0
+
+    @classmethod
+    def add_hits(cls, documents: Sequence[Document]) -> None:
+        hits: Counter[tuple[str, Optional[str], str]] = Counter()
+        for document in documents:
+            if document.provider != "dify" or document.metadata is None:
+                continue
+            metadata = document.metadata
+            hits[(metadata["document_id"], metadata.get("dataset_id"), metadata["doc_id"])] += 1
+        if not hits:
+            return
+
+        with cls._lock:
+            cls._hits.update(hits)
+        cls._flush_later()
+
+    @classmethod
+    def add_queries(
+        cls,
+        query: str,
+        dataset_ids: Sequence[str],
+        source_app_id: Optional[str],
+        created_by_role: str,
+        created_by: str,
+        source: str = "app",
+    ) -> None:
+        if not query or not dataset_ids:
+            return
+
+        # the rows are inserted later, so they are timestamped now
+        created_at = datetime.now(UTC).replace(tzinfo=None)
+        with cls._lock:
+            cls._queries.extend(
+                {
+                    "dataset_id": dataset_id,
+                    "content": query,
+                    "source": source,
+                    "source_app_id": source_app_id,
+                    "created_by_role": created_by_role,
+                    "created_by": created_by,
+                    "created_at": created_at,
+                }
+                for dataset_id in dataset_ids
+            )
+        cls._flush_later()
+
+    @classmethod
+    def flush(cls) -> None:
+        """
+        Write the buffered hits and queries, must be called within an app context.
+        """
+        with cls._lock:
+            hits, cls._hits = cls._hits, Counter()
+            queries, cls._queries = cls._queries, []
+        if not hits and not queries:
+            return
+
+        try:
+            with Session(db.engine) as session:
+                if queries:
+                    session.execute(insert(DatasetQuery), queries)
+                segment_hits = cls._get_segment_hits(session, hits) if hits else {}
+                if segment_hits:
+                    # the rows are locked in id order first, postgres locks the rows of an UPDATE ... FROM in
+                    # no particular order, so concurrent flushes of other processes could deadlock otherwise
+                    session.execute(
+                        select(DocumentSegment.id)
+                        .where(DocumentSegment.id.in_(segment_hits))
+                        .order_by(DocumentSegment.id)
+                        .with_for_update()
+                    )
+                    hit_counts = values(
+                        column("segment_id", String), column("hit_count", Integer), name="hit_counts"
+                    ).data(list(segment_hits.items()))
+                    session.execute(
+                        update(DocumentSegment)
+                        .where(DocumentSegment.id == cast(hit_counts.c.segment_id, StringUUID))
+                        .values(hit_count=DocumentSegment.hit_count + hit_counts.c.hit_count)
+                        .execution_options(synchronize_session=False)
+                    )
+                session.commit()
+        except Exception:
+            with cls._lock:
+                cls._failed_flushes += 1
+                if cls._failed_flushes < MAX_FLUSH_ATTEMPTS:
+                    # the next flush retries them along with what was buffered meanwhile
+                    cls._hits.update(hits)
+                    cls._queries[:0] = queries
+                    dropped = False
+                else:
+                    cls._failed_flushes = 0
+                    dropped = True
+            if dropped:
+                logger.exception(
+                    f"Failed to write {sum(hits.values())} segment hits and {len(queries)} dataset queries"
+                    f" {MAX_FLUSH_ATTEMPTS} times, dropping them"
+                )
+            else:
+                logger.exception("Failed to write segment hits and dataset queries, retrying with the next flush")
+        else:
+            with cls._lock:
+                cls._failed_flushes = 0
+
+    @classmethod
+    def _get_segment_hits(cls, session: Session, hits: Counter[tuple[str, Optional[str], str]]) -> dict[str, int]:
+        doc_forms: dict[str, str] = {}
+        documents = session.execute(
+            select(DatasetDocument.id, DatasetDocument.doc_form).where(
+                DatasetDocument.id.in_({document_id for document_id, _, _ in hits})
+            )
+        )
+        for document_id, doc_form in documents:
+            doc_forms[document_id] = doc_form
+
+        # hits of parent-child documents are on child chunks and count for their parent segments
+        child_chunk_hits: Counter[tuple[str, str]] = Counter()
+        index_node_hits: Counter[tuple[Optional[str], str]] = Counter()
+        for (document_id, dataset_id, index_node_id), count in hits.items():
+            doc_form = doc_forms.get(document_id)
+            if doc_form is None:
+                continue
+            if doc_form == IndexType.PARENT_CHILD_INDEX:
+                child_chunk_hits[(document_id, index_node_id)] += count
+            else:
+                index_node_hits[(dataset_id, index_node_id)] += count
+
+        segment_hits: Counter[str] = Counter()
+        if child_chunk_hits:
+            child_chunks = session.execute(
+                select(ChildChunk.document_id, ChildChunk.index_node_id, ChildChunk.segment_id).where(
+                    ChildChunk.document_id.in_({document_id for document_id, _ in child_chunk_hits}),
+                    ChildChunk.index_node_id.in_({index_node_id for _, index_node_id in child_chunk_hits}),
+                )
+            )
+            for document_id, index_node_id, segment_id in child_chunks:
+                count = child_chunk_hits.pop((document_id, index_node_id), 0)
+                if count:
+                    segment_hits[segment_id] += count
+
+        if index_node_hits:
+            segments = session.execute(
+                select(DocumentSegment.id, DocumentSegment.dataset_id, DocumentSegment.index_node_id).where(
+                    DocumentSegment.index_node_id.in_({index_node_id for _, index_node_id in index_node_hits})
+                )
+            )
+            for segment_id, dataset_id, index_node_id in segments:
+                # hits without a dataset count for every segment of the index node, as they always have
+                count = index_node_hits[(dataset_id, index_node_id)] + index_node_hits[(None, index_node_id)]
+                if count:
+                    segment_hits[segment_id] += count
+
+        return segment_hits
+
+    @classmethod
+    def _flush_later(cls) -> None:
+        if not dify_config.DATASET_RETRIEVAL_LOG_FLUSH_INTERVAL:
+            cls.flush()
+            return
+
+        with cls._lock:
+            if cls._flusher is not None and cls._flusher.is_alive():
+                return
+            flask_app = current_app._get_current_object()  # type: ignore
+            if cls._flusher is None:
+                # what is buffered when the process exits is still written
+                atexit.register(cls._flush_in_app_context, flask_app)
+            cls._flusher = threading.Thread(target=cls._run_flusher, kwargs={"flask_app": flask_app}, daemon=True)
+            cls._flusher.start()
+
+    @classmethod
+    def _run_flusher(cls, flask_app: Flask) -> None:
+        while True:
+            time.sleep(dify_config.DATASET_RETRIEVAL_LOG_FLUSH_INTERVAL)
+            cls._flush_in_app_context(flask_app)
+
+    @classmethod
+    def _flush_in_app_context(cls, flask_app: Flask) -> None:
+        with flask_app.app_context():
+            cls.flush()
@@ -6,6 +6,7 @@ from typing import Any, Optional
 
 from core.model_manager import ModelInstance
 from core.model_runtime.model_providers.__base.tokenizers.gpt2_tokenzier import GPT2Tokenizer
+from core.rag.embedding.cached_token_counter import CachedTokenCounter
 from core.rag.splitter.text_splitter import (
     TS,
     Collection,
@@ -35,7 +36,7 @@ class EnhanceRecursiveCharacterTextSplitter(RecursiveCharacterTextSplitter):
                 return []
 
             if embedding_model_instance:
-                return embedding_model_instance.get_text_embedding_num_tokens(texts=texts)
+                return CachedTokenCounter(embedding_model_instance).get_num_tokens(texts)
             else:
                 return [GPT2Tokenizer.get_num_tokens(text) for text in texts]
 
@@ -325,6 +325,11 @@ class ToolEntity(BaseModel):
     description: Optional[ToolDescription] = None
     output_schema: Optional[dict] = None
     has_runtime_parameters: bool = Field(default=False, description="Whether the tool has runtime parameters")
+    run_serially: Optional[bool] = Field(
+        default=None,
+        description="Whether the tool must not be invoked concurrently with other tool calls, "
+        "tools that do not declare it are only invoked concurrently when they are builtin or api tools",
+    )
 
     # pydantic configs
     model_config = ConfigDict(protected_namespaces=())
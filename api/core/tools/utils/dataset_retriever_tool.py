@@ -75,6 +75,8 @@ class DatasetRetrieverTool(Tool):
                     ),
                     parameters=[],
                     description=ToolDescription(human=I18nObject(en_US="", zh_Hans=""), llm=retrieval_tool.description),
+                    # retrievers record their resources on the shared retrieval callbacks
+                    run_serially=True,
                 ),
                 runtime=ToolRuntime(tenant_id=tenant_id),
             )
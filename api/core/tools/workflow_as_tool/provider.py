@@ -164,6 +164,8 @@ class WorkflowToolProviderController(ToolProviderController):
                     llm=db_provider.description,
                 ),
                 parameters=workflow_tool_parameters,
+                # a workflow may write to the same resources as other tools, keep the call order
+                run_serially=True,
             ),
             runtime=ToolRuntime(
                 tenant_id=db_provider.tenant_id,
@@ -1,9 +1,10 @@
 import re
 from collections import defaultdict
 from collections.abc import Mapping, Sequence
-from typing import Any, Union
+from functools import lru_cache
+from typing import Any, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 from core.file import File, FileAttribute, file_manager
 from core.variables import Segment, SegmentGroup, Variable
@@ -18,6 +19,22 @@ VariableValue = Union[str, int, float, dict, list, File]
 
 VARIABLE_PATTERN = re.compile(r"\{\{#([a-zA-Z0-9_]{1,50}(?:\.[a-zA-Z_][a-zA-Z0-9_]{0,29}){1,10})#\}\}")
 
+FILE_ATTRIBUTE_VALUES = frozenset(item.value for item in FileAttribute)
+
+
+@lru_cache(maxsize=1024)
+def _parse_template(template: str) -> tuple[tuple[Segment, Optional[tuple[str, ...]]], ...]:
+    """
+    Split a template into its parts once, each part is paired with the selector it may refer to.
+    The literal segment of every part is prebuilt, segments are immutable so they can be shared.
+    """
+    parts = VARIABLE_PATTERN.split(template)
+    return tuple(
+        (variable_factory.build_segment(part), tuple(part.split(".")) if "." in part else None)
+        for part in parts
+        if part
+    )
+
 
 class VariablePool(BaseModel):
     # Variable dictionary is a dictionary for looking up variables by their selector.
@@ -43,6 +60,9 @@ class VariablePool(BaseModel):
         description="Conversation variables.",
         default_factory=list,
     )
+    # Node ids whose variable mapping is shared with another pool created by `create_copy`,
+    # the mapping is copied before the first write to it.
+    _copy_on_write_node_ids: set[str] = PrivateAttr(default_factory=set)
 
     def __init__(
         self,
@@ -104,7 +124,7 @@ class VariablePool(BaseModel):
             variable = variable_factory.segment_to_variable(segment=segment, selector=selector)
 
         hash_key = hash(tuple(selector[1:]))
-        self.variable_dictionary[selector[0]][hash_key] = variable
+        self._get_writable_variables(selector[0])[hash_key] = variable
 
     def get(self, selector: Sequence[str], /) -> Segment | None:
         """
@@ -128,7 +148,7 @@ class VariablePool(BaseModel):
         if value is None:
             selector, attr = selector[:-1], selector[-1]
             # Python support `attr in FileAttribute` after 3.12
-            if attr not in {item.value for item in FileAttribute}:
+            if attr not in FILE_ATTRIBUTE_VALUES:
                 return None
             value = self.get(selector)
             if not isinstance(value, (FileSegment, NoneSegment)):
@@ -155,18 +175,42 @@ class VariablePool(BaseModel):
             return
         if len(selector) == 1:
             self.variable_dictionary[selector[0]] = {}
+            self._copy_on_write_node_ids.discard(selector[0])
             return
         hash_key = hash(tuple(selector[1:]))
-        self.variable_dictionary[selector[0]].pop(hash_key, None)
+        self._get_writable_variables(selector[0]).pop(hash_key, None)
+
+    def create_copy(self) -> "VariablePool":
+        """
+        Create a copy of the variable pool that shares structure with this one.
+
+        The per-node variable mappings are shared until either pool writes to a node, which then
+        copies only that node's mapping. Segments are immutable and are never copied.
+
+        Returns:
+            VariablePool: The new variable pool.
+        """
+        node_ids = set(self.variable_dictionary)
+        self._copy_on_write_node_ids.update(node_ids)
+
+        new_pool = self.model_copy()
+        new_pool.variable_dictionary = defaultdict(dict, self.variable_dictionary)
+        new_pool._copy_on_write_node_ids = node_ids
+        return new_pool
+
+    def _get_writable_variables(self, node_id: str) -> dict[int, Segment]:
+        if node_id in self._copy_on_write_node_ids:
+            self._copy_on_write_node_ids.discard(node_id)
+            self.variable_dictionary[node_id] = dict(self.variable_dictionary[node_id])
+        return self.variable_dictionary[node_id]
 
     def convert_template(self, template: str, /):
-        parts = VARIABLE_PATTERN.split(template)
         segments = []
-        for part in filter(lambda x: x, parts):
-            if "." in part and (variable := self.get(part.split("."))):
+        for segment, selector in _parse_template(template):
+            if selector and (variable := self.get(selector)):
                 segments.append(variable)
             else:
-                segments.append(variable_factory.build_segment(part))
+                segments.append(segment)
         return SegmentGroup(value=segments)
 
     def get_file(self, selector: Sequence[str], /) -> FileSegment | None:
@@ -25,3 +25,6 @@ class GraphRuntimeState(BaseModel):
 
     node_run_state: RuntimeRouteState = RuntimeRouteState()
     """node run state"""
+
+    code_node_batches: dict[str, Any] = {}
+    """batched results of code nodes inside an iteration (node id: CodeNodeBatch), shared by copies of the state"""
@@ -0,0 +1,55 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+from typing import Any
+
+from configs import dify_config
+from core.workflow.graph_engine.entities.graph import Graph
+from models.workflow import Workflow
+
+
+class WorkflowGraphCache:
+    """
+    Process-local LRU of parsed workflow graph configs and the graphs compiled from them, including their
+    parallels and answer / end stream routes.
+
+    Entries are keyed by workflow id, version and a hash of the graph, so an edited draft never gets a stale
+    graph. Cached configs and graphs are shared by every run of the workflow and must not be modified.
+    """
+
+    _entries: OrderedDict[tuple[str, str, str], tuple[Mapping[str, Any], Graph]] = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_or_init(
+        cls, workflow: Workflow, init_graph: Callable[[Mapping[str, Any]], Graph] = Graph.init
+    ) -> tuple[Mapping[str, Any], Graph]:
+        """
+        Get the graph config and the graph of a workflow, compiling them the first time
+        :param workflow: workflow
+        :param init_graph: compiles the graph config, e.g. validating it first
+        :return: graph config, graph
+        """
+        if not dify_config.WORKFLOW_GRAPH_CACHE_SIZE:
+            uncached_graph_config = workflow.graph_dict
+            return uncached_graph_config, init_graph(uncached_graph_config)
+
+        graph = workflow.graph or ""
+        key = (workflow.id, workflow.version, hashlib.sha256(graph.encode("utf-8")).hexdigest())
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is not None:
+                cls._entries.move_to_end(key)
+                return entry
+
+        # compile outside the lock, concurrent first runs of a workflow may both compile it
+        graph_config: Mapping[str, Any] = json.loads(graph) if graph else {}
+        entry = (graph_config, init_graph(graph_config))
+        with cls._lock:
+            cls._entries[key] = entry
+            cls._entries.move_to_end(key)
+            while len(cls._entries) > dify_config.WORKFLOW_GRAPH_CACHE_SIZE:
+                cls._entries.popitem(last=False)
+        return entry
@@ -1,11 +1,13 @@
 import contextvars
 import logging
 import queue
+import threading
 import time
 import uuid
-from collections.abc import Generator, Mapping
-from concurrent.futures import ThreadPoolExecutor, wait
-from copy import copy, deepcopy
+from collections import deque
+from collections.abc import Callable, Generator, Mapping
+from concurrent.futures import Future, wait
+from copy import copy
 from datetime import UTC, datetime
 from typing import Any, Optional, cast
 
@@ -41,6 +43,7 @@ from core.workflow.graph_engine.entities.graph import Graph, GraphEdge
 from core.workflow.graph_engine.entities.graph_init_params import GraphInitParams
 from core.workflow.graph_engine.entities.graph_runtime_state import GraphRuntimeState
 from core.workflow.graph_engine.entities.runtime_route_state import RouteNodeState
+from core.workflow.graph_engine.workflow_executor import get_scope_weight, get_workflow_executor
 from core.workflow.nodes import NodeType
 from core.workflow.nodes.agent.agent_node import AgentNode
 from core.workflow.nodes.agent.entities import AgentNodeData
@@ -59,32 +62,93 @@ from models.workflow import WorkflowNodeExecutionStatus, WorkflowType
 logger = logging.getLogger(__name__)
 
 
-class GraphEngineThreadPool(ThreadPoolExecutor):
+class GraphEngineThreadPool:
+    """
+    Per-run handle on the process-wide workflow executor.
+
+    It caps how many tasks of the run are in flight at once (`max_workers`) and how many may be
+    outstanding in total (`max_submit_count`), and tags the work with the scope the executor
+    schedules fairly across, usually the tenant id. `stop_event` is set once the run ends or is
+    stopped, so its tasks can cut their waits short.
+    """
+
     def __init__(
         self,
-        max_workers=None,
-        thread_name_prefix="",
-        initializer=None,
-        initargs=(),
-        max_submit_count=dify_config.MAX_SUBMIT_COUNT,
+        max_workers: int = 10,
+        max_submit_count: int = dify_config.MAX_SUBMIT_COUNT,
+        scope: str = "",
+        weight: int = 1,
     ) -> None:
-        super().__init__(max_workers, thread_name_prefix, initializer, initargs)
+        self.max_workers = max_workers
         self.max_submit_count = max_submit_count
+        self.scope = scope
+        self.weight = weight
         self.submit_count = 0
-
-    def submit(self, fn, /, *args, **kwargs):
-        self.submit_count += 1
-        self.check_is_full()
-
-        return super().submit(fn, *args, **kwargs)
+        self._lock = threading.Lock()
+        self._running_count = 0
+        self._pending: deque[tuple[Future, Callable[..., Any], tuple, dict]] = deque()
+        self.stop_event = threading.Event()
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        with self._lock:
+            self.submit_count += 1
+            self.check_is_full()
+            # counted against the process-wide budget new runs are admitted on until the task finishes
+            get_workflow_executor().reserve()
+
+            future: Future = Future()
+            if self._running_count >= self.max_workers:
+                self._pending.append((future, fn, args, kwargs))
+                return future
+            self._running_count += 1
+
+        self._dispatch(future, fn, args, kwargs)
+        return future
 
     def task_done_callback(self, future):
-        self.submit_count -= 1
+        with self._lock:
+            self.submit_count -= 1
 
     def check_is_full(self) -> None:
         if self.submit_count > self.max_submit_count:
             raise ValueError(f"Max submit count {self.max_submit_count} of workflow thread pool reached.")
 
+    def _dispatch(
+        self, future: Future, fn: Callable[..., Any], args: tuple, kwargs: dict, handover: bool = False
+    ) -> None:
+        get_workflow_executor().submit(
+            self._run,
+            future,
+            fn,
+            args,
+            kwargs,
+            scope=self.scope,
+            weight=self.weight,
+            # work handed over by a finished task is not waited on by it, it queues under the run's scope
+            # like any other work of the run instead of jumping ahead as nested work
+            allow_inline=not handover,
+            nested=False if handover else None,
+        )
+
+    def _run(self, future: Future, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            get_workflow_executor().release()
+            with self._lock:
+                next_task = self._pending.popleft() if self._pending else None
+                if next_task is None:
+                    self._running_count -= 1
+            if next_task is not None:
+                # hand the slot over to the next pending task, this worker is about to become idle
+                self._dispatch(*next_task, handover=True)
+
 
 class GraphEngine:
     workflow_thread_pool_mapping: dict[str, GraphEngineThreadPool] = {}
@@ -119,7 +183,10 @@ class GraphEngine:
             self.is_main_thread_pool = False
         else:
             self.thread_pool = GraphEngineThreadPool(
-                max_workers=thread_pool_max_workers, max_submit_count=thread_pool_max_submit_count
+                max_workers=thread_pool_max_workers,
+                max_submit_count=thread_pool_max_submit_count,
+                scope=tenant_id,
+                weight=get_scope_weight(tenant_id, app_id),
             )
             self.thread_pool_id = str(uuid.uuid4())
             self.is_main_thread_pool = True
@@ -150,6 +217,10 @@ class GraphEngine:
         stream_processor: StreamProcessor
 
         try:
+            if self.is_main_thread_pool:
+                # wait for the process-wide task budget before the run submits its first task
+                get_workflow_executor().admit_run()
+
             if self.init_params.workflow_type == WorkflowType.CHAT:
                 stream_processor = AnswerStreamProcessor(
                     graph=self.graph, variable_pool=self.graph_runtime_state.variable_pool
@@ -206,20 +277,28 @@ class GraphEngine:
             else:
                 # trigger graph run success event
                 yield GraphRunSucceededEvent(outputs=self.graph_runtime_state.outputs)
-            self._release_thread()
         except GraphRunFailedError as e:
             yield GraphRunFailedEvent(error=e.error, exceptions_count=len(handle_exceptions))
-            self._release_thread()
             return
         except Exception as e:
             logger.exception("Unknown Error when graph running")
             yield GraphRunFailedEvent(error=str(e), exceptions_count=len(handle_exceptions))
-            self._release_thread()
             raise e
+        finally:
+            # also runs on early returns and when the consumer closes the generator
+            self._release_thread()
 
     def _release_thread(self):
-        if self.is_main_thread_pool and self.thread_pool_id in GraphEngine.workflow_thread_pool_mapping:
-            del GraphEngine.workflow_thread_pool_mapping[self.thread_pool_id]
+        if self.is_main_thread_pool:
+            # wakes up the tasks of the run still waiting, e.g. between retries
+            self.thread_pool.stop_event.set()
+            GraphEngine.workflow_thread_pool_mapping.pop(self.thread_pool_id, None)
+
+    @staticmethod
+    def get_stop_event(thread_pool_id: Optional[str]) -> Optional[threading.Event]:
+        """Event set when the run owning the thread pool ends or is stopped."""
+        thread_pool = GraphEngine.workflow_thread_pool_mapping.get(thread_pool_id) if thread_pool_id else None
+        return thread_pool.stop_event if thread_pool else None
 
     def _run(
         self,
@@ -687,7 +766,8 @@ class GraphEngine:
                                         retry_index=retries,
                                         start_at=retry_start_at,
                                     )
-                                    time.sleep(retry_interval)
+                                    if self.thread_pool.stop_event.wait(retry_interval):
+                                        raise GenerateTaskStoppedError()
                                     break
                             route_node_state.set_finished(run_result=run_result)
 
@@ -877,7 +957,7 @@ class GraphEngine:
         """
         new_instance = copy(self)
         new_instance.graph_runtime_state = copy(self.graph_runtime_state)
-        new_instance.graph_runtime_state.variable_pool = deepcopy(self.graph_runtime_state.variable_pool)
+        new_instance.graph_runtime_state.variable_pool = self.graph_runtime_state.variable_pool.create_copy()
         return new_instance
 
     def _handle_continue_on_error(
@@ -0,0 +1,335 @@
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from configs import dify_config
+
+logger = logging.getLogger(__name__)
+
+# upper bounds in seconds of the queue wait time histogram buckets, the last bucket is unbounded
+WAIT_TIME_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+class WorkflowExecutorFullError(Exception):
+    """Raised when a workflow run is not admitted before the admission timeout."""
+
+
+@dataclass
+class _WorkItem:
+    future: Future
+    fn: Callable[..., Any]
+    args: tuple
+    kwargs: dict
+    scope: str = ""
+    submitted_at: float = field(default_factory=time.perf_counter)
+
+    def run(self) -> None:
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+
+class WorkflowExecutor:
+    """
+    Process-wide bounded executor shared by every workflow run.
+
+    Work is queued per scope (usually a tenant) and dispatched round-robin across scopes, each
+    scope taking up to `weight` items per turn, so one busy tenant cannot starve the others.
+
+    Work submitted from inside a worker thread, e.g. an iteration running inside a parallel
+    branch, is nested work: it is dispatched before any top-level work, and it is run inline by
+    the submitting thread when no idle worker is left to pick it up, so parent tasks waiting on
+    their children do not leave the children sitting behind them in the queue.
+
+    Runs are admitted against a process-wide budget of outstanding tasks (`max_submit_count`):
+    while the budget is used up, new runs wait for it in `admit_run` and are rejected after
+    `admission_timeout` seconds. Runs already admitted keep submitting, so they can finish.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        thread_name_prefix: str = "workflow_executor",
+        max_submit_count: int = 0,
+        admission_timeout: float = 0,
+        stats_log_interval: float = 0,
+    ):
+        self._max_workers = max_workers
+        self._max_submit_count = max_submit_count
+        self._admission_timeout = admission_timeout
+        self._stats_log_interval = stats_log_interval
+        self._thread_name_prefix = thread_name_prefix
+        self._lock = threading.Lock()
+        self._work_available = threading.Condition(self._lock)
+        self._threads: set[threading.Thread] = set()
+        self._idle_workers = 0
+        self._local = threading.local()
+
+        self._nested_queue: deque[_WorkItem] = deque()
+        self._scope_queues: dict[str, deque[_WorkItem]] = {}
+        self._scope_weights: dict[str, int] = {}
+        # scopes with queued work in round-robin order, the head scope is served next
+        self._scope_rotation: deque[str] = deque()
+        self._scope_credits: dict[str, int] = {}
+
+        self._queued_count = 0
+
+        # tasks reserved by graph engine thread pools and not finished yet, queued or running
+        self._outstanding_count = 0
+        self._budget_available = threading.Condition(self._lock)
+        self._waiting_runs = 0
+        self._rejected_runs = 0
+
+        self._scope_in_flight: dict[str, int] = {}
+        self._completed_count = 0
+        self._inline_count = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._wait_time_buckets = [0] * (len(WAIT_TIME_BUCKETS) + 1)
+        self._stats_logged_at = time.perf_counter()
+
+    def admit_run(self) -> None:
+        """
+        Wait until the outstanding tasks of every run fit the budget before a new run starts.
+
+        :raises WorkflowExecutorFullError: if the budget is still used up after the admission timeout
+        """
+        if not self._max_submit_count:
+            return
+
+        with self._lock:
+            if self._outstanding_count < self._max_submit_count:
+                return
+            self._waiting_runs += 1
+            try:
+                admitted = self._budget_available.wait_for(
+                    lambda: self._outstanding_count < self._max_submit_count, timeout=self._admission_timeout
+                )
+            finally:
+                self._waiting_runs -= 1
+            if not admitted:
+                self._rejected_runs += 1
+                raise WorkflowExecutorFullError(
+                    f"Workflow executor is busy, {self._outstanding_count} tasks are outstanding."
+                )
+
+    def reserve(self) -> None:
+        """Count a task of an admitted run against the budget until `release` is called."""
+        with self._lock:
+            self._outstanding_count += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._outstanding_count -= 1
+            if self._waiting_runs and self._outstanding_count < self._max_submit_count:
+                self._budget_available.notify()
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        /,
+        *args: Any,
+        scope: str = "",
+        weight: int = 1,
+        allow_inline: bool = True,
+        nested: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> Future:
+        """
+        Submit work on behalf of a scope.
+
+        :param scope: fairness key, usually the tenant id
+        :param weight: number of items the scope may take per round-robin turn
+        :param allow_inline: whether nested work may run inline when no worker is idle
+        :param nested: whether the work is nested work, defaults to whether it is submitted from a worker thread.
+            Work a worker merely hands over to, rather than waits on, is not nested and queues under its scope.
+        """
+        is_nested = self.in_worker_thread() if nested is None else nested
+        item = _WorkItem(future=Future(), fn=fn, args=args, kwargs=kwargs, scope=scope)
+        with self._lock:
+            if is_nested:
+                if allow_inline and self._idle_workers <= len(self._nested_queue) and not self._can_spawn_worker():
+                    self._inline_count += 1
+                    run_inline = True
+                else:
+                    self._nested_queue.append(item)
+                    run_inline = False
+            else:
+                queue = self._scope_queues.get(scope)
+                if queue is None:
+                    queue = self._scope_queues[scope] = deque()
+                if not queue:
+                    self._scope_rotation.append(scope)
+                    self._scope_credits[scope] = weight
+                self._scope_weights[scope] = weight
+                queue.append(item)
+                run_inline = False
+
+            if not run_inline:
+                self._queued_count += 1
+                if self._idle_workers <= self._queued_count - 1 and self._can_spawn_worker():
+                    self._spawn_worker()
+                self._work_available.notify()
+
+        if run_inline:
+            item.run()
+        return item.future
+
+    def in_worker_thread(self) -> bool:
+        return getattr(self._local, "is_worker", False)
+
+    def get_stats(self) -> dict[str, Any]:
+        """Queue depth, in-flight tasks and queue wait time of the executor, in total and per scope."""
+        with self._lock:
+            scopes: dict[str, dict[str, int]] = {}
+            for scope, queue in self._scope_queues.items():
+                scopes.setdefault(scope, {"queue_depth": 0, "in_flight": 0})["queue_depth"] = len(queue)
+            for scope, in_flight in self._scope_in_flight.items():
+                scopes.setdefault(scope, {"queue_depth": 0, "in_flight": 0})["in_flight"] = in_flight
+
+            completed = self._completed_count
+            bucket_bounds = [str(bound) for bound in WAIT_TIME_BUCKETS] + ["+Inf"]
+            return {
+                "max_workers": self._max_workers,
+                "workers": len(self._threads),
+                "idle_workers": self._idle_workers,
+                "queue_depth": self._queued_count,
+                "nested_queue_depth": len(self._nested_queue),
+                "outstanding": self._outstanding_count,
+                "max_submit_count": self._max_submit_count,
+                "waiting_runs": self._waiting_runs,
+                "rejected_runs": self._rejected_runs,
+                "completed": completed,
+                "inline_runs": self._inline_count,
+                "avg_wait_time": self._total_wait_time / completed if completed else 0.0,
+                "max_wait_time": self._max_wait_time,
+                "wait_time_buckets": dict(zip(bucket_bounds, self._wait_time_buckets)),
+                "scopes": scopes,
+            }
+
+    def _record_start(self, item: _WorkItem) -> None:
+        wait_time = time.perf_counter() - item.submitted_at
+        self._total_wait_time += wait_time
+        self._max_wait_time = max(self._max_wait_time, wait_time)
+        self._wait_time_buckets[bisect.bisect_left(WAIT_TIME_BUCKETS, wait_time)] += 1
+        self._scope_in_flight[item.scope] = self._scope_in_flight.get(item.scope, 0) + 1
+
+    def _record_finish(self, item: _WorkItem) -> None:
+        self._completed_count += 1
+        in_flight = self._scope_in_flight[item.scope] - 1
+        if in_flight:
+            self._scope_in_flight[item.scope] = in_flight
+        else:
+            del self._scope_in_flight[item.scope]
+
+    def _log_stats(self) -> None:
+        if not self._stats_log_interval:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            if now - self._stats_logged_at < self._stats_log_interval:
+                return
+            self._stats_logged_at = now
+        logger.info("Workflow executor stats: %s", self.get_stats())
+
+    def _can_spawn_worker(self) -> bool:
+        return len(self._threads) < self._max_workers
+
+    def _spawn_worker(self) -> None:
+        thread = threading.Thread(
+            target=self._worker,
+            name=f"{self._thread_name_prefix}_{len(self._threads)}",
+            daemon=True,
+        )
+        self._threads.add(thread)
+        self._idle_workers += 1
+        thread.start()
+
+    def _next_item(self) -> Optional[_WorkItem]:
+        if self._nested_queue:
+            return self._nested_queue.popleft()
+
+        while self._scope_rotation:
+            scope = self._scope_rotation[0]
+            queue = self._scope_queues[scope]
+            if not queue:
+                self._drop_scope(scope)
+                continue
+
+            item = queue.popleft()
+            self._scope_credits[scope] -= 1
+            if not queue:
+                self._drop_scope(scope)
+            elif self._scope_credits[scope] <= 0:
+                self._scope_rotation.rotate(-1)
+                self._scope_credits[scope] = self._scope_weights.get(scope, 1)
+            return item
+
+        return None
+
+    def _drop_scope(self, scope: str) -> None:
+        # the scope is at the head of the rotation when its queue drains
+        self._scope_rotation.popleft()
+        self._scope_queues.pop(scope, None)
+        self._scope_credits.pop(scope, None)
+        self._scope_weights.pop(scope, None)
+
+    def _worker(self) -> None:
+        self._local.is_worker = True
+        while True:
+            with self._lock:
+                item = self._next_item()
+                while item is None:
+                    self._work_available.wait()
+                    item = self._next_item()
+                self._idle_workers -= 1
+                self._queued_count -= 1
+                self._record_start(item)
+
+            try:
+                item.run()
+            except Exception:
+                logger.exception("Workflow executor work item failed")
+            finally:
+                with self._lock:
+                    self._idle_workers += 1
+                    self._record_finish(item)
+                del item
+            self._log_stats()
+
+
+_workflow_executor: Optional[WorkflowExecutor] = None
+_workflow_executor_lock = threading.Lock()
+
+
+def get_workflow_executor() -> WorkflowExecutor:
+    global _workflow_executor
+    if _workflow_executor is None:
+        with _workflow_executor_lock:
+            if _workflow_executor is None:
+                _workflow_executor = WorkflowExecutor(
+                    max_workers=dify_config.WORKFLOW_EXECUTOR_MAX_WORKERS,
+                    max_submit_count=dify_config.WORKFLOW_EXECUTOR_MAX_SUBMIT_COUNT,
+                    admission_timeout=dify_config.WORKFLOW_EXECUTOR_ADMISSION_TIMEOUT,
+                    stats_log_interval=dify_config.WORKFLOW_EXECUTOR_STATS_LOG_INTERVAL,
+                )
+    return _workflow_executor
+
+
+def get_scope_weight(tenant_id: str, app_id: Optional[str] = None) -> int:
+    """Round-robin weight of the work of an app, an app weight overrides the weight of its tenant."""
+    weights = dify_config.WORKFLOW_EXECUTOR_SCOPE_WEIGHTS_MAP
+    if app_id and app_id in weights:
+        return weights[app_id]
+    return weights.get(tenant_id, 1)
@@ -0,0 +1,61 @@
+from collections.abc import Mapping, Sequence
+from threading import Lock
+from typing import Any, Optional
+
+from core.helper.code_executor.code_executor import CodeExecutionError, CodeExecutor, CodeLanguage
+from core.workflow.entities.variable_pool import VariablePool
+
+
+class CodeNodeBatch:
+    """
+    Results of a Code node inside an iteration, executed for a chunk of iteration items in one sandbox call
+    the first time the node runs for an item of the chunk.
+
+    Chunks are executed lazily, so an iteration terminated by a failed item does not execute the remaining items.
+    """
+
+    def __init__(
+        self,
+        *,
+        iteration_node_id: str,
+        code_language: CodeLanguage,
+        code: str,
+        inputs_list: Sequence[Mapping[str, Any]],
+        batch_size: int,
+    ):
+        self._iteration_node_id = iteration_node_id
+        self._code_language = code_language
+        self._code = code
+        self._inputs_list = inputs_list
+        self._batch_size = batch_size
+        self._chunk_locks = {start: Lock() for start in range(0, len(inputs_list), batch_size)}
+        self._executed_chunks: set[int] = set()
+        self._results: dict[int, Mapping[str, Any] | CodeExecutionError] = {}
+
+    def pop_result(
+        self, variable_pool: VariablePool, inputs: Mapping[str, Any]
+    ) -> Optional[Mapping[str, Any] | CodeExecutionError]:
+        """
+        Get the result of the current iteration item, executing its chunk if needed
+        :param variable_pool: variable pool of the current iteration item
+        :param inputs: inputs the node resolved for the current iteration item
+        :return: the result, None if the node has to execute the code itself, e.g. when it is retried
+        """
+        index_variable = variable_pool.get([self._iteration_node_id, "index"])
+        index = index_variable.value if index_variable else None
+        if not isinstance(index, int) or not 0 <= index < len(self._inputs_list):
+            return None
+        if self._inputs_list[index] != inputs:
+            return None
+
+        start = index - index % self._batch_size
+        with self._chunk_locks[start]:
+            if start not in self._executed_chunks:
+                self._executed_chunks.add(start)
+                chunk_results = CodeExecutor.execute_workflow_code_template_batch(
+                    language=self._code_language,
+                    code=self._code,
+                    inputs_list=self._inputs_list[start : start + self._batch_size],
+                )
+                self._results.update(enumerate(chunk_results, start=start))
+            return self._results.pop(index, None)
@@ -8,6 +8,7 @@ from core.helper.code_executor.javascript.javascript_code_provider import Javasc
 from core.helper.code_executor.python3.python3_code_provider import Python3CodeProvider
 from core.workflow.entities.node_entities import NodeRunResult
 from core.workflow.nodes.base import BaseNode
+from core.workflow.nodes.code.code_batch import CodeNodeBatch
 from core.workflow.nodes.code.entities import CodeNodeData
 from core.workflow.nodes.enums import NodeType
 from models.workflow import WorkflowNodeExecutionStatus
@@ -50,13 +51,24 @@ class CodeNode(BaseNode[CodeNodeData]):
             variable_name = variable_selector.variable
             variable = self.graph_runtime_state.variable_pool.get(variable_selector.value_selector)
             variables[variable_name] = variable.to_object() if variable else None
-        # Run code
+        # Run code, or take its result from the batch executed for the iteration
+        code_node_batch: Optional[CodeNodeBatch] = self.graph_runtime_state.code_node_batches.get(self.node_id)
         try:
-            result = CodeExecutor.execute_workflow_code_template(
-                language=code_language,
-                code=code,
-                inputs=variables,
+            batch_result = (
+                code_node_batch.pop_result(self.graph_runtime_state.variable_pool, variables)
+                if code_node_batch
+                else None
             )
+            if isinstance(batch_result, CodeExecutionError):
+                raise batch_result
+            if batch_result is not None:
+                result = batch_result
+            else:
+                result = CodeExecutor.execute_workflow_code_template(
+                    language=code_language,
+                    code=code,
+                    inputs=variables,
+                )
 
             # Transform result
             result = self._transform_result(result=result, output_schema=self.node_data.outputs)
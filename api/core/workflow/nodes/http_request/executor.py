@@ -1,8 +1,9 @@
 import json
+import threading
 from collections.abc import Mapping
 from copy import deepcopy
 from random import randint
-from typing import Any, Literal
+from typing import Any, Literal, Optional
 from urllib.parse import urlencode, urlparse
 
 import httpx
@@ -73,6 +74,7 @@ class Executor:
         timeout: HttpRequestNodeTimeout,
         variable_pool: VariablePool,
         max_retries: int = dify_config.SSRF_DEFAULT_MAX_RETRIES,
+        cancel_event: Optional[threading.Event] = None,
     ):
         # If authorization API key is present, convert the API key using the variable pool
         if node_data.authorization.type == "api-key":
@@ -93,6 +95,7 @@ class Executor:
         self.data = None
         self.json = None
         self.max_retries = max_retries
+        self.cancel_event = cancel_event
 
         # init template
         self.variable_pool = variable_pool
@@ -293,11 +296,12 @@ class Executor:
             "timeout": (self.timeout.connect, self.timeout.read, self.timeout.write),
             "follow_redirects": True,
             "max_retries": self.max_retries,
+            "cancel_event": self.cancel_event,
         }
         # request_args = {k: v for k, v in request_args.items() if v is not None}
         try:
             response = getattr(ssrf_proxy, self.method.lower())(**request_args)
-        except (ssrf_proxy.MaxRetriesExceededError, httpx.RequestError) as e:
+        except (ssrf_proxy.MaxRetriesExceededError, ssrf_proxy.RequestCancelledError, httpx.RequestError) as e:
             raise HttpRequestNodeError(str(e))
         # FIXME: fix type ignore, this maybe httpx type issue
         return response  # type: ignore
@@ -60,6 +60,8 @@ class HttpRequestNode(BaseNode[HttpRequestNodeData]):
         }
 
     def _run(self) -> NodeRunResult:
+        from core.workflow.graph_engine.graph_engine import GraphEngine
+
         process_data = {}
         try:
             http_executor = Executor(
@@ -67,6 +69,8 @@ class HttpRequestNode(BaseNode[HttpRequestNodeData]):
                 timeout=self._get_request_timeout(self.node_data),
                 variable_pool=self.graph_runtime_state.variable_pool,
                 max_retries=0,
+                # retries of the node are waited out by the graph engine, this stops any backoff in the request
+                cancel_event=GraphEngine.get_stop_event(self.thread_pool_id),
             )
             process_data["request"] = http_executor.to_log()
 
@@ -8,6 +8,7 @@ from queue import Empty, Queue
 from typing import TYPE_CHECKING, Any, Optional, cast
 
 from flask import Flask, current_app
+from pydantic import ValidationError
 
 from configs import dify_config
 from core.variables import ArrayVariable, IntegerVariable, NoneVariable
@@ -33,7 +34,10 @@ from core.workflow.graph_engine.entities.event import (
     NodeRunSucceededEvent,
 )
 from core.workflow.graph_engine.entities.graph import Graph
+from core.workflow.graph_engine.workflow_executor import get_scope_weight
 from core.workflow.nodes.base import BaseNode
+from core.workflow.nodes.code.code_batch import CodeNodeBatch
+from core.workflow.nodes.code.entities import CodeNodeData
 from core.workflow.nodes.enums import NodeType
 from core.workflow.nodes.event import NodeEvent, RunCompletedEvent
 from core.workflow.nodes.iteration.entities import ErrorHandleMode, IterationNodeData
@@ -138,6 +142,11 @@ class IterationNode(BaseNode[IterationNodeData]):
             max_execution_time=dify_config.WORKFLOW_MAX_EXECUTION_TIME,
             thread_pool_id=self.thread_pool_id,
         )
+        graph_engine.graph_runtime_state.code_node_batches = self._prepare_code_node_batches(
+            iteration_graph=iteration_graph,
+            iterator_list_value=iterator_list_value,
+            variable_pool=variable_pool,
+        )
 
         start_at = datetime.now(UTC).replace(tzinfo=None)
 
@@ -168,7 +177,10 @@ class IterationNode(BaseNode[IterationNodeData]):
                 futures: list[Future] = []
                 q: Queue = Queue()
                 thread_pool = GraphEngineThreadPool(
-                    max_workers=self.node_data.parallel_nums, max_submit_count=dify_config.MAX_SUBMIT_COUNT
+                    max_workers=self.node_data.parallel_nums,
+                    max_submit_count=dify_config.MAX_SUBMIT_COUNT,
+                    scope=self.tenant_id,
+                    weight=get_scope_weight(self.tenant_id, self.app_id),
                 )
                 for index, item in enumerate(iterator_list_value):
                     future: Future = thread_pool.submit(
@@ -281,6 +293,64 @@ class IterationNode(BaseNode[IterationNodeData]):
             variable_pool.remove([self.node_id, "index"])
             variable_pool.remove([self.node_id, "item"])
 
+    def _prepare_code_node_batches(
+        self, *, iteration_graph: Graph, iterator_list_value: Sequence[Any], variable_pool: VariablePool
+    ) -> dict[str, CodeNodeBatch]:
+        """
+        Prepare batched execution of the code nodes that run first in every iteration and only read the
+        iteration item, the iteration index or variables from outside the iteration
+        """
+        batch_size = dify_config.CODE_EXECUTION_BATCH_SIZE
+        if batch_size <= 1 or len(iterator_list_value) <= 1:
+            return {}
+
+        code_node_datas: dict[str, CodeNodeData] = {}
+        for node_id, node_config in iteration_graph.node_id_config_mapping.items():
+            data = node_config.get("data", {})
+            if data.get("type") != NodeType.CODE.value or data.get("iteration_id") != self.node_id:
+                continue
+            edges = iteration_graph.reverse_edge_mapping.get(node_id, [])
+            if not edges or any(
+                edge.source_node_id != iteration_graph.root_node_id or edge.run_condition for edge in edges
+            ):
+                continue
+            try:
+                node_data = CodeNodeData.model_validate(data)
+            except ValidationError:
+                continue
+            if all(
+                selector.value_selector[0] == self.node_id or selector.value_selector[0] not in iteration_graph.node_ids
+                for selector in node_data.variables
+            ):
+                code_node_datas[node_id] = node_data
+
+        if not code_node_datas:
+            return {}
+
+        # resolve the inputs of every item the way the code node does
+        inputs_lists: dict[str, list[Mapping[str, Any]]] = {node_id: [] for node_id in code_node_datas}
+        item_variable_pool = variable_pool.create_copy()
+        for index, item in enumerate(iterator_list_value):
+            item_variable_pool.add([self.node_id, "index"], index)
+            item_variable_pool.add([self.node_id, "item"], item)
+            for node_id, node_data in code_node_datas.items():
+                inputs: dict[str, Any] = {}
+                for selector in node_data.variables:
+                    variable = item_variable_pool.get(selector.value_selector)
+                    inputs[selector.variable] = variable.to_object() if variable else None
+                inputs_lists[node_id].append(inputs)
+
+        return {
+            node_id: CodeNodeBatch(
+                iteration_node_id=self.node_id,
+                code_language=node_data.code_language,
+                code=node_data.code,
+                inputs_list=inputs_lists[node_id],
+                batch_size=batch_size,
+            )
+            for node_id, node_data in code_node_datas.items()
+        }
+
     @classmethod
     def _extract_variable_selector_to_variable_mapping(
         cls,
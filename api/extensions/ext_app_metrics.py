@@ -65,3 +65,12 @@ def init_app(app: DifyApp):
             "connection_timeout": engine.pool.timeout(),  # type: ignore
             "recycle_time": db.engine.pool._recycle,  # type: ignore
         }
+
+    @app.route("/workflow-executor-stat")
+    def workflow_executor_stat():
+        from core.workflow.graph_engine.workflow_executor import get_workflow_executor
+
+        return {
+            "pid": os.getpid(),
+            **get_workflow_executor().get_stats(),
+        }
@@ -11,6 +11,7 @@ import time
 from json import JSONDecodeError
 from typing import Any, cast
 
+import numpy as np
 from sqlalchemy import func
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped
@@ -753,6 +754,28 @@ class DatasetKeywordTable(db.Model):  # type: ignore[name-defined]
                 return None
 
 
+class DatasetKeywordTableShard(db.Model):  # type: ignore[name-defined]
+    """
+    One shard of a dataset's sharded keyword index.
+
+    `kind` is either "keyword" (keyword -> node ids postings) or "node" (node id -> keywords),
+    the shard a key belongs to is derived from a stable hash of the key.
+    """
+
+    __tablename__ = "dataset_keyword_table_shards"
+    __table_args__ = (
+        db.PrimaryKeyConstraint("id", name="dataset_keyword_table_shard_pkey"),
+        db.UniqueConstraint("dataset_id", "kind", "shard_id", name="dataset_keyword_table_shard_unique_idx"),
+    )
+
+    id = db.Column(StringUUID, primary_key=True, server_default=db.text("uuid_generate_v4()"))
+    dataset_id = db.Column(StringUUID, nullable=False)
+    kind = db.Column(db.String(16), nullable=False)
+    shard_id = db.Column(db.Integer, nullable=False)
+    postings = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
+
+
 class Embedding(db.Model):  # type: ignore[name-defined]
     __tablename__ = "embeddings"
     __table_args__ = (
@@ -770,11 +793,28 @@ class Embedding(db.Model):  # type: ignore[name-defined]
     created_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
     provider_name = db.Column(db.String(255), nullable=False, server_default=db.text("''::character varying"))
 
+    # packed vectors are prefixed so they can be told apart from legacy pickled rows,
+    # pickle payloads never start with a NUL byte
+    PACKED_EMBEDDING_PREFIX = b"\x00f32"
+
     def set_embedding(self, embedding_data: list[float]):
-        self.embedding = pickle.dumps(embedding_data, protocol=pickle.HIGHEST_PROTOCOL)
+        self.embedding = self.pack_embedding(embedding_data)
 
     def get_embedding(self) -> list[float]:
-        return cast(list[float], pickle.loads(self.embedding))
+        return self.unpack_embedding(self.embedding)
+
+    @classmethod
+    def pack_embedding(cls, embedding_data: list[float]) -> bytes:
+        """Serialize a vector as little-endian float32 bytes."""
+        return cls.PACKED_EMBEDDING_PREFIX + np.asarray(embedding_data, dtype="<f4").tobytes()
+
+    @classmethod
+    def unpack_embedding(cls, data: bytes) -> list[float]:
+        """Deserialize a vector written by `pack_embedding` or by the legacy pickle format."""
+        data = bytes(data)
+        if data.startswith(cls.PACKED_EMBEDDING_PREFIX):
+            return cast(list[float], np.frombuffer(data, dtype="<f4", offset=len(cls.PACKED_EMBEDDING_PREFIX)).tolist())
+        return cast(list[float], pickle.loads(data))
 
 
 class DatasetCollectionBinding(db.Model):  # type: ignore[name-defined]
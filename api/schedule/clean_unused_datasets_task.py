@@ -9,9 +9,8 @@ import app
 from configs import dify_config
 from core.rag.index_processor.index_processor_factory import IndexProcessorFactory
 from extensions.ext_database import db
-from extensions.ext_redis import redis_client
 from models.dataset import Dataset, DatasetAutoDisableLog, DatasetQuery, Document
-from services.feature_service import FeatureService
+from services.retention_service import TenantPlanResolver
 
 
 @app.celery.task(queue="dataset")
@@ -22,6 +21,7 @@ def clean_unused_datasets_task():
     start_at = time.perf_counter()
     plan_sandbox_clean_day = datetime.datetime.now() - datetime.timedelta(days=plan_sandbox_clean_day_setting)
     plan_pro_clean_day = datetime.datetime.now() - datetime.timedelta(days=plan_pro_clean_day_setting)
+    tenant_plan_resolver = TenantPlanResolver()
     while True:
         try:
             # Subquery for counting new documents
@@ -159,15 +159,7 @@ def clean_unused_datasets_task():
             )
             if not dataset_query or len(dataset_query) == 0:
                 try:
-                    features_cache_key = f"features:{dataset.tenant_id}"
-                    plan_cache = redis_client.get(features_cache_key)
-                    if plan_cache is None:
-                        features = FeatureService.get_features(dataset.tenant_id)
-                        redis_client.setex(features_cache_key, 600, features.billing.subscription.plan)
-                        plan = features.billing.subscription.plan
-                    else:
-                        plan = plan_cache.decode()
-                    if plan == "sandbox":
+                    if tenant_plan_resolver.is_sandbox(dataset.tenant_id):
                         # remove index
                         index_processor = IndexProcessorFactory(dataset.doc_form).init_index_processor()
                         index_processor.clean(dataset, None)
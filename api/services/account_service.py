@@ -9,12 +9,13 @@ from hashlib import sha256
 from typing import Any, Optional, cast
 
 from pydantic import BaseModel
-from sqlalchemy import func
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from werkzeug.exceptions import Unauthorized
 
 from configs import dify_config
 from constants.languages import language_timezone_mapping, languages
+from core.helper.account_session_cache import AccountSession, AccountSessionCache
 from events.tenant_event import tenant_was_created
 from extensions.ext_database import db
 from extensions.ext_redis import redis_client
@@ -101,32 +102,71 @@ class AccountService:
 
     @staticmethod
     def load_user(user_id: str) -> None | Account:
-        account = db.session.query(Account).filter_by(id=user_id).first()
-        if not account:
-            return None
+        account_session = AccountSessionCache.get(user_id)
+        if account_session is None:
+            account_session = AccountService._load_account_session(user_id)
+            if account_session is None:
+                return None
+            AccountSessionCache.set(account_session)
 
-        if account.status == AccountStatus.BANNED.value:
+        if account_session.account.status == AccountStatus.BANNED.value:
             raise Unauthorized("Account is banned.")
 
-        current_tenant = TenantAccountJoin.query.filter_by(account_id=account.id, current=True).first()
-        if current_tenant:
-            account.current_tenant_id = current_tenant.tenant_id
-        else:
-            available_ta = (
-                TenantAccountJoin.query.filter_by(account_id=account.id).order_by(TenantAccountJoin.id.asc()).first()
-            )
-            if not available_ta:
+        # attach copies of the cached rows to the request session without querying them again
+        account = db.session.merge(account_session.account, load=False)
+        tenant = db.session.merge(account_session.tenant, load=False)
+        tenant.current_role = account_session.role
+        account._current_tenant = tenant
+
+        now = datetime.now(UTC).replace(tzinfo=None)
+        if now - account.last_active_at > timedelta(minutes=10):
+            AccountSessionCache.record_last_active(account.id, now)
+
+        return cast(Account, account)
+
+    @staticmethod
+    def _load_account_session(account_id: str) -> Optional[AccountSession]:
+        """
+        Load an account with its current tenant, falling back to its first tenant if it has no current one
+        """
+        # versions are read before the rows they validate, a change committed in between is seen on the next request
+        account_version = AccountSessionCache.get_version(AccountSessionCache.account_version_key(account_id))
+        with Session(db.engine, expire_on_commit=False) as session:
+            account = session.get(Account, account_id)
+            if not account:
                 return None
 
-            account.current_tenant_id = available_ta.tenant_id
-            available_ta.current = True
-            db.session.commit()
+            tenant_account_join = session.scalar(
+                select(TenantAccountJoin).where(
+                    TenantAccountJoin.account_id == account.id, TenantAccountJoin.current == True
+                )
+            )
+            if not tenant_account_join:
+                tenant_account_join = session.scalar(
+                    select(TenantAccountJoin)
+                    .where(TenantAccountJoin.account_id == account.id)
+                    .order_by(TenantAccountJoin.id.asc())
+                    .limit(1)
+                )
+                if not tenant_account_join:
+                    return None
+                tenant_account_join.current = True
+                session.commit()
 
-        if datetime.now(UTC).replace(tzinfo=None) - account.last_active_at > timedelta(minutes=10):
-            account.last_active_at = datetime.now(UTC).replace(tzinfo=None)
-            db.session.commit()
+            tenant_version = AccountSessionCache.get_version(
+                AccountSessionCache.tenant_version_key(tenant_account_join.tenant_id)
+            )
+            tenant = session.get(Tenant, tenant_account_join.tenant_id)
+            if not tenant:
+                return None
 
-        return cast(Account, account)
+            return AccountSession(
+                account=account,
+                tenant=tenant,
+                role=tenant_account_join.role,
+                account_version=account_version,
+                tenant_version=tenant_version,
+            )
 
     @staticmethod
     def get_account_jwt_token(account: Account) -> str:
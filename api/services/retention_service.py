@@ -0,0 +1,133 @@
+import logging
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import Row, Select, delete, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+
+from extensions.ext_database import db
+from extensions.ext_redis import redis_client
+from services.feature_service import FeatureService
+
+logger = logging.getLogger(__name__)
+
+# plans of tenants are shared between the cleanup tasks through redis
+PLAN_CACHE_TTL = 600
+
+
+class TenantPlanResolver:
+    """
+    Resolves the billing plan of tenants, once per tenant for the lifetime of the resolver.
+    """
+
+    def __init__(self) -> None:
+        self._plans: dict[str, str] = {}
+
+    def get_plan(self, tenant_id: str) -> str:
+        plan = self._plans.get(tenant_id)
+        if plan is not None:
+            return plan
+
+        features_cache_key = f"features:{tenant_id}"
+        plan_cache = redis_client.get(features_cache_key)
+        if plan_cache is None:
+            plan = FeatureService.get_features(tenant_id).billing.subscription.plan
+            redis_client.setex(features_cache_key, PLAN_CACHE_TTL, plan)
+        else:
+            plan = plan_cache.decode()
+
+        self._plans[tenant_id] = plan
+        return plan
+
+    def is_sandbox(self, tenant_id: str) -> bool:
+        return self.get_plan(tenant_id) == "sandbox"
+
+
+@dataclass
+class RetentionCleanStats:
+    batches: int = 0
+    scanned: int = 0
+    deleted: int = 0
+    related_deleted: dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def deleted_per_second(self) -> float:
+        return self.deleted / self.elapsed if self.elapsed else 0.0
+
+
+class RetentionCleaner:
+    """
+    Deletes expired rows and the rows related to them, in batches walked with keyset pagination on
+    (created_at, id), with one DELETE ... WHERE ... IN (...) per table and one commit per batch.
+    """
+
+    def __init__(
+        self,
+        *,
+        candidates: Select,
+        id_column: InstrumentedAttribute[Any],
+        created_at_column: InstrumentedAttribute[Any],
+        related_columns: Sequence[InstrumentedAttribute[Any]] = (),
+        should_delete: Optional[Callable[[Row], bool]] = None,
+        batch_size: int = 1000,
+    ) -> None:
+        """
+        :param candidates: select of the expired rows, its first two columns must be the id and created_at columns
+        :param id_column: primary key of the table to clean
+        :param created_at_column: creation time of the table to clean
+        :param related_columns: columns of related tables referencing the ids of the cleaned rows
+        :param should_delete: whether a candidate row is deleted, all candidates are deleted if not set
+        :param batch_size: number of candidate rows per batch
+        """
+        self._candidates = candidates
+        self._id_column = id_column
+        self._created_at_column = created_at_column
+        self._related_columns = related_columns
+        self._should_delete = should_delete
+        self._batch_size = batch_size
+
+    def run(self) -> RetentionCleanStats:
+        stats = RetentionCleanStats()
+        start_at = time.perf_counter()
+        cursor: Optional[tuple[datetime, str]] = None
+        while True:
+            stmt = self._candidates
+            if cursor:
+                stmt = stmt.where(tuple_(self._created_at_column, self._id_column) > cursor)
+            stmt = stmt.order_by(self._created_at_column, self._id_column).limit(self._batch_size)
+            rows = db.session.execute(stmt).all()
+            if not rows:
+                break
+
+            cursor = (rows[-1][1], rows[-1][0])
+            ids = [row[0] for row in rows if self._should_delete is None or self._should_delete(row)]
+            stats.batches += 1
+            stats.scanned += len(rows)
+            if ids:
+                self._delete(ids, stats)
+
+            stats.elapsed = time.perf_counter() - start_at
+            logger.info(
+                f"Retention cleanup of {self._id_column.class_.__tablename__}: batch {stats.batches},"
+                f" {stats.scanned} scanned, {stats.deleted} deleted, {stats.deleted_per_second:.1f} rows/s"
+            )
+
+        stats.elapsed = time.perf_counter() - start_at
+        return stats
+
+    def _delete(self, ids: list[str], stats: RetentionCleanStats) -> None:
+        try:
+            for column in self._related_columns:
+                table_name = column.class_.__tablename__
+                result = db.session.execute(delete(column.class_).where(column.in_(ids)))
+                stats.related_deleted[table_name] = stats.related_deleted.get(table_name, 0) + result.rowcount
+            result = db.session.execute(delete(self._id_column.class_).where(self._id_column.in_(ids)))
+            stats.deleted += result.rowcount
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
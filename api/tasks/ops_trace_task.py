@@ -1,11 +1,14 @@
+import gzip
 import json
 import logging
+from collections.abc import Mapping
+from typing import Any
 
 from celery import shared_task  # type: ignore
 from flask import current_app
 
 from core.ops.entities.config_entity import OPS_FILE_PATH, OPS_TRACE_FAILED_KEY
-from core.ops.entities.trace_entity import trace_info_info_map
+from core.ops.entities.trace_entity import BaseTraceInfo, trace_info_info_map
 from core.rag.models.document import Document
 from extensions.ext_redis import redis_client
 from extensions.ext_storage import storage
@@ -27,24 +30,13 @@ def process_trace_tasks(file_info):
     file_id = file_info.get("file_id")
     file_path = f"{OPS_FILE_PATH}{app_id}/{file_id}.json"
     file_data = json.loads(storage.load(file_path))
-    trace_info = file_data.get("trace_info")
-    trace_info_type = file_data.get("trace_info_type")
     trace_instance = OpsTraceManager.get_ops_trace_instance(app_id)
 
-    if trace_info.get("message_data"):
-        trace_info["message_data"] = Message.from_dict(data=trace_info["message_data"])
-    if trace_info.get("workflow_data"):
-        trace_info["workflow_data"] = WorkflowRun.from_dict(data=trace_info["workflow_data"])
-    if trace_info.get("documents"):
-        trace_info["documents"] = [Document(**doc) for doc in trace_info["documents"]]
-
     try:
         if trace_instance:
             with current_app.app_context():
-                trace_type = trace_info_info_map.get(trace_info_type)
-                if trace_type:
-                    trace_info = trace_type(**trace_info)
-                trace_instance.trace(trace_info)
+                trace_instance.trace(_load_trace_info(file_data))
+                trace_instance.flush()
         logging.info(f"Processing trace tasks success, app_id: {app_id}")
     except Exception:
         failed_key = f"{OPS_TRACE_FAILED_KEY}_{app_id}"
@@ -52,3 +44,61 @@ def process_trace_tasks(file_info):
         logging.info(f"Processing trace tasks failed, app_id: {app_id}")
     finally:
         storage.delete(file_path)
+
+
+@shared_task(queue="ops_trace")
+def process_trace_batch_tasks(file_info):
+    """
+    Async process a batch of trace tasks of one app
+    :param file_info: app_id and file_id of the gzipped list of task data
+
+    Usage: process_trace_batch_tasks.delay(file_info)
+    """
+    from core.ops.ops_trace_manager import OpsTraceManager
+
+    app_id = file_info.get("app_id")
+    file_id = file_info.get("file_id")
+    file_path = f"{OPS_FILE_PATH}{app_id}/{file_id}.json.gz"
+    failed_count = 0
+
+    try:
+        tasks_data = json.loads(gzip.decompress(storage.load(file_path)))
+        trace_instance = OpsTraceManager.get_ops_trace_instance(app_id)
+        if trace_instance:
+            with current_app.app_context():
+                for task_data in tasks_data:
+                    try:
+                        trace_instance.trace(_load_trace_info(task_data))
+                    except Exception:
+                        failed_count += 1
+                        logging.exception(f"Processing trace task failed, app_id: {app_id}")
+                try:
+                    trace_instance.flush()
+                except Exception:
+                    failed_count = len(tasks_data)
+                    logging.exception(f"Flushing trace tasks failed, app_id: {app_id}")
+        logging.info(f"Processing {len(tasks_data)} trace tasks done, app_id: {app_id}, failed: {failed_count}")
+    except Exception:
+        failed_count = failed_count or 1
+        logging.exception(f"Processing trace tasks failed, app_id: {app_id}")
+    finally:
+        if failed_count:
+            redis_client.incrby(f"{OPS_TRACE_FAILED_KEY}_{app_id}", failed_count)
+        storage.delete(file_path)
+
+
+def _load_trace_info(task_data: Mapping[str, Any]) -> BaseTraceInfo:
+    trace_info: dict[str, Any] = dict(task_data.get("trace_info") or {})
+    trace_info_type = task_data.get("trace_info_type")
+
+    if trace_info.get("message_data"):
+        trace_info["message_data"] = Message.from_dict(data=trace_info["message_data"])
+    if trace_info.get("workflow_data"):
+        trace_info["workflow_data"] = WorkflowRun.from_dict(data=trace_info["workflow_data"])
+    if trace_info.get("documents"):
+        trace_info["documents"] = [Document(**doc) for doc in trace_info["documents"]]
+
+    trace_type = trace_info_info_map.get(trace_info_type or "")
+    if trace_type is None:
+        raise ValueError(f"Unknown trace info type: {trace_info_type}")
+    return trace_type(**trace_info)
@@ -0,0 +1,105 @@
+import threading
+import time
+from typing import Optional
+from unittest.mock import MagicMock
+
+from core.agent import fc_agent_runner
+from core.agent.fc_agent_runner import FunctionCallAgentRunner
+from core.tools.entities.tool_entities import ToolInvokeMeta, ToolProviderType
+
+
+def _runner() -> FunctionCallAgentRunner:
+    runner = FunctionCallAgentRunner.__new__(FunctionCallAgentRunner)
+    runner.message = MagicMock(id="message_id", conversation_id="conversation_id")
+    runner.conversation = MagicMock(id="conversation_id")
+    runner.application_generate_entity = MagicMock()
+    runner.agent_callback = MagicMock()
+    runner.user_id = "user_id"
+    runner.tenant_id = "tenant_id"
+    return runner
+
+
+def _tool(run_serially: Optional[bool] = False) -> MagicMock:
+    tool = MagicMock()
+    tool.entity.run_serially = run_serially
+    return tool
+
+
+def test_invoke_tool_calls_concurrently_in_order(mocker):
+    mocker.patch.object(fc_agent_runner.dify_config, "AGENT_MAX_PARALLEL_TOOL_CALLS", 4)
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def agent_invoke(tool, tool_parameters, **kwargs):
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(tool_parameters["sleep"])
+        with lock:
+            running -= 1
+        return f"result {tool_parameters['sleep']}", [], ToolInvokeMeta(time_cost=tool_parameters["sleep"])
+
+    mocker.patch.object(fc_agent_runner.ToolEngine, "agent_invoke", side_effect=agent_invoke)
+    tool_calls = [("1", "search", {"sleep": 0.2}), ("2", "search", {"sleep": 0.05}), ("3", "http", {"sleep": 0.1})]
+
+    results = _runner()._invoke_tool_calls(tool_calls, {"search": _tool(), "http": _tool()}, None)
+
+    assert [tool_response["tool_call_id"] for tool_response, _ in results] == ["1", "2", "3"]
+    assert [tool_response["tool_response"] for tool_response, _ in results] == [
+        "result 0.2",
+        "result 0.05",
+        "result 0.1",
+    ]
+    assert results[1][0]["meta"]["time_cost"] == 0.05
+    assert max_running == 3
+
+
+def test_serial_tool_does_not_overlap_other_tool_calls(mocker):
+    mocker.patch.object(fc_agent_runner.dify_config, "AGENT_MAX_PARALLEL_TOOL_CALLS", 4)
+    running: set[str] = set()
+    overlaps = []
+    lock = threading.Lock()
+
+    def agent_invoke(tool, tool_parameters, **kwargs):
+        with lock:
+            if "workflow" in running or (running and tool_parameters["name"] == "workflow"):
+                overlaps.append(tool_parameters["name"])
+            running.add(tool_parameters["name"])
+        time.sleep(0.05)
+        with lock:
+            running.discard(tool_parameters["name"])
+        return tool_parameters["name"], [], ToolInvokeMeta(time_cost=0.05)
+
+    mocker.patch.object(fc_agent_runner.ToolEngine, "agent_invoke", side_effect=agent_invoke)
+    tool_calls = [
+        ("1", "search", {"name": "search"}),
+        ("2", "workflow", {"name": "workflow"}),
+        ("3", "http", {"name": "http"}),
+        ("4", "missing", {}),
+    ]
+    tool_instances = {"search": _tool(), "workflow": _tool(run_serially=True), "http": _tool()}
+
+    results = _runner()._invoke_tool_calls(tool_calls, tool_instances, None)
+
+    assert overlaps == []
+    assert [tool_response["tool_response"] for tool_response, _ in results] == [
+        "search",
+        "workflow",
+        "http",
+        "there is not a tool named missing",
+    ]
+
+
+def test_undeclared_tools_run_serially_unless_builtin_or_api():
+    def tool(run_serially, provider_type):
+        tool = _tool(run_serially)
+        tool.tool_provider_type.return_value = provider_type
+        return tool
+
+    assert not fc_agent_runner._must_run_serially(tool(None, ToolProviderType.BUILT_IN))
+    assert not fc_agent_runner._must_run_serially(tool(None, ToolProviderType.API))
+    assert fc_agent_runner._must_run_serially(tool(None, ToolProviderType.PLUGIN))
+    assert not fc_agent_runner._must_run_serially(tool(False, ToolProviderType.PLUGIN))
+    assert fc_agent_runner._must_run_serially(tool(True, ToolProviderType.API))
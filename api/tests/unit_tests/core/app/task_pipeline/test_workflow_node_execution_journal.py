@@ -0,0 +1,141 @@
+import threading
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from core.app.task_pipeline.workflow_node_execution_journal import WorkflowNodeExecutionJournal
+from models.workflow import WorkflowNodeExecution, WorkflowNodeExecutionStatus
+
+
+def _journal(mocker, flush_size: int = 100) -> tuple[WorkflowNodeExecutionJournal, MagicMock]:
+    journal = WorkflowNodeExecutionJournal(engine=MagicMock(), flush_size=flush_size, flush_interval=60)
+    upsert = mocker.patch.object(journal, "_upsert")
+    return journal, upsert
+
+
+def _node_execution(id: str) -> WorkflowNodeExecution:
+    workflow_node_execution = WorkflowNodeExecution()
+    workflow_node_execution.id = id
+    workflow_node_execution.status = WorkflowNodeExecutionStatus.RUNNING.value
+    workflow_node_execution.created_at = datetime(2026, 1, 1)
+    return workflow_node_execution
+
+
+def test_start_and_finish_are_written_once(mocker):
+    journal, upsert = _journal(mocker)
+    workflow_node_execution = _node_execution("node_1")
+
+    journal.record(workflow_node_execution)
+    workflow_node_execution.status = WorkflowNodeExecutionStatus.SUCCEEDED.value
+    workflow_node_execution.elapsed_time = 1.5
+    journal.record(workflow_node_execution)
+    journal.flush()
+
+    upsert.assert_called_once()
+    (rows,) = upsert.call_args.args
+    assert len(rows) == 1
+    assert rows[0]["status"] == WorkflowNodeExecutionStatus.SUCCEEDED.value
+    assert rows[0]["elapsed_time"] == 1.5
+
+
+def test_records_are_snapshotted(mocker):
+    journal, upsert = _journal(mocker)
+    workflow_node_execution = _node_execution("node_1")
+
+    journal.record(workflow_node_execution)
+    workflow_node_execution.status = WorkflowNodeExecutionStatus.SUCCEEDED.value
+    journal.flush()
+
+    (rows,) = upsert.call_args.args
+    assert rows[0]["status"] == WorkflowNodeExecutionStatus.RUNNING.value
+    assert rows[0]["elapsed_time"] == 0
+
+
+def test_failed_bulk_write_falls_back_to_rows(mocker):
+    journal, upsert = _journal(mocker)
+
+    def upsert_side_effect(rows):
+        if len(rows) > 1 or rows[0]["id"] == "node_2":
+            raise RuntimeError("write failed")
+
+    upsert.side_effect = upsert_side_effect
+    journal.record(_node_execution("node_1"))
+    journal.record(_node_execution("node_2"))
+    failed_rows = journal.flush()
+
+    assert upsert.call_count == 3
+    # records that cannot be written are handed back instead of silently dropped
+    assert [row["id"] for row in failed_rows] == ["node_2"]
+    assert journal.flush() == []
+    assert upsert.call_count == 3
+
+
+def test_failed_background_write_is_retried(mocker):
+    journal, upsert = _journal(mocker)
+    upsert.side_effect = RuntimeError("write failed")
+    journal.record(_node_execution("node_1"))
+
+    journal._flush_in_background()
+    upsert.side_effect = None
+
+    # a retry is scheduled for the records put back
+    assert journal._flush_timer is not None
+    journal._flush_timer.cancel()
+    assert journal.flush() == []
+    (rows,) = upsert.call_args.args
+    assert [row["id"] for row in rows] == ["node_1"]
+
+
+class _HandOverLock:
+    """Flush lock that lets a waiting thread run as soon as it is released."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.waiter: threading.Thread | None = None
+
+    def __enter__(self) -> None:
+        self._lock.acquire()
+
+    def __exit__(self, *args) -> None:
+        self._lock.release()
+        if self.waiter is not None and self.waiter is not threading.current_thread():
+            self.waiter.join(timeout=5)
+
+
+def test_final_flush_waiting_on_a_failed_background_write_gets_its_records(mocker):
+    journal, upsert = _journal(mocker)
+    journal._flush_lock = flush_lock = _HandOverLock()  # type: ignore[assignment]
+    final_flush_result: list[list[dict]] = []
+    final_flush = threading.Thread(target=lambda: final_flush_result.append(journal.flush()))
+    flush_lock.waiter = final_flush
+    written_rows: list[dict] = []
+
+    def upsert_side_effect(rows):
+        if threading.current_thread() is final_flush:
+            written_rows.extend(rows)
+            return
+        if not final_flush.is_alive():
+            # the final flush of the run waits on the flush lock the background write holds
+            final_flush.start()
+        raise RuntimeError("write failed")
+
+    upsert.side_effect = upsert_side_effect
+    journal.record(_node_execution("node_1"))
+
+    journal._flush_in_background()
+
+    assert final_flush_result == [[]]
+    assert [row["id"] for row in written_rows] == ["node_1"]
+
+
+def test_flush_size_triggers_background_write(mocker):
+    journal, upsert = _journal(mocker, flush_size=2)
+    submit = mocker.patch("core.app.task_pipeline.workflow_node_execution_journal._get_writer").return_value.submit
+
+    journal.record(_node_execution("node_1"))
+    journal.record(_node_execution("node_2"))
+    journal.record(_node_execution("node_3"))
+
+    submit.assert_called_once()
+    submit.call_args.args[0]()
+    (rows,) = upsert.call_args.args
+    assert len(rows) == 3
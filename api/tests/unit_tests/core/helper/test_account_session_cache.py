@@ -0,0 +1,83 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.helper import account_session_cache
+from core.helper.account_session_cache import VERSION_TTL, AccountSession, AccountSessionCache
+from models.account import Account, Tenant, TenantAccountJoin
+
+
+@pytest.fixture(autouse=True)
+def redis_client(mocker):
+    mocker.patch.object(AccountSessionCache, "_entries", new=account_session_cache.OrderedDict())
+    mocker.patch.object(account_session_cache.dify_config, "ACCOUNT_SESSION_CACHE_TTL", 30)
+    mocker.patch.object(account_session_cache.dify_config, "ACCOUNT_SESSION_CACHE_MAX_SIZE", 2)
+    return mocker.patch.object(account_session_cache, "redis_client", new=MagicMock())
+
+
+def _account_session(account_id: str, account_version=b"1", tenant_version=b"1") -> AccountSession:
+    return AccountSession(
+        account=Account(id=account_id),
+        tenant=Tenant(id="tenant_id"),
+        role="owner",
+        account_version=account_version,
+        tenant_version=tenant_version,
+    )
+
+
+def test_session_is_used_while_its_versions_are_current(redis_client):
+    account_session = _account_session("account_id")
+    AccountSessionCache.set(account_session)
+
+    redis_client.mget.return_value = [b"1", b"1"]
+    assert AccountSessionCache.get("account_id") is account_session
+    redis_client.mget.assert_called_once_with(
+        ["account_session_version:account:account_id", "account_session_version:tenant:tenant_id"]
+    )
+
+    redis_client.mget.return_value = [b"1", b"2"]
+    assert AccountSessionCache.get("account_id") is None
+    redis_client.mget.return_value = [b"1", b"1"]
+    assert AccountSessionCache.get("account_id") is None
+
+
+def test_sessions_expire_and_are_bounded(mocker, redis_client):
+    monotonic = mocker.patch.object(account_session_cache.time, "monotonic", return_value=100.0)
+    redis_client.mget.return_value = [None, None]
+    for account_id in ("a", "b", "c"):
+        AccountSessionCache.set(_account_session(account_id, account_version=None, tenant_version=None))
+
+    assert AccountSessionCache.get("a") is None
+    assert AccountSessionCache.get("b") is not None
+
+    monotonic.return_value = 131.0
+    assert AccountSessionCache.get("c") is None
+
+
+def test_redis_errors_bypass_the_cache(redis_client):
+    AccountSessionCache.set(_account_session("account_id"))
+    redis_client.mget.side_effect = ConnectionError()
+
+    assert AccountSessionCache.get("account_id") is None
+
+
+def test_committed_changes_bump_versions(redis_client):
+    session = MagicMock(
+        info={},
+        new=[TenantAccountJoin(account_id="member_id", tenant_id="tenant_id")],
+        dirty=[Tenant(id="tenant_id")],
+        deleted=[],
+    )
+
+    account_session_cache._collect_version_keys(session, None)
+    redis_client.pipeline.assert_not_called()
+    account_session_cache._bump_version_keys(session)
+
+    pipeline = redis_client.pipeline.return_value
+    assert [call.args for call in pipeline.incr.call_args_list] == [
+        ("account_session_version:account:member_id",),
+        ("account_session_version:tenant:tenant_id",),
+    ]
+    pipeline.expire.assert_called_with("account_session_version:tenant:tenant_id", VERSION_TTL)
+    pipeline.execute.assert_called_once()
+    assert session.info == {}
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+from core.helper.code_executor import code_executor
+from core.helper.code_executor.code_executor import CodeExecutionError, CodeExecutor, CodeLanguage
+
+CODE = "def main(a: int) -> dict:\n    return {'b': 10 // a}\n"
+
+
+def _run_python(language, preload, code):
+    process = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if process.returncode != 0:
+        raise CodeExecutionError(process.stderr)
+    return process.stdout
+
+
+def test_execute_batch_keeps_the_error_of_each_call(mocker):
+    mocker.patch.object(code_executor.dify_config, "CODE_EXECUTION_BATCH_SIZE", 10)
+    execute_code = mocker.patch.object(CodeExecutor, "execute_code", side_effect=_run_python)
+
+    results = CodeExecutor.execute_workflow_code_template_batch(CodeLanguage.PYTHON3, CODE, [{"a": 1}, {"a": 0}])
+
+    assert results[0] == {"b": 10}
+    assert isinstance(results[1], CodeExecutionError)
+    assert "ZeroDivisionError" in str(results[1])
+    execute_code.assert_called_once()
+
+
+def test_execute_batch_falls_back_to_single_calls(mocker):
+    mocker.patch.object(code_executor.dify_config, "CODE_EXECUTION_BATCH_SIZE", 10)
+    execute_code = mocker.patch.object(CodeExecutor, "execute_code", side_effect=_run_python)
+    code = "import sys\n\ndef main(a: int) -> dict:\n    if a == 0:\n        sys.exit(1)\n    return {'b': a}\n"
+
+    results = CodeExecutor.execute_workflow_code_template_batch(CodeLanguage.PYTHON3, code, [{"a": 1}, {"a": 0}])
+
+    assert results[0] == {"b": 1}
+    assert isinstance(results[1], CodeExecutionError)
+    assert execute_code.call_count == 3
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from core.helper.code_executor import code_executor
+from core.helper.code_executor.code_executor import CodeExecutionError, CodeExecutor, CodeLanguage
+from core.helper.code_executor.jinja2.jinja2_renderer import Jinja2Renderer, Jinja2RenderError
+
+
+def test_render_template():
+    template = "Hello {{ name }}{% for item in items %}, {{ item | upper }}{% endfor %}"
+
+    assert Jinja2Renderer.render(template, {"name": "dify", "items": ["a", "b"]}) == "Hello dify, A, B"
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        "{{ 'a' * 100000000 }}",
+        "{{ 2 ** 100000 }}",
+        "{{ ((2 ** 1024) ** 1024) ** 64 }}",
+        "{{ 'x' | center(300000000) }}",
+        "{{ 'x'.ljust(300000000) }}",
+        "{{ ('a' * 900000) | replace('a', 'bb') }}",
+        "{{ '%300000000s' | format('x') }}",
+        "{{ '{:>300000000}'.format('x') }}",
+        "{{ 'a\\nb' | indent(300000000) }}",
+        "{{ 'a b c' | wordwrap(1, wrapstring='x' * 900000) }}",
+        "{{ range(100000) | join('x' * 100) }}",
+        "{% set l = [1] %}{% for i in range(30) %}{{ l.extend(l) }}{% endfor %}",
+        "{% for i in range(100000) %}{% for j in range(100000) %}{{ j }}{% endfor %}{% endfor %}",
+        "{{ missing.attribute }}",
+        "{% if %}",
+    ],
+)
+def test_render_errors(template):
+    with pytest.raises(Jinja2RenderError):
+        Jinja2Renderer.render(template, {})
+
+
+def test_render_filters_within_limits():
+    template = (
+        "{{ 'x' | center(5) }}|{{ 'a b' | replace(' ', '-') }}|{{ '%05.1f' | format(2.5) }}|{{ '{:>3}'.format(1) }}"
+    )
+
+    assert Jinja2Renderer.render(template, {}) == "  x  |a-b|002.5|  1"
+
+
+def test_render_timeout(mocker):
+    mocker.patch.object(code_executor.dify_config, "CODE_EXECUTION_JINJA2_TIMEOUT", 0.01)
+
+    with pytest.raises(Jinja2RenderError, match="timed out"):
+        Jinja2Renderer.render("{% for i in range(100000) %}{{ i | string }}{% endfor %}" * 20, {})
+
+
+def test_render_timeout_of_silent_loops(mocker):
+    mocker.patch.object(code_executor.dify_config, "CODE_EXECUTION_JINJA2_TIMEOUT", 0.05)
+    template = '{% set s = "x" * 100000 %}{% for a in s %}{% for b in s %}{% endfor %}{% endfor %}'
+
+    started_at = time.monotonic()
+    with pytest.raises(Jinja2RenderError, match="timed out"):
+        Jinja2Renderer.render(template, {})
+    assert time.monotonic() - started_at < 1
+
+
+def test_execute_template_locally(mocker):
+    mocker.patch.object(code_executor.dify_config, "CODE_EXECUTION_JINJA2_RENDERER", "local")
+    execute_code = mocker.patch.object(CodeExecutor, "execute_code")
+
+    result = CodeExecutor.execute_workflow_code_template(CodeLanguage.JINJA2, "{{ a }}+{{ b }}", {"a": 1, "b": 2})
+
+    assert result == {"result": "1+2"}
+    execute_code.assert_not_called()
+    with pytest.raises(CodeExecutionError):
+        CodeExecutor.execute_workflow_code_template(CodeLanguage.JINJA2, "{{ a.b.c }}", {})
+
+
+def test_execute_template_remotely_when_local_sandbox_rejects_it(mocker):
+    mocker.patch.object(code_executor.dify_config, "CODE_EXECUTION_JINJA2_RENDERER", "local")
+    execute_code = mocker.patch.object(CodeExecutor, "execute_code", return_value="<<RESULT>>str<<RESULT>>")
+
+    result = CodeExecutor.execute_workflow_code_template(CodeLanguage.JINJA2, "{{ ''.__class__.__name__ }}", {})
+
+    assert result == {"result": "str"}
+    execute_code.assert_called_once()
@@ -0,0 +1,68 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.helper import service_api_auth_cache
+from core.helper.service_api_auth_cache import INVALIDATION_CHANNEL, ServiceApiAuthCache
+from models.model import App
+
+
+@pytest.fixture(autouse=True)
+def redis_client(mocker):
+    mocker.patch.object(ServiceApiAuthCache, "_ensure_subscriber")
+    mocker.patch.object(ServiceApiAuthCache, "_entries", new=service_api_auth_cache.OrderedDict())
+    mocker.patch.object(service_api_auth_cache.dify_config, "SERVICE_API_AUTH_CACHE_TTL", 30)
+    mocker.patch.object(service_api_auth_cache.dify_config, "SERVICE_API_AUTH_CACHE_MAX_SIZE", 2)
+    return mocker.patch.object(service_api_auth_cache, "redis_client", new=MagicMock())
+
+
+def test_entries_expire_and_are_bounded(mocker):
+    monotonic = mocker.patch.object(service_api_auth_cache.time, "monotonic", return_value=100.0)
+    ServiceApiAuthCache.set("a", 1)
+    ServiceApiAuthCache.set("b", 2)
+    ServiceApiAuthCache.set("c", 3)
+
+    assert ServiceApiAuthCache.get("a") is None
+    assert ServiceApiAuthCache.get("b") == 2
+
+    monotonic.return_value = 131.0
+    assert ServiceApiAuthCache.get("c") is None
+
+
+def test_invalidate_drops_local_entries_and_publishes(redis_client):
+    ServiceApiAuthCache.set("app:1", "app")
+
+    ServiceApiAuthCache.invalidate(["app:1"])
+
+    assert ServiceApiAuthCache.get("app:1") is None
+    redis_client.publish.assert_called_once_with(INVALIDATION_CHANNEL, '["app:1"]')
+
+
+def test_committed_changes_invalidate_cached_rows(redis_client):
+    app = App(id="app_id")
+    session = MagicMock(info={}, dirty=[app], deleted=[])
+
+    service_api_auth_cache._collect_invalidation_keys(session, None)
+    redis_client.publish.assert_not_called()
+    service_api_auth_cache._publish_invalidation_keys(session)
+
+    redis_client.publish.assert_called_once_with(INVALIDATION_CHANNEL, '["app:app_id"]')
+    assert session.info == {}
+
+
+def test_last_used_at_is_written_in_batches(mocker):
+    thread = mocker.patch.object(service_api_auth_cache.threading, "Thread")
+    monotonic = mocker.patch.object(service_api_auth_cache.time, "monotonic", return_value=1000.0)
+    mocker.patch.object(ServiceApiAuthCache, "_last_used_at", new={})
+    mocker.patch.object(ServiceApiAuthCache, "_last_used_at_flushed_at", new=990.0)
+
+    ServiceApiAuthCache.record_last_used("token_1")
+    ServiceApiAuthCache.record_last_used("token_2")
+    thread.assert_not_called()
+
+    monotonic.return_value = 1050.0
+    ServiceApiAuthCache.record_last_used("token_1")
+
+    thread.assert_called_once()
+    assert set(thread.call_args.kwargs["kwargs"]["last_used_at"]) == {"token_1", "token_2"}
+    assert ServiceApiAuthCache._last_used_at == {}
@@ -1,9 +1,15 @@
 import random
+import threading
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from core.helper.ssrf_proxy import SSRF_DEFAULT_MAX_RETRIES, STATUS_FORCELIST, make_request
+from core.helper.ssrf_proxy import (
+    SSRF_DEFAULT_MAX_RETRIES,
+    STATUS_FORCELIST,
+    RequestCancelledError,
+    make_request,
+)
 
 
 @patch("httpx.Client.request")
@@ -50,3 +56,28 @@ def test_retry_logic_success(mock_request):
     assert response.status_code == 200
     assert mock_request.call_count == SSRF_DEFAULT_MAX_RETRIES + 1
     assert mock_request.call_args_list[0][1].get("method") == "GET"
+
+
+@patch("httpx.Client.request", autospec=True)
+def test_client_is_reused(mock_request):
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_request.return_value = mock_response
+
+    make_request("GET", "http://example.com")
+    make_request("GET", "http://example.com")
+
+    assert mock_request.call_args_list[0][0][0] is mock_request.call_args_list[1][0][0]
+
+
+@patch("httpx.Client.request")
+def test_cancelled_request_stops_waiting_for_retries(mock_request):
+    mock_response = MagicMock()
+    mock_response.status_code = 503
+    mock_request.return_value = mock_response
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    with pytest.raises(RequestCancelledError):
+        make_request("GET", "http://example.com", max_retries=3, cancel_event=cancel_event)
+    assert mock_request.call_count == 1
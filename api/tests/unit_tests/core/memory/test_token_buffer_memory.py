@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from core.memory import token_buffer_memory
+from core.memory.token_buffer_memory import TokenBufferMemory
+from core.model_runtime.entities import AssistantPromptMessage, UserPromptMessage
+
+
+def _memory() -> TokenBufferMemory:
+    model_instance = MagicMock(provider="openai", model="gpt-4o")
+    model_instance.get_llm_num_tokens.side_effect = lambda prompt_messages: sum(
+        len(prompt_message.content) for prompt_message in prompt_messages
+    )
+    return TokenBufferMemory(conversation=MagicMock(), model_instance=model_instance)
+
+
+def _prompt_messages(messages) -> list:
+    prompt_messages = []
+    for message in messages:
+        prompt_messages.append(UserPromptMessage(content=message.query))
+        prompt_messages.append(AssistantPromptMessage(content=message.answer))
+    return prompt_messages
+
+
+def test_prune_keeps_newest_messages_within_limit(mocker):
+    redis_client = mocker.patch.object(token_buffer_memory, "redis_client", new=MagicMock())
+    redis_client.mget.return_value = [None, None, None]
+    messages = [
+        SimpleNamespace(id="1", query="aaaa", answer="bbbb"),
+        SimpleNamespace(id="2", query="cc", answer="dd"),
+        SimpleNamespace(id="3", query="ee", answer="ff"),
+    ]
+    memory = _memory()
+
+    prune_index = memory._get_prune_index(messages, _prompt_messages(messages), max_token_limit=7)
+
+    assert prune_index == 3
+    # the whole history is counted once, then the oldest message is never counted once the limit is reached
+    assert memory.model_instance.get_llm_num_tokens.call_count == 1 + 4
+    pipe = redis_client.pipeline.return_value.__enter__.return_value
+    pipe.setex.assert_any_call(
+        "message_num_tokens_openai_gpt-4o_3", token_buffer_memory.MESSAGE_NUM_TOKENS_CACHE_TTL, "2,2"
+    )
+
+
+def test_history_within_limit_is_counted_in_one_request(mocker):
+    redis_client = mocker.patch.object(token_buffer_memory, "redis_client", new=MagicMock())
+    redis_client.mget.return_value = [None, b"1,1", None]
+    messages = [
+        SimpleNamespace(id="1", query="aa", answer="bb"),
+        SimpleNamespace(id="2", query="c", answer="d"),
+        SimpleNamespace(id="3", query="ee", answer="ff"),
+    ]
+    memory = _memory()
+
+    assert memory._get_prune_index(messages, _prompt_messages(messages), max_token_limit=10) == 0
+    (uncached_prompt_messages,) = memory.model_instance.get_llm_num_tokens.call_args.args
+    assert [prompt_message.content for prompt_message in uncached_prompt_messages] == ["aa", "bb", "ee", "ff"]
+    memory.model_instance.get_llm_num_tokens.assert_called_once()
+
+
+def test_prune_uses_cached_token_counts(mocker):
+    redis_client = mocker.patch.object(token_buffer_memory, "redis_client", new=MagicMock())
+    redis_client.mget.return_value = [b"10,10", b"1,1"]
+    messages = [
+        SimpleNamespace(id="1", query="a", answer="b"),
+        SimpleNamespace(id="2", query="c", answer="d"),
+    ]
+    memory = _memory()
+
+    assert memory._get_prune_index(messages, _prompt_messages(messages), max_token_limit=15) == 1
+    memory.model_instance.get_llm_num_tokens.assert_not_called()
+    redis_client.pipeline.assert_not_called()
+
+
+def test_prune_always_keeps_newest_prompt_message(mocker):
+    redis_client = mocker.patch.object(token_buffer_memory, "redis_client", new=MagicMock())
+    redis_client.mget.return_value = [b"100,100"]
+    messages = [SimpleNamespace(id="1", query="a", answer="b")]
+
+    assert _memory()._get_prune_index(messages, _prompt_messages(messages), max_token_limit=10) == 1
+
+
+def test_prune_counts_tokens_when_redis_is_unavailable(mocker):
+    redis_client = mocker.patch.object(token_buffer_memory, "redis_client", new=MagicMock())
+    redis_client.mget.side_effect = ConnectionError("redis is down")
+    redis_client.pipeline.side_effect = ConnectionError("redis is down")
+    messages = [
+        SimpleNamespace(id="1", query="aa", answer="bb"),
+        SimpleNamespace(id="2", query="c", answer="d"),
+    ]
+    memory = _memory()
+
+    assert memory._get_prune_index(messages, _prompt_messages(messages), max_token_limit=4) == 1
+    assert memory.model_instance.get_llm_num_tokens.call_count == 1 + 4
@@ -0,0 +1,55 @@
+import pytest
+
+from core.moderation.keywords.keyword_matcher import KeywordMatcher
+from core.moderation.keywords.keywords import KeywordsModeration
+
+CONFIG = {
+    "inputs_config": {"enabled": True, "preset_response": "inputs blocked"},
+    "outputs_config": {"enabled": True, "preset_response": "outputs blocked"},
+    "keywords": "he\nShe\nhis\nhers\n",
+}
+
+
+@pytest.mark.parametrize(
+    ("text", "flagged"),
+    [
+        ("ushers", True),
+        ("USHERS", True),
+        ("a shell", True),
+        ("this", True),
+        ("hi s", False),
+        ("", False),
+    ],
+)
+def test_keyword_matcher_search(text, flagged):
+    assert KeywordMatcher(CONFIG["keywords"].split("\n")).search(text) is flagged
+
+
+def test_keyword_matcher_feed_matches_across_chunks():
+    matcher = KeywordMatcher(["hers"])
+
+    state, flagged = matcher.feed(KeywordMatcher.INITIAL_STATE, "ush")
+    assert not flagged
+    state, flagged = matcher.feed(state, "ERs")
+    assert flagged
+
+
+def test_moderation_for_inputs():
+    moderation = KeywordsModeration(app_id="app", tenant_id="tenant", config=CONFIG)
+
+    assert moderation.moderation_for_inputs({"name": "tom"}, query="Is HIS name tom?").flagged
+    assert not moderation.moderation_for_inputs({"name": "tom"}, query="what is it?").flagged
+
+
+def test_moderation_for_outputs_only_matches_the_new_text(mocker):
+    moderation = KeywordsModeration(app_id="app", tenant_id="tenant", config=CONFIG)
+    feed = mocker.spy(KeywordMatcher, "feed")
+
+    assert not moderation.moderation_for_outputs("it was h").flagged
+    result = moderation.moderation_for_outputs("it was her")
+    assert result.flagged
+    assert result.preset_response == "outputs blocked"
+    assert feed.call_args.args[2] == "er"
+
+    # a text that does not extend the previous one is matched from its start
+    assert not moderation.moderation_for_outputs("nothing").flagged
@@ -0,0 +1,38 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from core.ops.entities.config_entity import LangSmithConfig
+from core.ops.entities.trace_entity import GenerateNameTraceInfo, ModerationTraceInfo
+from core.ops.langsmith_trace.langsmith_trace import LangSmithDataTrace
+
+
+def test_message_traces_are_sent_with_one_batch_ingest(mocker):
+    client = mocker.patch("core.ops.langsmith_trace.langsmith_trace.Client").return_value
+    trace_instance = LangSmithDataTrace(LangSmithConfig(api_key="key", project="project"))
+    message_created_at = datetime(2024, 1, 1, 12, 0, 0)
+
+    trace_instance.trace(
+        ModerationTraceInfo(
+            message_id="message_id",
+            message_data=MagicMock(created_at=message_created_at, updated_at=message_created_at),
+            inputs={"query": "hi"},
+            start_time=datetime(2024, 1, 1, 12, 0, 1),
+            metadata={},
+            flagged=False,
+            action="direct_output",
+            preset_response="",
+            query="hi",
+        )
+    )
+    trace_instance.trace(GenerateNameTraceInfo(inputs="hi", outputs="title", metadata={}, tenant_id="tenant_id"))
+
+    client.create_run.assert_not_called()
+    trace_instance.flush()
+
+    client.batch_ingest_runs.assert_called_once()
+    moderation_run, name_run = client.batch_ingest_runs.call_args.kwargs["create"]
+    assert moderation_run["trace_id"] == "message_id"
+    assert moderation_run["dotted_order"].startswith("20240101T120000000Zmessage_id.20240101T120001000Z")
+    assert moderation_run["dotted_order"].endswith(moderation_run["id"])
+    assert name_run["trace_id"] == name_run["id"]
+    assert trace_instance.pending_runs == []
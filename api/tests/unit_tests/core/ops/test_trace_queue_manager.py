@@ -0,0 +1,60 @@
+import gzip
+import json
+import queue
+from unittest.mock import MagicMock
+
+from core.ops import ops_trace_manager
+from core.ops.entities.config_entity import OPS_FILE_PATH
+from core.ops.ops_trace_manager import TraceQueueManager
+
+
+def _trace_task(app_id: str) -> MagicMock:
+    trace_info = MagicMock()
+    trace_info.model_dump.return_value = {"message_id": "message_id"}
+    task = MagicMock(app_id=app_id)
+    task.execute.return_value = trace_info
+    return task
+
+
+def test_send_to_celery_ships_one_batch_per_app(app, mocker):
+    save = mocker.patch.object(ops_trace_manager.storage, "save")
+    delay = mocker.patch.object(ops_trace_manager.process_trace_batch_tasks, "delay")
+    manager = TraceQueueManager.__new__(TraceQueueManager)
+    manager.flask_app = app
+
+    manager.send_to_celery([_trace_task("app_1"), _trace_task("app_2"), _trace_task("app_1"), _trace_task(None)])
+
+    assert save.call_count == 2
+    assert delay.call_count == 2
+    batches = {}
+    for call in save.call_args_list:
+        file_path, content = call.args
+        assert file_path.startswith(OPS_FILE_PATH)
+        tasks_data = json.loads(gzip.decompress(content))
+        batches[tasks_data[0]["app_id"]] = tasks_data
+    assert len(batches["app_1"]) == 2
+    assert len(batches["app_2"]) == 1
+    assert batches["app_1"][0]["trace_info"] == {"message_id": "message_id"}
+
+
+def test_add_trace_task_drops_when_queue_is_full(mocker):
+    mocker.patch.object(ops_trace_manager, "trace_manager_queue", queue.Queue(maxsize=1))
+    mocker.patch.object(ops_trace_manager, "trace_manager_dropped_counts", {})
+    mocker.patch.object(TraceQueueManager, "start_timer")
+    redis_client = MagicMock()
+    mocker.patch.object(ops_trace_manager, "redis_client", redis_client)
+    manager = TraceQueueManager.__new__(TraceQueueManager)
+    manager.app_id = "app_id"
+    manager.trace_instance = MagicMock()
+
+    for _ in range(3):
+        manager.add_trace_task(MagicMock())
+
+    assert ops_trace_manager.trace_manager_queue.qsize() == 1
+    assert ops_trace_manager.trace_manager_dropped_counts == {"app_id": 2}
+
+    TraceQueueManager.flush_dropped_counts()
+
+    pipe = redis_client.pipeline.return_value.__enter__.return_value
+    pipe.incrby.assert_called_once_with("DROPPED_OPS_TRACE_app_id", 2)
+    assert ops_trace_manager.trace_manager_dropped_counts == {}
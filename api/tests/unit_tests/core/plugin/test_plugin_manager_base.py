@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from core.model_runtime.entities.llm_entities import LLMResultChunk
+from core.plugin.entities.plugin_daemon import PluginDaemonInnerError
+from core.plugin.manager.base import BasePluginManager
+
+
+def _stream(mocker, lines: list[dict]):
+    manager = BasePluginManager()
+    mocker.patch.object(manager, "_stream_request", return_value=iter(json.dumps(line) for line in lines))
+    return manager
+
+
+def test_stream_validates_chunk_payloads(mocker):
+    chunk = {
+        "model": "gpt-4o",
+        "prompt_messages": [],
+        "delta": {"index": 0, "message": {"role": "assistant", "content": "hello"}},
+    }
+    manager = _stream(mocker, [{"code": 0, "message": "", "data": chunk}] * 2)
+
+    chunks = list(manager._request_with_plugin_daemon_response_stream("POST", "path", LLMResultChunk))
+
+    assert len(chunks) == 2
+    assert isinstance(chunks[0], LLMResultChunk)
+    assert chunks[0].delta.message.content == "hello"
+
+
+def test_stream_validates_generic_payloads(mocker):
+    manager = _stream(mocker, [{"code": 0, "message": "", "data": [1, "2"]}])
+
+    assert list(manager._request_with_plugin_daemon_response_stream("POST", "path", list[int])) == [[1, 2]]
+
+
+def test_stream_raises_daemon_errors(mocker):
+    manager = _stream(mocker, [{"code": -500, "message": "internal error", "data": None}])
+
+    with pytest.raises(PluginDaemonInnerError):
+        list(manager._request_with_plugin_daemon_response_stream("POST", "path", dict))
+
+
+def test_stream_raises_error_lines(mocker):
+    manager = _stream(mocker, [{"error": "unauthorized"}])
+
+    with pytest.raises(ValueError, match="unauthorized"):
+        list(manager._request_with_plugin_daemon_response_stream("POST", "path", dict))
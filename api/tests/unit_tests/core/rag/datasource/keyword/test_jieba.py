@@ -0,0 +1,55 @@
+from core.rag.datasource.keyword.jieba import jieba
+from core.rag.datasource.keyword.jieba.jieba import Jieba
+from core.rag.datasource.keyword.jieba.sharded_keyword_table import ShardedKeywordTable
+from models.dataset import Dataset
+
+
+def _jieba() -> Jieba:
+    return Jieba(Dataset(id="dataset_id", tenant_id="tenant_id"))
+
+
+def test_retrieve_ids_by_query_ranks_rare_keywords_higher():
+    keyword_table = {
+        "common": {"node_1", "node_2", "node_3"},
+        "rare": {"node_3"},
+    }
+
+    ranked = _jieba()._retrieve_ids_by_query(keyword_table, ["common", "rare", "missing"], k=2, corpus_size=10)
+
+    assert [node_id for node_id, _ in ranked] == ["node_3", "node_2"]
+    assert ranked[0][1] == 1.0
+    assert 0.0 < ranked[1][1] < 1.0
+
+
+def test_retrieve_ids_by_query_without_matches():
+    assert _jieba()._retrieve_ids_by_query({"keyword": {"node_1"}}, ["other"], k=4) == []
+
+
+def test_sharded_keyword_table_is_stable():
+    keyword_table = ShardedKeywordTable(Dataset(id="dataset_id", tenant_id="tenant_id"), "database", 16)
+
+    shards = keyword_table.group_by_shard(["alpha", "beta", "gamma"])
+
+    assert all(0 <= shard_id < 16 for shard_id in shards)
+    assert sorted(key for keys in shards.values() for key in keys) == ["alpha", "beta", "gamma"]
+    assert keyword_table.shard_of("alpha") == keyword_table.shard_of("alpha")
+    assert ShardedKeywordTable._decode(ShardedKeywordTable._encode({"alpha": {"b", "a"}})) == {"alpha": {"a", "b"}}
+
+
+def test_search_exposes_keyword_score_apart_from_vector_score(mocker):
+    keyword = _jieba()
+    keyword_table = mocker.MagicMock()
+    keyword_table.group_by_shard.return_value = {0: {"alpha"}}
+    keyword_table.load.return_value = {0: {"alpha": {"node_1"}}}
+    mocker.patch.object(keyword, "_get_keyword_table_shards", return_value=keyword_table)
+    mocker.patch.object(keyword, "_get_corpus_size", return_value=10)
+    mocker.patch.object(jieba.JiebaKeywordTableHandler, "extract_keywords", return_value={"alpha"})
+    segment = mocker.MagicMock(index_node_id="node_1", content="alpha", dataset_id="dataset_id")
+    session = mocker.patch.object(jieba.db, "session")
+    session.query.return_value.filter.return_value.all.return_value = [segment]
+
+    documents = keyword.search("alpha")
+
+    assert len(documents) == 1
+    assert documents[0].metadata["keyword_score"] == 1.0
+    assert "score" not in documents[0].metadata
@@ -0,0 +1,92 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.rag.datasource.keyword.jieba import jieba, sharded_keyword_table
+from core.rag.datasource.keyword.jieba.jieba import Jieba
+from core.rag.datasource.keyword.jieba.sharded_keyword_table import KEYWORD_SHARD, NODE_SHARD, ShardedKeywordTable
+from models.dataset import Dataset
+
+
+@pytest.fixture
+def files(mocker) -> dict[str, bytes]:
+    files: dict[str, bytes] = {}
+    storage = MagicMock()
+    storage.exists.side_effect = lambda key: key in files
+    storage.load_once.side_effect = lambda key: files[key]
+    storage.save.side_effect = files.__setitem__
+    storage.delete.side_effect = files.pop
+    mocker.patch.object(sharded_keyword_table, "storage", new=storage)
+    return files
+
+
+@pytest.fixture
+def redis_client(mocker) -> MagicMock:
+    return mocker.patch.object(jieba, "redis_client", new=MagicMock())
+
+
+def _keyword_table() -> ShardedKeywordTable:
+    return ShardedKeywordTable(Dataset(id="dataset_id", tenant_id="tenant_id"), "storage", 8)
+
+
+def _jieba(mocker, keyword_table: ShardedKeywordTable) -> Jieba:
+    keyword = Jieba(Dataset(id="dataset_id", tenant_id="tenant_id"))
+    mocker.patch.object(keyword, "_get_keyword_table_shards", return_value=keyword_table)
+    return keyword
+
+
+def _load_all(keyword_table: ShardedKeywordTable, kind: str) -> dict[str, set[str]]:
+    table: dict[str, set[str]] = {}
+    for shard in keyword_table.load(kind, range(keyword_table.shard_count)).values():
+        table.update(shard)
+    return table
+
+
+@pytest.mark.usefixtures("files", "redis_client")
+def test_add_and_delete_postings(mocker):
+    keyword_table = _keyword_table()
+    keyword = _jieba(mocker, keyword_table)
+
+    keyword._add_to_keyword_table({"node_1": ["alpha", "beta"], "node_2": ["beta"]})
+    keyword._add_to_keyword_table({"node_3": ["gamma"]})
+
+    assert _load_all(keyword_table, KEYWORD_SHARD) == {
+        "alpha": {"node_1"},
+        "beta": {"node_1", "node_2"},
+        "gamma": {"node_3"},
+    }
+    assert _load_all(keyword_table, NODE_SHARD)["node_1"] == {"alpha", "beta"}
+
+    keyword.delete_by_ids(["node_1", "node_3"])
+
+    assert _load_all(keyword_table, KEYWORD_SHARD) == {"beta": {"node_2"}}
+    assert _load_all(keyword_table, NODE_SHARD) == {"node_2": {"beta"}}
+
+
+def test_add_locks_only_touched_shards_in_one_sorted_pass(mocker, files, redis_client):
+    keyword_table = _keyword_table()
+    keyword = _jieba(mocker, keyword_table)
+
+    keyword._add_to_keyword_table({"node_1": ["alpha", "beta"]})
+
+    lock_names = [call.args[0] for call in redis_client.lock.call_args_list]
+    touched = {(NODE_SHARD, keyword_table.shard_of("node_1"))} | {
+        (KEYWORD_SHARD, keyword_table.shard_of(keyword)) for keyword in ("alpha", "beta")
+    }
+    assert lock_names == sorted(lock_names)
+    assert len(lock_names) == len(touched)
+    assert len(files) == len(touched)
+
+
+@pytest.mark.usefixtures("files")
+def test_save_all_splits_legacy_table_into_shards():
+    keyword_table = _keyword_table()
+
+    keyword_table.save_all({"alpha": ["node_1", "node_2"], "beta": ["node_2"]})
+
+    assert _load_all(keyword_table, KEYWORD_SHARD) == {"alpha": {"node_1", "node_2"}, "beta": {"node_2"}}
+    assert _load_all(keyword_table, NODE_SHARD) == {"node_1": {"alpha"}, "node_2": {"alpha", "beta"}}
+
+    keyword_table.delete_all()
+
+    assert _load_all(keyword_table, KEYWORD_SHARD) == {}
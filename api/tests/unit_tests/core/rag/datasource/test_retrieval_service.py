@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.rag.datasource import parent_segment_cache, retrieval_service
+from core.rag.datasource.parent_segment_cache import ParentSegmentCache
+from core.rag.datasource.retrieval_service import RetrievalService
+from core.rag.index_processor.constant.index_type import IndexType
+from core.rag.models.document import Document
+from models.dataset import ChildChunk, DocumentSegment
+from models.dataset import Document as DatasetDocument
+
+
+@pytest.fixture(autouse=True)
+def cache(mocker):
+    mocker.patch.object(ParentSegmentCache, "_entries", new=OrderedDict())
+    mocker.patch.object(parent_segment_cache.dify_config, "RETRIEVAL_PARENT_SEGMENT_CACHE_SIZE", 2)
+    mocker.patch.object(parent_segment_cache.dify_config, "RETRIEVAL_PARENT_SEGMENT_CACHE_TTL", 60)
+
+
+@pytest.fixture
+def db(mocker):
+    db = mocker.patch.object(retrieval_service, "db")
+    db.session.query.return_value.filter.return_value.options.return_value.all.return_value = [
+        DatasetDocument(id="document_id", dataset_id="dataset_id", doc_form=IndexType.PARENT_CHILD_INDEX)
+    ]
+    db.session.execute.side_effect = lambda stmt: [
+        (_child_chunk("child-1", "parent-1"), "dataset_id", "hash-1"),
+        (_child_chunk("child-2", "parent-1"), "dataset_id", "hash-1"),
+        (_child_chunk("child-3", "parent-2"), "dataset_id", "hash-2"),
+    ]
+    db.session.merge.side_effect = lambda segment, load: segment
+    return db
+
+
+@pytest.fixture
+def session(mocker):
+    session = MagicMock()
+    session.scalars.return_value.all.return_value = [
+        _segment("parent-1", "hash-1"),
+        _segment("parent-2", "hash-2"),
+    ]
+    mocker.patch.object(retrieval_service, "Session").return_value.__enter__.return_value = session
+    return session
+
+
+def _child_chunk(index_node_id: str, segment_id: str) -> ChildChunk:
+    return ChildChunk(id=index_node_id, index_node_id=index_node_id, segment_id=segment_id, content="", position=1)
+
+
+def _segment(segment_id: str, index_node_hash: str) -> DocumentSegment:
+    return DocumentSegment(id=segment_id, dataset_id="dataset_id", index_node_hash=index_node_hash, content="")
+
+
+def _document(doc_id: str, score: float) -> Document:
+    return Document(page_content="", metadata={"document_id": "document_id", "doc_id": doc_id, "score": score})
+
+
+def test_parent_child_documents_are_hydrated_in_batches(db, session):
+    documents = [_document("child-1", 0.5), _document("child-3", 0.7), _document("child-2", 0.9)]
+
+    records = RetrievalService.format_retrieval_documents(documents)
+
+    assert [(record.segment.id, record.score) for record in records] == [("parent-1", 0.9), ("parent-2", 0.7)]
+    assert [chunk.id for chunk in records[0].child_chunks or []] == ["child-1", "child-2"]
+    assert db.session.execute.call_count == 1
+    session.scalars.assert_called_once()
+
+    # parents whose content is unchanged are not queried again
+    records = RetrievalService.format_retrieval_documents(documents)
+    assert [record.segment.id for record in records] == ["parent-1", "parent-2"]
+    assert db.session.execute.call_count == 2
+    session.scalars.assert_called_once()
+
+
+def test_edited_parents_are_queried_again(db, session):
+    ParentSegmentCache.set_many([_segment("parent-1", "stale-hash"), _segment("parent-2", "hash-2")])
+
+    RetrievalService.format_retrieval_documents([_document("child-1", 0.5), _document("child-3", 0.7)])
+
+    assert session.scalars.call_args.args[0].compile().params["id_1"] == ["parent-1"]
+
+
+def test_expired_parents_are_queried_again(mocker, db, session):
+    monotonic = mocker.patch.object(parent_segment_cache.time, "monotonic", return_value=100.0)
+    ParentSegmentCache.set_many([_segment("parent-1", "hash-1"), _segment("parent-2", "hash-2")])
+
+    monotonic.return_value = 159.0
+    RetrievalService.format_retrieval_documents([_document("child-1", 0.5), _document("child-3", 0.7)])
+    session.scalars.assert_not_called()
+
+    monotonic.return_value = 160.0
+    RetrievalService.format_retrieval_documents([_document("child-1", 0.5), _document("child-3", 0.7)])
+    assert sorted(session.scalars.call_args.args[0].compile().params["id_1"]) == ["parent-1", "parent-2"]
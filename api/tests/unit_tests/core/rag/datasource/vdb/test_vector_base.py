@@ -0,0 +1,56 @@
+from core.rag.datasource.vdb.vector_base import BaseVector
+from core.rag.models.document import Document
+
+
+class _InMemoryVector(BaseVector):
+    def __init__(self, doc_ids: set[str]):
+        super().__init__("collection")
+        self.doc_ids = doc_ids
+        self.lookups: list[list[str]] = []
+
+    def get_type(self) -> str:
+        return "in_memory"
+
+    def create(self, texts, embeddings, **kwargs):
+        pass
+
+    def add_texts(self, documents, embeddings, **kwargs):
+        pass
+
+    def text_exists(self, id: str) -> bool:
+        return id in self.doc_ids
+
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        self.lookups.append(ids)
+        return super().get_existing_ids(ids)
+
+    def delete_by_ids(self, ids):
+        pass
+
+    def delete_by_metadata_field(self, key, value):
+        pass
+
+    def search_by_vector(self, query_vector, **kwargs):
+        return []
+
+    def search_by_full_text(self, query, **kwargs):
+        return []
+
+    def delete(self):
+        pass
+
+
+def test_filter_duplicate_texts_looks_up_ids_once():
+    vector = _InMemoryVector({"doc_1", "doc_3"})
+    texts = [
+        Document(page_content="1", metadata={"doc_id": "doc_1"}),
+        Document(page_content="2", metadata={"doc_id": "doc_2"}),
+        Document(page_content="3", metadata={"doc_id": "doc_3"}),
+        Document(page_content="2 again", metadata={"doc_id": "doc_2"}),
+        Document(page_content="no id", metadata={}),
+    ]
+
+    filtered = vector._filter_duplicate_texts(texts)
+
+    assert [text.page_content for text in filtered] == ["2", "2 again", "no id"]
+    assert vector.lookups == [["doc_1", "doc_2", "doc_3"]]
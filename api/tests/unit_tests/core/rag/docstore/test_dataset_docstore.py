@@ -0,0 +1,95 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.rag.docstore import dataset_docstore
+from core.rag.docstore.dataset_docstore import DatasetDocumentStore
+from core.rag.models.document import ChildDocument, Document
+from models.dataset import Dataset
+
+
+@pytest.fixture
+def db(mocker):
+    db = mocker.patch.object(dataset_docstore, "db")
+    db.session.query.return_value.filter.return_value.scalar.return_value = 2
+    db.session.execute.side_effect = lambda stmt, params=None: (
+        [("existing_segment_id", "node-1")] if stmt.is_select else MagicMock()
+    )
+    return db
+
+
+def _document(doc_id: str, children: int = 0, **metadata) -> Document:
+    return Document(
+        page_content=f"content of {doc_id}",
+        metadata={"doc_id": doc_id, "doc_hash": f"hash of {doc_id}", **metadata},
+        children=[
+            ChildDocument(page_content="child", metadata={"doc_id": f"{doc_id}-{i}", "doc_hash": ""})
+            for i in range(children)
+        ],
+    )
+
+
+def _executed(db) -> list[tuple[str, str, list]]:
+    return [
+        (type(call.args[0]).__name__, call.args[0].table.name, call.args[1] if len(call.args) > 1 else [])
+        for call in db.session.execute.call_args_list
+        if not call.args[0].is_select
+    ]
+
+
+def test_add_documents_saves_segments_with_one_statement_per_change(db):
+    doc_store = DatasetDocumentStore(
+        dataset=Dataset(id="dataset_id", tenant_id="tenant_id", indexing_technique="economy"),
+        user_id="user_id",
+        document_id="document_id",
+    )
+
+    doc_store.add_documents(
+        [_document("node-1", children=2), _document("node-2", children=1, answer="answer"), _document("node-3")],
+        save_child=True,
+    )
+
+    (_, _, new_segments), (_, _, updated_segments), (_, _, _), (_, _, child_chunks) = executed = _executed(db)
+    assert [(statement, table) for statement, table, _ in executed] == [
+        ("Insert", "document_segments"),
+        ("Update", "document_segments"),
+        ("Delete", "child_chunks"),
+        ("Insert", "child_chunks"),
+    ]
+    assert [(segment["index_node_id"], segment["position"], segment["answer"]) for segment in new_segments] == [
+        ("node-2", 3, "answer"),
+        ("node-3", 4, None),
+    ]
+    assert updated_segments == [
+        {
+            "id": "existing_segment_id",
+            "content": "content of node-1",
+            "index_node_hash": "hash of node-1",
+            "word_count": 17,
+            "tokens": 0,
+        }
+    ]
+    assert [(chunk["segment_id"], chunk["index_node_id"], chunk["position"]) for chunk in child_chunks] == [
+        ("existing_segment_id", "node-1-0", 1),
+        ("existing_segment_id", "node-1-1", 2),
+        (new_segments[0]["id"], "node-2-0", 1),
+    ]
+    db.session.commit.assert_called_once()
+
+
+def test_add_documents_commits_each_batch(db, mocker):
+    mocker.patch.object(dataset_docstore.dify_config, "INDEXING_SEGMENT_BATCH_SIZE", 2)
+    doc_store = DatasetDocumentStore(
+        dataset=Dataset(id="dataset_id", tenant_id="tenant_id", indexing_technique="economy"),
+        user_id="user_id",
+        document_id="document_id",
+    )
+
+    doc_store.add_documents([_document(f"node-{i}") for i in range(2, 7)])
+
+    new_segments = [params for statement, _, params in _executed(db) if statement == "Insert"]
+    assert [[segment["position"] for segment in batch] for batch in new_segments] == [[3, 4], [5, 6], [7]]
+    assert db.session.commit.call_count == 3
+
+    with pytest.raises(ValueError, match="node-1 already exists"):
+        doc_store.add_documents([_document("node-1")], allow_update=False)
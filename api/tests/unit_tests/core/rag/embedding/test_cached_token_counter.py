@@ -0,0 +1,42 @@
+from unittest.mock import MagicMock
+
+import pytest
+from cachetools import LRUCache
+
+from core.rag.embedding import cached_token_counter
+from core.rag.embedding.cached_token_counter import CachedTokenCounter
+
+
+@pytest.fixture(autouse=True)
+def local_cache(mocker):
+    return mocker.patch.object(cached_token_counter, "_local_cache", LRUCache(maxsize=10))
+
+
+def _model_instance(model: str) -> MagicMock:
+    model_instance = MagicMock(provider="provider", model=model)
+    model_instance.get_text_embedding_num_tokens.side_effect = lambda texts: [len(text) for text in texts]
+    return model_instance
+
+
+def test_each_distinct_text_is_counted_once_per_model():
+    model_instance = _model_instance("model")
+
+    assert CachedTokenCounter(model_instance).get_num_tokens(["a", "bb", "a"]) == [1, 2, 1]
+    assert CachedTokenCounter(model_instance).get_num_tokens(["bb", "ccc"]) == [2, 3]
+    assert [call.kwargs["texts"] for call in model_instance.get_text_embedding_num_tokens.call_args_list] == [
+        ["a", "bb"],
+        ["ccc"],
+    ]
+
+    other_model_instance = _model_instance("other_model")
+    assert CachedTokenCounter(other_model_instance).get_num_tokens(["a"]) == [1]
+    other_model_instance.get_text_embedding_num_tokens.assert_called_once()
+
+
+def test_texts_are_counted_by_the_model_when_the_cache_is_disabled(mocker):
+    mocker.patch.object(cached_token_counter, "_local_cache", None)
+    model_instance = _model_instance("model")
+
+    assert CachedTokenCounter(model_instance).get_num_tokens(["a", "a"]) == [1, 1]
+    assert CachedTokenCounter(model_instance).get_num_tokens([]) == []
+    model_instance.get_text_embedding_num_tokens.assert_called_once_with(texts=["a", "a"])
@@ -0,0 +1,66 @@
+import pytest
+
+from core.rag.models.document import Document
+from core.rag.rerank.weight_scorer import calculate_keyword_scores, calculate_vector_scores
+
+
+def test_calculate_keyword_scores_extracts_all_content_keywords(mocker):
+    content_keywords = {
+        "dify rag": {"dify", "rag"},
+        "dify workflow": {"dify", "workflow"},
+        "something else": {"other"},
+    }
+    extract_keywords = mocker.patch(
+        "core.rag.rerank.weight_scorer.JiebaKeywordTableHandler.extract_keywords",
+        side_effect=lambda text, max_keywords_per_chunk: content_keywords[text],
+    )
+    documents = [
+        Document(page_content="dify rag", metadata={"doc_id": "1"}),
+        # keywords stored elsewhere are ignored, the scores are always over the full content keywords
+        Document(page_content="dify workflow", metadata={"doc_id": "2", "keywords": ["workflow"]}),
+        Document(page_content="something else", metadata={"doc_id": "3"}),
+    ]
+
+    scores = calculate_keyword_scores("dify rag", documents)
+    calculate_keyword_scores("dify rag", documents)
+
+    assert scores[0] == pytest.approx(1.0)
+    assert 0.0 < scores[1] < scores[0]
+    assert scores[2] == 0.0
+    assert documents[1].metadata["keywords"] == {"dify", "workflow"}
+    assert all(call.args[1] is None for call in extract_keywords.call_args_list)
+    # document contents are extracted once, then served from the content hash cache
+    assert extract_keywords.call_count == 2 + len(documents)
+
+
+def test_calculate_keyword_scores_keeps_keyword_search_scores(mocker):
+    mocker.patch(
+        "core.rag.rerank.weight_scorer.JiebaKeywordTableHandler.extract_keywords",
+        side_effect=lambda text, max_keywords_per_chunk: set(text.split()),
+    )
+    documents = [
+        Document(page_content="dify rag", metadata={"doc_id": "1"}),
+        Document(page_content="dify", metadata={"doc_id": "2", "keyword_score": 0.3}),
+        Document(page_content="other", metadata={"doc_id": "3", "keyword_score": 0.1}),
+    ]
+
+    scores = calculate_keyword_scores("dify rag", documents)
+
+    assert scores[0] == pytest.approx(1.0)
+    assert scores[1:] == [0.3, 0.1]
+
+
+def test_calculate_vector_scores():
+    documents = [
+        Document(page_content="a", vector=[1.0, 0.0], metadata={"doc_id": "1"}),
+        Document(page_content="b", vector=[0.0, 2.0], metadata={"doc_id": "2"}),
+        Document(page_content="c", metadata={"doc_id": "3", "score": 0.42}),
+        Document(page_content="d", metadata={"doc_id": "4"}),
+    ]
+
+    scores = calculate_vector_scores([1.0, 1.0], documents)
+
+    assert scores[0] == pytest.approx(0.7071, abs=1e-4)
+    assert scores[1] == pytest.approx(0.7071, abs=1e-4)
+    assert scores[2] == 0.42
+    assert scores[3] == 0.0
@@ -0,0 +1,91 @@
+from collections import Counter
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.rag.index_processor.constant.index_type import IndexType
+from core.rag.models.document import Document
+from core.rag.retrieval import retrieval_log_buffer
+from core.rag.retrieval.retrieval_log_buffer import RetrievalLogBuffer
+
+
+@pytest.fixture(autouse=True)
+def buffer(mocker):
+    mocker.patch.object(RetrievalLogBuffer, "_hits", new=Counter())
+    mocker.patch.object(RetrievalLogBuffer, "_queries", new=[])
+    mocker.patch.object(RetrievalLogBuffer, "_failed_flushes", new=0)
+    mocker.patch.object(retrieval_log_buffer.dify_config, "DATASET_RETRIEVAL_LOG_FLUSH_INTERVAL", 10)
+    return mocker.patch.object(RetrievalLogBuffer, "_flush_later")
+
+
+def _document(document_id: str, doc_id: str, dataset_id: str = "dataset_id") -> Document:
+    return Document(
+        page_content="content", metadata={"document_id": document_id, "doc_id": doc_id, "dataset_id": dataset_id}
+    )
+
+
+def test_hits_are_aggregated_per_segment():
+    session = MagicMock()
+    session.execute.side_effect = [
+        [("paragraph", IndexType.PARAGRAPH_INDEX), ("parent_child", IndexType.PARENT_CHILD_INDEX)],
+        [("parent_child", "child-1", "parent-1"), ("parent_child", "child-2", "parent-1")],
+        [("segment-1", "dataset_id", "node-1"), ("segment-2", "other_dataset_id", "node-1")],
+    ]
+    hits = Counter(
+        {
+            ("paragraph", "dataset_id", "node-1"): 2,
+            ("parent_child", "dataset_id", "child-1"): 1,
+            ("parent_child", "dataset_id", "child-2"): 3,
+            ("deleted", "dataset_id", "node-2"): 1,
+        }
+    )
+
+    assert RetrievalLogBuffer._get_segment_hits(session, hits) == {"segment-1": 2, "parent-1": 4}
+    assert session.execute.call_count == 3
+
+
+def test_flush_writes_buffered_hits_and_queries_once(mocker):
+    session = MagicMock()
+    mocker.patch.object(retrieval_log_buffer, "db")
+    mocker.patch.object(retrieval_log_buffer, "Session").return_value.__enter__.return_value = session
+    get_segment_hits = mocker.patch.object(RetrievalLogBuffer, "_get_segment_hits", return_value={"segment-1": 3})
+
+    RetrievalLogBuffer.add_hits([_document("document_id", "node-1"), _document("document_id", "node-1")])
+    RetrievalLogBuffer.add_hits([_document("document_id", "node-1"), Document(page_content="", provider="external")])
+    RetrievalLogBuffer.add_queries("query", ["dataset-1", "dataset-2"], "app_id", "account", "account_id")
+    RetrievalLogBuffer.add_queries("", ["dataset-1"], "app_id", "account", "account_id")
+    RetrievalLogBuffer.flush()
+
+    assert get_segment_hits.call_args.args[1] == {("document_id", "dataset_id", "node-1"): 3}
+    insert_stmt, lock_stmt, update_stmt = (call.args[0] for call in session.execute.call_args_list)
+    assert [query["dataset_id"] for query in session.execute.call_args_list[0].args[1]] == ["dataset-1", "dataset-2"]
+    assert insert_stmt.table.name == "dataset_queries"
+    assert lock_stmt._for_update_arg is not None
+    assert update_stmt.table.name == "document_segments"
+    session.commit.assert_called_once()
+
+    RetrievalLogBuffer.flush()
+    assert session.execute.call_count == 3
+
+
+def test_failed_flush_is_retried_a_bounded_number_of_times(mocker):
+    session = MagicMock()
+    session.commit.side_effect = Exception("database is unavailable")
+    mocker.patch.object(retrieval_log_buffer, "db")
+    mocker.patch.object(retrieval_log_buffer, "Session").return_value.__enter__.return_value = session
+    get_segment_hits = mocker.patch.object(RetrievalLogBuffer, "_get_segment_hits", return_value={"segment-1": 1})
+
+    RetrievalLogBuffer.add_hits([_document("document_id", "node-1")])
+    RetrievalLogBuffer.add_queries("query", ["dataset-1"], "app_id", "account", "account_id")
+    RetrievalLogBuffer.flush()
+    # what was buffered meanwhile is written along with the failed batch
+    RetrievalLogBuffer.add_hits([_document("document_id", "node-1")])
+    RetrievalLogBuffer.flush()
+
+    assert get_segment_hits.call_args.args[1] == {("document_id", "dataset_id", "node-1"): 2}
+    assert len(RetrievalLogBuffer._queries) == 1
+
+    for _ in range(retrieval_log_buffer.MAX_FLUSH_ATTEMPTS - 2):
+        RetrievalLogBuffer.flush()
+    assert not RetrievalLogBuffer._hits
+    assert not RetrievalLogBuffer._queries
@@ -0,0 +1,11 @@
+from unittest.mock import MagicMock
+
+from core.rag.splitter.text_splitter import CharacterTextSplitter
+
+
+def test_merge_splits_measures_each_split_once():
+    length_function = MagicMock(side_effect=lambda texts: [len(text) for text in texts])
+    splitter = CharacterTextSplitter(separator=" ", chunk_size=7, chunk_overlap=3, length_function=length_function)
+
+    assert splitter.split_text("a bb ccc dd e") == ["a bb", "bb ccc", "ccc dd", "dd e"]
+    assert [call.args[0] for call in length_function.call_args_list] == [["a", "bb", "ccc", "dd", "e"], [" "]]
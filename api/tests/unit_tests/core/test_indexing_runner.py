@@ -0,0 +1,103 @@
+from unittest.mock import MagicMock
+
+import pytest
+from flask import Flask
+
+from core import indexing_runner
+from core.indexing_runner import DocumentIsPausedError, IndexingRunner
+from core.rag.index_processor.constant.index_type import IndexType
+from core.rag.models.document import Document
+from models.dataset import Dataset
+from models.dataset import Document as DatasetDocument
+
+
+@pytest.fixture
+def runner(mocker):
+    mocker.patch.object(indexing_runner, "ModelManager")
+    db = mocker.patch.object(indexing_runner, "db")
+    db.session.query.return_value.filter.return_value.scalar.return_value = 7
+    mocker.patch.object(indexing_runner, "redis_client", new=MagicMock())
+    mocker.patch.object(indexing_runner.dify_config, "INDEXING_PIPELINE_PAGE_BATCH_SIZE", 2)
+    mocker.patch.object(indexing_runner.dify_config, "INDEXING_EMBEDDING_WORKERS", 2)
+    runner = IndexingRunner()
+    mocker.patch.object(runner, "_check_document_paused_status")
+    mocker.patch.object(runner, "_update_document_index_status")
+    mocker.patch.object(runner, "_load_segments")
+    mocker.patch.object(runner, "_process_keyword_index")
+    mocker.patch.object(
+        runner, "_transform", side_effect=lambda processor, pages, *args: [page.model_copy() for page in pages]
+    )
+    mocker.patch.object(
+        runner, "_process_chunk", side_effect=lambda app, processor, chunk_documents, *args: len(chunk_documents)
+    )
+    with Flask(__name__).app_context():
+        yield runner
+
+
+def _pages(count: int) -> list[Document]:
+    return [Document(page_content=f"page {i}", metadata={"doc_id": f"node-{i}"}) for i in range(count)]
+
+
+def _run_pipeline(runner: IndexingRunner, **kwargs) -> None:
+    runner._run_pipeline(
+        index_processor=MagicMock(),
+        dataset=Dataset(
+            id="dataset_id",
+            tenant_id="tenant_id",
+            indexing_technique="high_quality",
+            embedding_model_provider="provider",
+            embedding_model="model",
+        ),
+        dataset_document=DatasetDocument(id="document_id", doc_form=IndexType.PARAGRAPH_INDEX, doc_language="en"),
+        process_rule={"mode": "automatic"},
+        **kwargs,
+    )
+
+
+def test_pages_are_saved_in_order_and_embedded_once(runner):
+    _run_pipeline(runner, text_docs=_pages(5))
+
+    saved = [[document.metadata["doc_id"] for document in call.args[2]] for call in runner._load_segments.mock_calls]
+    assert saved == [["node-0", "node-1"], ["node-2", "node-3"], ["node-4"]]
+    assert [call.args[2] for call in indexing_runner.redis_client.setex.call_args_list] == [
+        '{"pages": 2, "position": 7}',
+        '{"pages": 4, "position": 7}',
+        '{"pages": 5, "position": 7}',
+    ]
+    embedded = sorted(
+        document.metadata["doc_id"] for call in runner._process_chunk.call_args_list for document in call.args[2]
+    )
+    assert embedded == [f"node-{i}" for i in range(5)]
+    indexing_runner.redis_client.delete.assert_called_once_with("document_document_id_indexing_checkpoint")
+    statuses = [call.kwargs["after_indexing_status"] for call in runner._update_document_index_status.call_args_list]
+    assert statuses == ["indexing", "completed"]
+    assert runner._update_document_index_status.call_args.kwargs["extra_update_params"][DatasetDocument.tokens] == 5
+    # the other stages get plain values instead of the instances the saving thread commits
+    embedding_model_instance = runner.model_manager.get_model_instance.return_value
+    runner.model_manager.get_model_instance.assert_called_once()
+    assert all(
+        call.args[2:] == ("en", {"mode": "automatic"}, "tenant_id", embedding_model_instance)
+        for call in runner._transform.call_args_list
+    )
+    assert all(
+        call.args[3:] == ("dataset_id", "document_id", embedding_model_instance)
+        for call in runner._process_chunk.call_args_list
+    )
+
+
+def test_resumed_document_skips_checkpointed_pages(runner):
+    _run_pipeline(runner, text_docs=_pages(5), start_page=4, documents=_pages(2))
+
+    saved = [[document.metadata["doc_id"] for document in call.args[2]] for call in runner._load_segments.mock_calls]
+    assert saved == [["node-4"]]
+    assert sum(len(call.args[2]) for call in runner._process_chunk.call_args_list) == 3
+
+
+def test_failed_embedding_stops_the_pipeline(runner):
+    runner._process_chunk.side_effect = DocumentIsPausedError()
+
+    with pytest.raises(DocumentIsPausedError):
+        _run_pipeline(runner, text_docs=_pages(20))
+
+    statuses = [call.kwargs["after_indexing_status"] for call in runner._update_document_index_status.call_args_list]
+    assert "completed" not in statuses
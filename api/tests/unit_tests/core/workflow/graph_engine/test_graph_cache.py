@@ -0,0 +1,58 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.workflow.graph_engine import graph_cache
+from core.workflow.graph_engine.entities.graph import Graph
+from core.workflow.graph_engine.graph_cache import WorkflowGraphCache
+
+
+def _graph(answer: str) -> str:
+    return json.dumps(
+        {
+            "nodes": [
+                {"id": "start", "data": {"type": "start", "title": "Start", "variables": []}},
+                {"id": "answer", "data": {"type": "answer", "title": "Answer", "answer": answer}},
+            ],
+            "edges": [{"id": "start-answer", "source": "start", "target": "answer"}],
+        }
+    )
+
+
+def _workflow(workflow_id: str, version: str, graph: str) -> MagicMock:
+    workflow = MagicMock(id=workflow_id, version=version, graph=graph)
+    workflow.graph_dict = json.loads(graph)
+    return workflow
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache(mocker):
+    mocker.patch.object(WorkflowGraphCache, "_entries", type(WorkflowGraphCache._entries)())
+
+
+def test_graph_is_compiled_once_per_workflow_version():
+    init_graph = MagicMock(wraps=Graph.init)
+    workflow = _workflow("workflow", "v1", _graph("hello"))
+
+    graph_config, graph = WorkflowGraphCache.get_or_init(workflow, init_graph)
+    assert WorkflowGraphCache.get_or_init(workflow, init_graph) == (graph_config, graph)
+    assert graph.root_node_id == "start"
+    assert "answer" in graph.answer_stream_generate_routes.answer_generate_route
+    assert init_graph.call_count == 1
+
+    # an edited draft is compiled again
+    WorkflowGraphCache.get_or_init(_workflow("workflow", "v1", _graph("bye")), init_graph)
+    assert init_graph.call_count == 2
+
+
+def test_least_recently_used_graphs_are_evicted(mocker):
+    mocker.patch.object(graph_cache.dify_config, "WORKFLOW_GRAPH_CACHE_SIZE", 1)
+    init_graph = MagicMock(wraps=Graph.init)
+    first, second = _workflow("first", "v1", _graph("a")), _workflow("second", "v1", _graph("a"))
+
+    WorkflowGraphCache.get_or_init(first, init_graph)
+    WorkflowGraphCache.get_or_init(second, init_graph)
+    WorkflowGraphCache.get_or_init(first, init_graph)
+
+    assert init_graph.call_count == 3
@@ -0,0 +1,145 @@
+import threading
+from concurrent.futures import wait
+
+import pytest
+
+from core.workflow.graph_engine import workflow_executor
+from core.workflow.graph_engine.graph_engine import GraphEngine, GraphEngineThreadPool
+from core.workflow.graph_engine.workflow_executor import WorkflowExecutor, WorkflowExecutorFullError
+
+
+def test_round_robin_across_scopes():
+    executor = WorkflowExecutor(max_workers=1)
+    blocker = threading.Event()
+    order: list[str] = []
+
+    first = executor.submit(blocker.wait, scope="blocker")
+    futures = [executor.submit(order.append, name, scope="tenant_a") for name in ("a1", "a2", "a3")]
+    futures.append(executor.submit(order.append, "b1", scope="tenant_b"))
+    blocker.set()
+    wait([first, *futures], timeout=5)
+
+    assert order == ["a1", "b1", "a2", "a3"]
+    assert not executor._scope_queues
+    assert not executor._scope_weights
+
+
+def test_nested_work_runs_inline_when_no_worker_is_idle():
+    executor = WorkflowExecutor(max_workers=1)
+
+    def parent():
+        child = executor.submit(lambda: threading.current_thread().name)
+        return child.result(timeout=5), threading.current_thread().name
+
+    child_thread, parent_thread = executor.submit(parent).result(timeout=5)
+
+    assert child_thread == parent_thread
+
+
+def test_handed_over_work_queues_under_its_scope():
+    executor = WorkflowExecutor(max_workers=1)
+    blocker = threading.Event()
+    order: list[str] = []
+
+    def finish_and_hand_over():
+        blocker.wait(timeout=5)
+        order.append("a1")
+        return executor.submit(order.append, "a2", scope="tenant_a", allow_inline=False, nested=False)
+
+    first = executor.submit(finish_and_hand_over, scope="tenant_a")
+    other = executor.submit(order.append, "b1", scope="tenant_b")
+    blocker.set()
+    handed_over = first.result(timeout=5)
+    wait([other, handed_over], timeout=5)
+
+    assert order == ["a1", "b1", "a2"]
+
+
+def test_thread_pool_caps_running_tasks():
+    thread_pool = GraphEngineThreadPool(max_workers=2, max_submit_count=10, scope="tenant")
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+    release = threading.Event()
+
+    def task():
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        release.wait(timeout=5)
+        with lock:
+            running -= 1
+
+    futures = [thread_pool.submit(task) for _ in range(5)]
+    for future in futures:
+        future.add_done_callback(thread_pool.task_done_callback)
+    release.set()
+    wait(futures, timeout=5)
+
+    assert all(future.done() for future in futures)
+    assert max_running <= 2
+    assert thread_pool.submit_count == 0
+
+
+def test_tasks_find_the_stop_event_of_their_run(monkeypatch):
+    thread_pool = GraphEngineThreadPool(scope="tenant")
+    monkeypatch.setattr(GraphEngine, "workflow_thread_pool_mapping", {"thread_pool_id": thread_pool})
+
+    assert GraphEngine.get_stop_event("thread_pool_id") is thread_pool.stop_event
+    assert GraphEngine.get_stop_event("finished_thread_pool_id") is None
+    assert GraphEngine.get_stop_event(None) is None
+
+
+def test_stats_report_queue_depth_in_flight_and_wait_time():
+    executor = WorkflowExecutor(max_workers=1)
+    blocker = threading.Event()
+
+    first = executor.submit(blocker.wait, 5, scope="tenant_a")
+    queued = [executor.submit(lambda: None, scope="tenant_b") for _ in range(2)]
+    while not executor.get_stats()["scopes"].get("tenant_a", {}).get("in_flight"):
+        pass
+
+    stats = executor.get_stats()
+    assert stats["queue_depth"] == 2
+    assert stats["scopes"] == {
+        "tenant_a": {"queue_depth": 0, "in_flight": 1},
+        "tenant_b": {"queue_depth": 2, "in_flight": 0},
+    }
+
+    blocker.set()
+    wait([first, *queued], timeout=5)
+    stats = executor.get_stats()
+    assert stats["completed"] == 3
+    assert sum(stats["wait_time_buckets"].values()) == 3
+    assert stats["max_wait_time"] >= stats["avg_wait_time"] > 0
+    assert stats["scopes"] == {}
+
+
+def test_new_runs_wait_for_the_submit_budget():
+    executor = WorkflowExecutor(max_workers=1, max_submit_count=1, admission_timeout=0.01)
+    executor.admit_run()
+    executor.reserve()
+
+    with pytest.raises(WorkflowExecutorFullError):
+        executor.admit_run()
+
+    admitted = threading.Event()
+    executor._admission_timeout = 5
+    waiting_run = threading.Thread(target=lambda: (executor.admit_run(), admitted.set()))
+    waiting_run.start()
+    while not executor.get_stats()["waiting_runs"]:
+        pass
+    executor.release()
+    waiting_run.join(timeout=5)
+
+    assert admitted.is_set()
+    assert executor.get_stats()["rejected_runs"] == 1
+
+
+def test_scope_weights_are_configurable(monkeypatch):
+    monkeypatch.setattr(workflow_executor.dify_config, "WORKFLOW_EXECUTOR_SCOPE_WEIGHTS", "tenant_a:3, app_b:2,bad")
+
+    assert workflow_executor.get_scope_weight("tenant_a") == 3
+    assert workflow_executor.get_scope_weight("tenant_a", "app_b") == 2
+    assert workflow_executor.get_scope_weight("tenant_c", "app_c") == 1
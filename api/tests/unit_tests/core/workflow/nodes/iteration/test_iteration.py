@@ -1,8 +1,14 @@
+import subprocess
+import sys
 import time
 import uuid
 from unittest.mock import patch
 
+import pytest
+
+from configs import dify_config
 from core.app.entities.app_invoke_entities import InvokeFrom
+from core.helper.code_executor.code_executor import CodeExecutor
 from core.workflow.entities.node_entities import NodeRunResult
 from core.workflow.entities.variable_pool import VariablePool
 from core.workflow.enums import SystemVariableKey
@@ -858,3 +864,92 @@ def test_iteration_run_error_handle():
             assert item.run_result.status == WorkflowNodeExecutionStatus.SUCCEEDED
             assert item.run_result.outputs == {"output": []}
     assert count == 14
+
+
+@pytest.mark.parametrize("is_parallel", [False, True])
+def test_iteration_runs_code_nodes_in_batches(is_parallel):
+    graph_config = {
+        "edges": [
+            {"id": "start-source-iteration-1-target", "source": "start", "target": "iteration-1"},
+            {"id": "iteration-start-source-code-target", "source": "iteration-start", "target": "code"},
+        ],
+        "nodes": [
+            {"data": {"title": "Start", "type": "start", "variables": []}, "id": "start"},
+            {
+                "data": {
+                    "iterator_selector": ["start", "items"],
+                    "output_selector": ["code", "result"],
+                    "output_type": "array[string]",
+                    "start_node_id": "iteration-start",
+                    "title": "iteration",
+                    "type": "iteration",
+                },
+                "id": "iteration-1",
+            },
+            {
+                "data": {"iteration_id": "iteration-1", "title": "iteration-start", "type": "iteration-start"},
+                "id": "iteration-start",
+            },
+            {
+                "data": {
+                    "iteration_id": "iteration-1",
+                    "title": "code",
+                    "type": "code",
+                    "code_language": "python3",
+                    "code": "def main(item: str, index: int) -> dict:\n    return {'result': f'{item}{index}'}\n",
+                    "outputs": {"result": {"type": "string"}},
+                    "variables": [
+                        {"value_selector": ["iteration-1", "item"], "variable": "item"},
+                        {"value_selector": ["iteration-1", "index"], "variable": "index"},
+                    ],
+                },
+                "id": "code",
+            },
+        ],
+    }
+
+    graph = Graph.init(graph_config=graph_config)
+    init_params = GraphInitParams(
+        tenant_id="1",
+        app_id="1",
+        workflow_type=WorkflowType.WORKFLOW,
+        workflow_id="1",
+        graph_config=graph_config,
+        user_id="1",
+        user_from=UserFrom.ACCOUNT,
+        invoke_from=InvokeFrom.DEBUGGER,
+        call_depth=0,
+    )
+    pool = VariablePool(system_variables={SystemVariableKey.FILES: []}, user_inputs={}, environment_variables=[])
+    pool.add(["start", "items"], ["a", "b", "c"])
+    iteration_node = IterationNode(
+        id=str(uuid.uuid4()),
+        graph_init_params=init_params,
+        graph=graph,
+        graph_runtime_state=GraphRuntimeState(variable_pool=pool, start_at=time.perf_counter()),
+        config={
+            "data": {
+                "iterator_selector": ["start", "items"],
+                "output_selector": ["code", "result"],
+                "output_type": "array[string]",
+                "start_node_id": "iteration-start",
+                "title": "iteration",
+                "type": "iteration",
+                "is_parallel": is_parallel,
+            },
+            "id": "iteration-1",
+        },
+    )
+
+    def execute_code(language, preload, code):
+        return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+
+    with (
+        patch.object(dify_config, "CODE_EXECUTION_BATCH_SIZE", 2),
+        patch.object(CodeExecutor, "execute_code", side_effect=execute_code) as mock_execute_code,
+    ):
+        events = list(iteration_node._run())
+
+    assert isinstance(events[-1], RunCompletedEvent)
+    assert events[-1].run_result.outputs == {"output": ["a0", "b1", "c2"]}
+    assert mock_execute_code.call_count == 2
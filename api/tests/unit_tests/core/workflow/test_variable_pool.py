@@ -1,7 +1,7 @@
 import pytest
 
 from core.file import File, FileTransferMethod, FileType
-from core.variables import FileSegment, StringSegment
+from core.variables import FileSegment, StringSegment, StringVariable
 from core.workflow.entities.variable_pool import VariablePool
 
 
@@ -44,3 +44,35 @@ def test_use_long_selector(pool):
     result = pool.get(("node_1", "part_1", "part_2"))
     assert result is not None
     assert result.value == "test_value"
+
+
+def test_added_variable_is_stored_as_is(pool):
+    variable = StringVariable(name="name", value="value", selector=["conversation", "name"])
+    pool.add(("conversation", "name"), variable)
+
+    # the variable assigner writes conversation variables back by `variable.selector`
+    assert pool.get(("conversation", "name")) is variable
+
+
+def test_create_copy_is_isolated(pool):
+    pool.add(("node_1", "shared"), StringSegment(value="shared"))
+    pool.add(("node_2", "value"), StringSegment(value="parent"))
+
+    copied_pool = pool.create_copy()
+    copied_pool.add(("node_2", "value"), StringSegment(value="child"))
+    copied_pool.add(("node_3", "value"), StringSegment(value="child only"))
+    pool.remove(("node_1", "shared"))
+
+    assert pool.get(("node_2", "value")).value == "parent"
+    assert pool.get(("node_3", "value")) is None
+    assert pool.get(("node_1", "shared")) is None
+    assert copied_pool.get(("node_2", "value")).value == "child"
+    assert copied_pool.get(("node_3", "value")).value == "child only"
+    assert copied_pool.get(("node_1", "shared")).value == "shared"
+
+
+def test_convert_template(pool):
+    pool.add(("node_1", "name"), StringSegment(value="dify"))
+
+    assert pool.convert_template("Hello, {{#node_1.name#}}!").text == "Hello, dify!"
+    assert pool.convert_template("Hello, {{#node_1.missing#}}!").text == "Hello, node_1.missing!"
@@ -0,0 +1,28 @@
+import pickle
+
+import pytest
+
+from models.dataset import Embedding
+
+
+def test_pack_embedding_round_trip() -> None:
+    vector = [0.1, -0.25, 0.5, 1.0]
+
+    packed = Embedding.pack_embedding(vector)
+
+    assert packed.startswith(Embedding.PACKED_EMBEDDING_PREFIX)
+    assert len(packed) == len(Embedding.PACKED_EMBEDDING_PREFIX) + 4 * len(vector)
+    assert Embedding.unpack_embedding(packed) == pytest.approx(vector)
+
+
+def test_unpack_legacy_pickled_embedding() -> None:
+    vector = [0.1, -0.25, 0.5, 1.0]
+
+    assert Embedding.unpack_embedding(pickle.dumps(vector, protocol=pickle.HIGHEST_PROTOCOL)) == vector
+
+
+def test_set_and_get_embedding() -> None:
+    embedding = Embedding(model_name="text-embedding-3-small", hash="hash", provider_name="openai")
+    embedding.set_embedding([0.5, 0.5])
+
+    assert embedding.get_embedding() == [0.5, 0.5]
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import String, create_engine, func, select
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+
+from services import retention_service
+from services.retention_service import RetentionCleaner, TenantPlanResolver
+
+
+class _Base(DeclarativeBase):
+    pass
+
+
+class _Run(_Base):
+    __tablename__ = "runs"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    tenant_id: Mapped[str] = mapped_column(String)
+    created_at: Mapped[datetime]
+
+
+class _Step(_Base):
+    __tablename__ = "steps"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    run_id: Mapped[str] = mapped_column(String)
+
+
+@pytest.fixture
+def session(mocker):
+    engine = create_engine("sqlite://")
+    _Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        mocker.patch.object(retention_service, "db", SimpleNamespace(session=session))
+        yield session
+
+
+def test_cleaner_deletes_expired_rows_and_related_rows_in_batches(session):
+    now = datetime(2024, 1, 1)
+    # rows sharing a creation time are told apart by their id when paginating
+    for i in range(7):
+        tenant_id = "sandbox" if i % 2 == 0 else "paid"
+        session.add(_Run(id=f"run-{i}", tenant_id=tenant_id, created_at=now - timedelta(days=10 + i // 2)))
+        session.add(_Step(id=f"step-{i}", run_id=f"run-{i}"))
+    session.add(_Run(id="run-recent", tenant_id="sandbox", created_at=now))
+    session.add(_Step(id="step-recent", run_id="run-recent"))
+    session.commit()
+
+    stats = RetentionCleaner(
+        candidates=select(_Run.id, _Run.created_at, _Run.tenant_id).where(_Run.created_at < now - timedelta(days=1)),
+        id_column=_Run.id,
+        created_at_column=_Run.created_at,
+        related_columns=[_Step.run_id],
+        should_delete=lambda row: row.tenant_id == "sandbox",
+        batch_size=3,
+    ).run()
+
+    assert (stats.batches, stats.scanned, stats.deleted, stats.related_deleted) == (3, 7, 4, {"steps": 4})
+    assert set(session.scalars(select(_Run.id))) == {"run-1", "run-3", "run-5", "run-recent"}
+    assert session.scalar(select(func.count()).select_from(_Step)) == 4
+
+
+def test_tenant_plan_is_resolved_once(mocker):
+    redis_client = mocker.patch.object(retention_service, "redis_client", new=mocker.MagicMock())
+    redis_client.get.return_value = None
+    get_features = mocker.patch.object(retention_service.FeatureService, "get_features")
+    get_features.return_value.billing.subscription.plan = "sandbox"
+    resolver = TenantPlanResolver()
+
+    assert resolver.is_sandbox("tenant")
+    assert resolver.is_sandbox("tenant")
+    get_features.assert_called_once_with("tenant")
+    redis_client.setex.assert_called_once_with("features:tenant", retention_service.PLAN_CACHE_TTL, "sandbox")